@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Run the data scripts as plain Python processes, e.g., for scheduled runs.
+
+The scripts in this directory are exported from Jupyter notebooks. batch.py runs them cell by cell, as marked by
+the '# In[n]:' comments, in the directory of the script so that relative paths like '../Csv/' work as in the
+notebook. By default the environment variable MAKE_PLOTS=0 is set so that the scripts neither import
+matplotlib nor draw any figures.
+
+After each script, the run time of every cell is printed under the heading of its section. The first cell holds
+the imports, so its time is the start-up cost of the script. For scripts that run a pipeline (see
+pipeline.py), the time and status of every stage are printed too.
+
+Usage:
+
+    python batch.py business_cycle_data quantity_theory_data
+    python batch.py business_cycle_data --plots --offline
+'''
+
+import argparse
+import os
+import re
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Scripts that can be run
+scripts = ['business_cycle_data','quantity_theory_data','cross_country_gdp','cross_country_production']
+
+
+def split_cells(source):
+
+    '''Split the source of an exported notebook into code cells.
+
+    Args:
+        source (str):   Source of the script
+
+    Returns:
+        list of tuples: heading of the section that contains the cell and the source of the cell
+    '''
+
+    cells = []
+    heading = 'preamble'
+
+    for part in re.split(r'^# In\[[ \d]*\]:\s*$',source,flags=re.M):
+
+        cells.append((heading,part))
+
+        # Markdown headings at the end of a cell introduce the next cell
+        headings = re.findall(r'^# #+ (.+)$',part,flags=re.M)
+        if headings:
+            heading = headings[-1].strip()
+
+    return cells[1:]
+
+
+def run_script(name,plots=False):
+
+    '''Run a script cell by cell and return the namespace of the script and the timings of its cells.
+
+    Args:
+        name (str):     Name of the script without the extension, or a path to it
+        plots (bool):   Whether to draw figures
+
+    Returns:
+        tuple: dict with the global variables of the script and list of (cell number, heading, seconds)
+    '''
+
+    path = os.path.abspath(name if name.endswith('.py') else os.path.join(os.path.dirname(os.path.abspath(__file__)),name+'.py'))
+
+    with open(path) as file:
+        cells = split_cells(file.read())
+
+    os.environ['MAKE_PLOTS'] = '1' if plots else '0'
+
+    # Without a display, draw into memory
+    if plots and 'matplotlib' not in sys.modules:
+        import matplotlib
+        matplotlib.use('Agg')
+
+    namespace = {'__name__':'__main__','__file__':path}
+    timings = []
+
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(path))
+    sys.path.insert(0,os.path.dirname(path))
+
+    try:
+        for n, (heading, cell) in enumerate(cells):
+            start = time.perf_counter()
+            exec(compile(cell,path+' [cell '+str(n+1)+']','exec'),namespace)
+            timings.append((n+1,heading,time.perf_counter()-start))
+
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(os.path.dirname(path))
+
+    return namespace, timings
+
+
+def report(name,namespace,timings):
+
+    '''Return the timing report of a script run by run_script()'''
+
+    lines = [name+': '+'{:.3f} s'.format(sum(t for _,_,t in timings))]
+
+    for n, heading, seconds in timings:
+        label = 'start-up (imports)' if n==1 else heading
+        lines.append('    cell '+str(n).rjust(2)+'  '+label[:48].ljust(48)+'  '+'{:8.3f} s'.format(seconds))
+
+    # Stage timings of scripts that run a pipeline
+    build = namespace.get('build')
+    if hasattr(build,'report'):
+        lines.append(build.report())
+
+    return '\n'.join(lines)
+
+
+def peak_memory():
+
+    '''Return the peak resident memory of the process in MB, or None if it is not available'''
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return peak/1024**2 if sys.platform=='darwin' else peak/1024
+
+
+def main(args=None):
+
+    parser = argparse.ArgumentParser(description='Run data scripts without Jupyter.')
+    parser.add_argument('scripts',nargs='+',help='scripts to run: '+', '.join(scripts))
+    parser.add_argument('--plots',action='store_true',help='draw the figures of the scripts')
+    parser.add_argument('--offline',action='store_true',help='use only cached downloads (DOWNLOAD_CACHE_OFFLINE=1)')
+    args = parser.parse_args(args)
+
+    if args.offline:
+        os.environ['DOWNLOAD_CACHE_OFFLINE'] = '1'
+
+    for name in args.scripts:
+        namespace, timings = run_script(name,plots=args.plots)
+        print(report(name,namespace,timings))
+
+    memory = peak_memory()
+    if memory is not None:
+        print('Peak memory: '+'{:.0f}'.format(memory)+' MB')
+
+
+if __name__ == '__main__':
+    main()
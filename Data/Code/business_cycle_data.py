@@ -19,13 +19,29 @@
 # In[1]:
 
 
+import os
 import pandas as pd
 import numpy as np
 import fredpy as fp
-import matplotlib.pyplot as plt
+import fred_cache
+import perpetual_inventory
+import hp_filter
+import pipeline
 
-plt.style.use('classic')
-get_ipython().run_line_magic('matplotlib', 'inline')
+# Figures are drawn unless the environment variable MAKE_PLOTS=0 is set. batch.py sets it for scheduled runs
+# so that matplotlib is not even imported.
+make_plots = os.environ.get('MAKE_PLOTS','1')!='0'
+
+if make_plots:
+    import matplotlib.pyplot as plt
+
+    plt.style.use('classic')
+
+    # Inline figures when run in IPython or Jupyter
+    try:
+        get_ipython().run_line_magic('matplotlib', 'inline')
+    except NameError:
+        pass
 
 
 # In[2]:
@@ -42,6 +58,14 @@ export_path = '../Csv/'
 fp.api_key = fp.load_api_key('fred_api_key.txt')
 
 
+# The computations below are organized as stages of a pipeline (see pipeline.py). Each stage receives the results of the stages it depends on and its result is stored on disk. When the script is run again, a stage is executed only if its code, its parameters, or the results of the stages it depends on changed. Stages that do not depend on each other, like the CSV exports, run at the same time. The pipeline is run in the section *Run the pipeline* below.
+
+# In[4]:
+
+
+build = pipeline.Pipeline(max_workers=4)
+
+
 # ## Download and manage data
 # 
 # Download the following series from FRED:
@@ -65,75 +89,78 @@ fp.api_key = fp.load_api_key('fred_api_key.txt')
 # 
 # Monthly series (M2, T-Bill, unemployment rate) are converted to quarterly frequencies. CPI and PCE inflation rates are computed as the percent change in the indices over the previous year. GDP, consumption, investment, government expenditures, net exports and M2 are deflated by the GDP deflator. The data ranges for nataional accounts series (GDP, consumption, investment, government expenditures, net exports) and hours are equalized to the largest common date range. 
 
-# In[4]:
+# In[5]:
 
 
-# Download data
-gdp = fp.series('GDP')
-consumption = fp.series('PCEC')
-investment = fp.series('GPDI')
-government = fp.series('GCE')
-exports = fp.series('EXPGS')
-imports = fp.series('IMPGS')
-net_exports = fp.series('NETEXP')
-hours = fp.series('HOANBS')
-deflator = fp.series('GDPDEF')
-pce_deflator = fp.series('PCECTPI')
-cpi = fp.series('CPIAUCSL')
-m2 = fp.series('M2SL')
-tbill_3mo = fp.series('TB3MS')
-unemployment = fp.series('UNRATE')
-
-# Convert monthly M2, 3-mo T-Bill, and unemployment to quarterly
-m2 = m2.as_frequency('Q')
-tbill_3mo = tbill_3mo.as_frequency('Q')
-unemployment = unemployment.as_frequency('Q')
-cpi = cpi.as_frequency('Q')
-
-# Deflate GDP, consumption, investment, government expenditures, net exports, and m2 with the GDP deflator
-def deflate(series,deflator):
-    
-    deflator, series = fp.window_equalize([deflator, series])
-    series = series.divide(deflator).times(100)
-    
-    return series
+# FRED series IDs by name. Includes the annual depreciation and GDP series used to calibrate the capital
+# stock and the population series used by per_capita().
+series_ids = {
+    'gdp':'GDP','consumption':'PCEC','investment':'GPDI','government':'GCE','exports':'EXPGS','imports':'IMPGS',
+    'net_exports':'NETEXP','hours':'HOANBS','deflator':'GDPDEF','pce_deflator':'PCECTPI','cpi':'CPIAUCSL',
+    'm2':'M2SL','tbill_3mo':'TB3MS','unemployment':'UNRATE','depreciation_annual':'M1TTOTL1ES000',
+    'gdp_annual':'gdpa','population':'CNP16OV'
+}
+
+# Download data. All series are requested concurrently. Series are kept in a local cache and only new or
+# revised observations are downloaded. Set the environment variable DOWNLOAD_CACHE_OFFLINE=1 to rebuild from
+# the cache without network access. The stage runs every time, but later stages rerun only if the data changed.
+# The date of retrieval stored with each series is not part of its content.
+@build.stage(always=True,fingerprint=lambda series:{name:fred_cache.series_content(s) for name,s in series.items()})
+def download():
 
-gdp = deflate(gdp,deflator)
-consumption = deflate(consumption,deflator)
-investment = deflate(investment,deflator)
-government = deflate(government,deflator)
-net_exports = deflate(net_exports,deflator)
-exports = deflate(exports,deflator)
-imports = deflate(imports,deflator)
-m2 = deflate(m2,deflator)
+    series = fred_cache.load_all(list(series_ids.values()))
 
-# Base year for GDP deflator
-deflator_base_year = deflator.units.split(' ')[1][:4]
+    return {name:series[series_id] for name,series_id in series_ids.items()}
 
-# Base year for hours
-hours_base_year = hours.units.split(' ')[1][:4]
 
-# pce inflation as percent change over past year
-pce_deflator = pce_deflator.apc()
+# Convert monthly M2, 3-mo T-Bill, unemployment, and CPI to quarterly
+@build.stage(inputs=['download'])
+def quarterly(download):
 
-# cpi inflation as percent change over past year
-cpi = cpi.apc()
+    return {name:download[name].as_frequency('Q') for name in ['m2','tbill_3mo','unemployment','cpi']}
 
-# GDP deflator inflation as percent change over past year
-deflator = deflator.apc()
 
-# Convert unemployment, 3-mo T-Bill, pce inflation, cpi inflation, GDP deflator inflation data to rates 
-unemployment = unemployment.divide(100)
-tbill_3mo = tbill_3mo.divide(100)
-pce_deflator = pce_deflator.divide(100)
-cpi = cpi.divide(100)
-deflator = deflator.divide(100)
+@build.stage(inputs=['download','quarterly'])
+def deflated(download,quarterly):
 
-# Make sure that the RBC data has the same data range
-gdp,consumption,investment,government,exports,imports,net_exports,hours = fp.window_equalize([gdp,consumption,investment,government,exports,imports,net_exports,hours])
+    series = dict(download,**quarterly)
 
-# T-Bill data doesn't neet to go all the way back to 1930s
-tbill_3mo = tbill_3mo.window([gdp.data.index[0],'2222'])
+    # Deflate GDP, consumption, investment, government expenditures, net exports, and m2 with the GDP deflator
+    def deflate(series,deflator):
+
+        deflator, series = fp.window_equalize([deflator, series])
+        series = series.divide(deflator).times(100)
+
+        return series
+
+    for name in ['gdp','consumption','investment','government','net_exports','exports','imports','m2']:
+        series[name] = deflate(series[name],series['deflator'])
+
+    # Base year for GDP deflator
+    deflator_base_year = series['deflator'].units.split(' ')[1][:4]
+
+    # Base year for hours
+    hours_base_year = series['hours'].units.split(' ')[1][:4]
+
+    # pce inflation, cpi inflation, and GDP deflator inflation as percent change over past year
+    for name in ['pce_deflator','cpi','deflator']:
+        series[name] = series[name].apc()
+
+    # Convert unemployment, 3-mo T-Bill, pce inflation, cpi inflation, GDP deflator inflation data to rates
+    for name in ['unemployment','tbill_3mo','pce_deflator','cpi','deflator']:
+        series[name] = series[name].divide(100)
+
+    # Make sure that the RBC data has the same data range
+    names = ['gdp','consumption','investment','government','exports','imports','net_exports','hours']
+    for name, equalized in zip(names,fp.window_equalize([series[name] for name in names])):
+        series[name] = equalized
+
+    # T-Bill data doesn't neet to go all the way back to 1930s
+    series['tbill_3mo'] = series['tbill_3mo'].window([series['gdp'].data.index[0],'2222'])
+
+    series = {name:series[name] for name in series_ids if name not in ['depreciation_annual','gdp_annual','population']}
+
+    return dict(series,deflator_base_year=deflator_base_year,hours_base_year=hours_base_year)
 
 
 # ## Compute capital stock for US using the perpetual inventory method
@@ -211,47 +238,53 @@ tbill_3mo = tbill_3mo.window([gdp.data.index[0],'2222'])
 # 
 # 
 
-# In[5]:
+# In[6]:
 
 
-# Set the capital share of income
-alpha = 0.35
+# Set the capital share of income with the stage parameter alpha
+@build.stage(inputs=['download','deflated'],params={'alpha':0.35})
+def calibration(download,deflated,alpha):
 
-# Average saving rate
-s = np.mean(investment.data/gdp.data)
+    gdp, investment, hours = deflated['gdp'], deflated['investment'], deflated['hours']
 
-# Average quarterly labor hours growth rate
-n = (hours.data[-1]/hours.data[0])**(1/(len(hours.data)-1)) - 1
+    # Average saving rate
+    s = np.mean(investment.data/gdp.data)
 
-# Average quarterly real GDP growth rate
-g = ((gdp.data[-1]/gdp.data[0])**(1/(len(gdp.data)-1)) - 1) - n
+    # Average quarterly labor hours growth rate
+    n = (hours.data.iloc[-1]/hours.data.iloc[0])**(1/(len(hours.data)-1)) - 1
 
-# Compute annual depreciation rate
-depA = fp.series('M1TTOTL1ES000')
-gdpA = fp.series('gdpa')
+    # Average quarterly real GDP growth rate
+    g = ((gdp.data.iloc[-1]/gdp.data.iloc[0])**(1/(len(gdp.data)-1)) - 1) - n
 
-gdpA = gdpA.window([gdp.data.index[0],gdp.data.index[-1]])
-gdpA,depA = fp.window_equalize([gdpA,depA])
+    # Compute annual depreciation rate
+    depA = download['depreciation_annual']
+    gdpA = download['gdp_annual']
 
-deltaKY = np.mean(depA.data/gdpA.data)
-delta = (n+g)*deltaKY/(s-deltaKY)
+    gdpA = gdpA.window([gdp.data.index[0],gdp.data.index[-1]])
+    gdpA,depA = fp.window_equalize([gdpA,depA])
 
-# print calibrated values:
-print('Avg saving rate:        ',round(s,5))
-print('Avg annual labor growth:',round(4*n,5))
-print('Avg annual gdp growth:  ',round(4*g,5))
-print('Avg annual dep rate:    ',round(4*delta,5))
+    deltaKY = np.mean(depA.data/gdpA.data)
+    delta = (n+g)*deltaKY/(s-deltaKY)
 
-# Construct the capital series. Note that the GPD and investment data are reported on an annualized basis
-# so divide by 4 to get quarterly data.
-capital = np.zeros(len(gdp.data))
-capital[0] = gdp.data[0]/4*s/(n+g+delta)
+    # Initial capital equals its steady state value. Note that the GPD data are reported on an annualized basis
+    # so divide by 4 to get quarterly data.
+    K0 = perpetual_inventory.steady_state_K0(gdp.data.iloc[0]/4,s,n,g,delta)
 
-for t in range(len(gdp.data)-1):
-    capital[t+1] = investment.data[t]/4 + (1-delta)*capital[t]
+    return {'alpha':alpha,'s':s,'n':n,'g':g,'delta':delta,'K0':K0}
 
-# Save in a fredpy series
-capital = fp.to_fred_series(data = capital,dates =gdp.data.index,units = gdp.units,title='Capital stock of the US',frequency='Quarterly')
+
+# Construct the capital series. Note that the investment data are reported on an annualized basis so divide
+# by 4 to get quarterly data. See perpetual_inventory.py for computing capital and TFP over grids of
+# (alpha, delta, K0) values.
+@build.stage(inputs=['deflated','calibration'])
+def capital(deflated,calibration):
+
+    gdp, investment = deflated['gdp'], deflated['investment']
+
+    capital = perpetual_inventory.capital_paths(investment.data.values/4,calibration['delta'],calibration['K0'])[0]
+
+    # Save in a fredpy series
+    return fp.to_fred_series(data = capital,dates =gdp.data.index,units = gdp.units,title='Capital stock of the US',frequency='Quarterly')
 
 
 # ## Compute total factor productivity
@@ -264,368 +297,399 @@ capital = fp.to_fred_series(data = capital,dates =gdp.data.index,units = gdp.uni
 # 
 # and data on GDP, capital, and hours with $\alpha=0.35$ to compute an implied series for $A_t$.
 
-# In[6]:
+# In[7]:
 
 
 # Compute TFP
-tfp = gdp.data/capital.data**alpha/hours.data**(1-alpha)
-tfp = fp.to_fred_series(data = tfp,dates =gdp.data.index,units = gdp.units,title='TFP of the US',frequency='Quarterly')
+@build.stage(inputs=['deflated','capital','calibration'])
+def tfp(deflated,capital,calibration):
+
+    gdp, hours = deflated['gdp'], deflated['hours']
+
+    tfp = perpetual_inventory.tfp_paths(gdp.data.values,capital.data.values[None,:],hours.data.values,calibration['alpha'])[0]
+
+    return fp.to_fred_series(data = tfp,dates =gdp.data.index,units = gdp.units,title='TFP of the US',frequency='Quarterly')
 
 
 # ## Additional data management
 # 
 # Now that we have used the aggregate production data to compute an implied capital stock and TFP, we can scale the production data and M2 by the population.
 
-# In[7]:
+# In[8]:
 
 
-# Convert real GDP, consumption, investment, government expenditures, net exports and M2
-# into thousands of dollars per civilian 16 and over
-gdp = gdp.per_capita(civ_pop=True).times(1000)
-consumption = consumption.per_capita(civ_pop=True).times(1000)
-investment = investment.per_capita(civ_pop=True).times(1000)
-government = government.per_capita(civ_pop=True).times(1000)
-exports = exports.per_capita(civ_pop=True).times(1000)
-imports = imports.per_capita(civ_pop=True).times(1000)
-net_exports = net_exports.per_capita(civ_pop=True).times(1000)
-hours = hours.per_capita(civ_pop=True).times(1000)
-capital = capital.per_capita(civ_pop=True).times(1000)
-m2 = m2.per_capita(civ_pop=True).times(1000)
+@build.stage(inputs=['deflated','capital','tfp','download'])
+def per_capita(deflated,capital,tfp,download):
 
+    series = dict(deflated,capital=capital,tfp=tfp)
 
-# Scale hours per person to equal 100 on October (Quarter III) of GDP deflator base year.
-hours.data = hours.data/hours.data.loc[deflator_base_year+'-10-01']*100
+    # Civilian noninstitutional population 16 and over, the series that fredpy's per_capita(civ_pop=True) would
+    # download, taken from the download stage so that no request is made here
+    population = download['population'].as_frequency('Q')
 
+    def per_capita_series(x):
 
-# ## Plot aggregate data
+        x, pop = fp.window_equalize([x,population])
+        x.data = x.data/pop.data
 
-# In[8]:
+        x.title = x.title+' Per Capita'
+        x.units = x.units+' Per Thousand People'
+        x.units_short = x.units_short+' Per Thousand People'
 
+        return x
 
-fig, axes = plt.subplots(3,4,figsize=(6*4,4*3))
+    # Convert real GDP, consumption, investment, government expenditures, net exports and M2
+    # into thousands of dollars per civilian 16 and over.
+    for name in ['gdp','consumption','investment','government','exports','imports','net_exports','hours','capital','m2']:
+        series[name] = per_capita_series(series[name]).times(1000)
 
-axes[0][0].plot(gdp.data)
-axes[0][0].set_title('GDP')
-axes[0][0].set_ylabel('Thousands of '+deflator_base_year+' $')
+    # Scale hours per person to equal 100 on October (Quarter III) of GDP deflator base year.
+    hours = series['hours']
+    hours.data = hours.data/hours.data.loc[series['deflator_base_year']+'-10-01']*100
 
-axes[0][1].plot(consumption.data)
-axes[0][1].set_title('Consumption')
-axes[0][1].set_ylabel('Thousands of '+deflator_base_year+' $')
+    return series
 
-axes[0][2].plot(investment.data)
-axes[0][2].set_title('Investment')
-axes[0][2].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[0][3].plot(government.data)
-axes[0][3].set_title('Gov expenditure')
-axes[0][3].set_ylabel('Thousands of '+deflator_base_year+' $')
+# ## Compute HP filter of data
 
-axes[1][0].plot(capital.data)
-axes[1][0].set_title('Capital')
-axes[1][0].set_ylabel('Thousands of '+deflator_base_year+' $')
+# In[9]:
 
-axes[1][1].plot(hours.data)
-axes[1][1].set_title('Hours')
-axes[1][1].set_ylabel('Index ()'+hours_base_year+'=100)')
 
-axes[1][2].plot(tfp.data)
-axes[1][2].set_title('TFP')
+# HP filter to isolate trend and cyclical components. The filter is applied to all series in one stage since
+# series with the same date range are filtered together in a single solve (see hp_filter.py).
+@build.stage(inputs=['per_capita'],params={'lamb':1600})
+def hp(per_capita,lamb):
 
-axes[1][3].plot(m2.data)
-axes[1][3].set_title('M2')
-axes[1][3].set_ylabel('Thousands of '+deflator_base_year+' $')
+    # Series to filter: logs of the quantities and levels of the rates
+    logs = ['gdp','consumption','investment','government','exports','imports','capital','hours','tfp','m2']
+    levels = ['deflator','pce_deflator','cpi','tbill_3mo','unemployment']
 
-axes[2][0].plot(tbill_3mo.data*100)
-axes[2][0].set_title('3mo T-Bill')
-axes[2][0].set_ylabel('Percent')
+    hp_data = pd.DataFrame({name:(per_capita[name].log().data if name in logs else per_capita[name].data)
+                            for name in ['gdp','consumption','investment','government','exports','imports','capital',
+                                         'hours','tfp','deflator','pce_deflator','cpi','m2','tbill_3mo','unemployment']})
 
-axes[2][1].plot(pce_deflator.data*100)
-axes[2][1].set_title('PCE Inflation')
-axes[2][1].set_ylabel('Percent')
+    return hp_filter.filter_frame(hp_data,lamb=lamb)
 
-axes[2][2].plot(cpi.data*100)
-axes[2][2].set_title('CPI Inflation')
-axes[2][2].set_ylabel('Percent')
 
-axes[2][3].plot(unemployment.data*100)
-axes[2][3].set_title('Unemployment rate')
-axes[2][3].set_ylabel('Percent');
+# ## Create data files
 
+# In[10]:
 
-# ## Compute HP filter of data
 
-# In[9]:
+# Create a DataFrame with actual, trend, and cycle data
+@build.stage(inputs=['per_capita','hp'])
+def data(per_capita,hp):
+
+    # Names of the columns and of the corresponding series and HP filter columns
+    columns = [
+        ('gdp','gdp','gdp'),
+        ('consumption','consumption','consumption'),
+        ('investment','investment','investment'),
+        ('government','government','government'),
+        ('exports','exports','exports'),
+        ('imports','imports','imports'),
+        ('hours','hours','hours'),
+        ('capital','capital','capital'),
+        ('tfp','tfp','tfp'),
+        ('real_m2','m2','m2'),
+        ('t_bill_3mo','tbill_3mo','tbill_3mo'),
+        ('cpi_inflation','cpi','cpi'),
+        ('pce_inflation','pce_deflator','pce_deflator'),
+        ('unemployment','unemployment','unemployment'),
+    ]
+
+    # Trends of the series filtered in logs are converted back to levels
+    logs = ['gdp','consumption','investment','government','exports','imports','hours','capital','tfp','m2']
+
+    frame = {}
+    for column, name, hp_name in columns:
+        frame[column] = per_capita[name].data
+        frame[column+'_trend'] = np.exp(hp[hp_name+'_trend']) if name in logs else hp[hp_name+'_trend']
+        frame[column+'_cycle'] = hp[hp_name+'_cycle']
+
+    return pd.DataFrame(frame)
 
 
-# HP filter to isolate trend and cyclical components
-gdp_log_cycle,gdp_log_trend= gdp.log().hp_filter()
-consumption_log_cycle,consumption_log_trend= consumption.log().hp_filter()
-investment_log_cycle,investment_log_trend= investment.log().hp_filter()
-government_log_cycle,government_log_trend= government.log().hp_filter()
-exports_log_cycle,exports_log_trend= exports.log().hp_filter()
-imports_log_cycle,imports_log_trend= imports.log().hp_filter()
-# net_exports_log_cycle,net_exports_log_trend= net_exports.log().hp_filter()
-capital_log_cycle,capital_log_trend= capital.log().hp_filter()
-hours_log_cycle,hours_log_trend= hours.log().hp_filter()
-tfp_log_cycle,tfp_log_trend= tfp.log().hp_filter()
-deflator_cycle,deflator_trend= deflator.hp_filter()
-pce_deflator_cycle,pce_deflator_trend= pce_deflator.hp_filter()
-cpi_cycle,cpi_trend= cpi.hp_filter()
-m2_log_cycle,m2_log_trend= m2.log().hp_filter()
-tbill_3mo_cycle,tbill_3mo_trend= tbill_3mo.hp_filter()
-unemployment_cycle,unemployment_trend= unemployment.hp_filter()
+# In[11]:
 
 
-# ## Plot aggregate data with trends
+rbc_names = ['gdp','consumption','investment','hours','capital','tfp']
+business_cycle_names = ['gdp','consumption','investment','hours','capital','tfp','real_m2','t_bill_3mo','pce_inflation','unemployment']
 
-# In[10]:
+# One export stage per file so that the files are written in parallel and a file is rewritten only when
+# its columns changed
+def export_stage(filename,names,suffixes):
+
+    @build.stage(name='export_'+filename.split('.')[0],inputs=['data'],params={'filename':filename,'names':names,'suffixes':suffixes},files=[export_path+filename])
+    def export(data,filename,names,suffixes):
+
+        columns_ordered = [name+suffix for name in names for suffix in suffixes]
+        data[columns_ordered].dropna().to_csv(export_path+filename,index=True)
 
+# RBC data
+export_stage('rbc_data_actual_trend.csv',rbc_names,['','_trend'])
+export_stage('rbc_data_actual_trend_cycle.csv',rbc_names,['','_trend','_cycle'])
 
-fig, axes = plt.subplots(3,4,figsize=(6*4,4*3))
+# More comprehensive Business Cycle Data
+export_stage('business_cycle_data_actual_trend.csv',business_cycle_names,['','_trend'])
+export_stage('business_cycle_data_actual_trend_cycle.csv',business_cycle_names,['','_trend','_cycle'])
 
-axes[0][0].plot(gdp.data)
-axes[0][0].plot(np.exp(gdp_log_trend.data),c='r')
-axes[0][0].set_title('GDP')
-axes[0][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[0][1].plot(consumption.data)
-axes[0][1].plot(np.exp(consumption_log_trend.data),c='r')
-axes[0][1].set_title('Consumption')
-axes[0][1].set_ylabel('Thousands of '+deflator_base_year+' $')
+# Export metadata to csv
+@build.stage(inputs=['deflated'],files=[export_path+'business_cycle_metadata.csv'])
+def export_metadata(deflated):
 
-axes[0][2].plot(investment.data)
-axes[0][2].plot(np.exp(investment_log_trend.data),c='r')
-axes[0][2].set_title('Investment')
-axes[0][2].set_ylabel('Thousands of '+deflator_base_year+' $')
+    metadata = pd.Series({
+        'deflator_base_year':deflated['deflator_base_year'],
+        'hours_base_year':deflated['hours_base_year']
+    })
 
-axes[0][3].plot(government.data)
-axes[0][3].plot(np.exp(government_log_trend.data),c='r')
-axes[0][3].set_title('Gov expenditure')
-axes[0][3].set_ylabel('Thousands of '+deflator_base_year+' $')
+    metadata.to_csv(export_path+'business_cycle_metadata.csv')
 
-axes[1][0].plot(capital.data)
-axes[1][0].plot(np.exp(capital_log_trend.data),c='r')
-axes[1][0].set_title('Capital')
-axes[1][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[1][1].plot(hours.data)
-axes[1][1].plot(np.exp(hours_log_trend.data),c='r')
-axes[1][1].set_title('Hours')
-axes[1][1].set_ylabel('Index ()'+hours_base_year+'=100)')
+# ## Run the pipeline
 
-axes[1][2].plot(tfp.data)
-axes[1][2].plot(np.exp(tfp_log_trend.data),c='r')
-axes[1][2].set_title('TFP')
+# In[12]:
 
-axes[1][3].plot(m2.data)
-axes[1][3].plot(np.exp(m2_log_trend.data),c='r')
-axes[1][3].set_title('M2')
-axes[1][3].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[2][0].plot(tbill_3mo.data*100)
-axes[2][0].plot(tbill_3mo_trend.data*100,c='r')
-axes[2][0].set_title('3mo T-Bill')
-axes[2][0].set_ylabel('Percent')
+results = build.run()
+print(build.summary())
 
-axes[2][1].plot(pce_deflator.data*100)
-axes[2][1].plot(pce_deflator_trend.data*100,c='r')
-axes[2][1].set_title('PCE Inflation')
-axes[2][1].set_ylabel('Percent')
+# print calibrated values, also when the calibration stage was skipped:
+calibration = results['calibration']
+print('Avg saving rate:        ',round(calibration['s'],5))
+print('Avg annual labor growth:',round(4*calibration['n'],5))
+print('Avg annual gdp growth:  ',round(4*calibration['g'],5))
+print('Avg annual dep rate:    ',round(4*calibration['delta'],5))
 
-axes[2][2].plot(cpi.data*100)
-axes[2][2].plot(cpi_trend.data*100,c='r')
-axes[2][2].set_title('CPI Inflation')
-axes[2][2].set_ylabel('Percent')
+# Series used in the plots below
+series = results['per_capita']
 
-axes[2][3].plot(unemployment.data*100)
-axes[2][3].plot(unemployment_trend.data*100,c='r')
-axes[2][3].set_title('Unemployment rate')
-axes[2][3].set_ylabel('Percent')
+gdp = series['gdp']
+consumption = series['consumption']
+investment = series['investment']
+government = series['government']
+exports = series['exports']
+imports = series['imports']
+net_exports = series['net_exports']
+hours = series['hours']
+capital = series['capital']
+tfp = series['tfp']
+m2 = series['m2']
+tbill_3mo = series['tbill_3mo']
+pce_deflator = series['pce_deflator']
+cpi = series['cpi']
+deflator = series['deflator']
+unemployment = series['unemployment']
 
+deflator_base_year = series['deflator_base_year']
+hours_base_year = series['hours_base_year']
 
-ax = fig.add_subplot(1,1,1)
-ax.axis('off')
-ax.plot(0,0,label='Actual')
-ax.plot(0,0,c='r',label='Trend')
+hp = results['hp']
+data = results['data']
 
-ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.05),ncol=2)
 
+# ## Plot aggregate data
 
-# ## Plot cyclical components of the data
+# In[13]:
 
-# In[11]:
 
+if make_plots:
 
-fig, axes = plt.subplots(3,4,figsize=(6*4,4*3))
+    fig, axes = plt.subplots(3,4,figsize=(6*4,4*3))
 
-axes[0][0].plot(gdp_log_cycle.data)
-axes[0][0].set_title('GDP')
-axes[0][0].set_ylabel('Thousands of '+deflator_base_year+' $')
+    axes[0][0].plot(gdp.data)
+    axes[0][0].set_title('GDP')
+    axes[0][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[0][1].plot(consumption_log_cycle.data)
-axes[0][1].set_title('Consumption')
-axes[0][1].set_ylabel('Thousands of '+deflator_base_year+' $')
+    axes[0][1].plot(consumption.data)
+    axes[0][1].set_title('Consumption')
+    axes[0][1].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[0][2].plot(investment_log_cycle.data)
-axes[0][2].set_title('Investment')
-axes[0][2].set_ylabel('Thousands of '+deflator_base_year+' $')
+    axes[0][2].plot(investment.data)
+    axes[0][2].set_title('Investment')
+    axes[0][2].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[0][3].plot(government_log_cycle.data)
-axes[0][3].set_title('Gov expenditure')
-axes[0][3].set_ylabel('Thousands of '+deflator_base_year+' $')
+    axes[0][3].plot(government.data)
+    axes[0][3].set_title('Gov expenditure')
+    axes[0][3].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[1][0].plot(capital_log_cycle.data)
-axes[1][0].set_title('Capital')
-axes[1][0].set_ylabel('Thousands of '+deflator_base_year+' $')
+    axes[1][0].plot(capital.data)
+    axes[1][0].set_title('Capital')
+    axes[1][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[1][1].plot(hours_log_cycle.data)
-axes[1][1].set_title('Hours')
-axes[1][1].set_ylabel('Index ()'+hours_base_year+'=100)')
+    axes[1][1].plot(hours.data)
+    axes[1][1].set_title('Hours')
+    axes[1][1].set_ylabel('Index ()'+hours_base_year+'=100)')
 
-axes[1][2].plot(tfp_log_cycle.data)
-axes[1][2].set_title('TFP')
+    axes[1][2].plot(tfp.data)
+    axes[1][2].set_title('TFP')
 
-axes[1][3].plot(m2_log_cycle.data)
-axes[1][3].set_title('M2')
-axes[1][3].set_ylabel('Thousands of '+deflator_base_year+' $')
+    axes[1][3].plot(m2.data)
+    axes[1][3].set_title('M2')
+    axes[1][3].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-axes[2][0].plot(tbill_3mo_cycle.data)
-axes[2][0].set_title('3mo T-Bill')
-axes[2][0].set_ylabel('Percent')
+    axes[2][0].plot(tbill_3mo.data*100)
+    axes[2][0].set_title('3mo T-Bill')
+    axes[2][0].set_ylabel('Percent')
 
-axes[2][1].plot(pce_deflator_cycle.data)
-axes[2][1].set_title('PCE Inflation')
-axes[2][1].set_ylabel('Percent')
+    axes[2][1].plot(pce_deflator.data*100)
+    axes[2][1].set_title('PCE Inflation')
+    axes[2][1].set_ylabel('Percent')
 
-axes[2][2].plot(cpi_cycle.data)
-axes[2][2].set_title('CPI Inflation')
-axes[2][2].set_ylabel('Percent')
+    axes[2][2].plot(cpi.data*100)
+    axes[2][2].set_title('CPI Inflation')
+    axes[2][2].set_ylabel('Percent')
 
-axes[2][3].plot(unemployment_cycle.data)
-axes[2][3].set_title('Unemployment rate')
-axes[2][3].set_ylabel('Percent');
+    axes[2][3].plot(unemployment.data*100)
+    axes[2][3].set_title('Unemployment rate')
+    axes[2][3].set_ylabel('Percent');
 
 
-# ## Create data files
+# ## Plot aggregate data with trends
 
-# In[12]:
+# In[14]:
 
 
-# Create a DataFrame with actual and trend data
-data = pd.DataFrame({
-        'gdp':gdp.data,
-        'gdp_trend':np.exp(gdp_log_trend.data),
-        'gdp_cycle':gdp_log_cycle.data,
-        'consumption':consumption.data,
-        'consumption_trend':np.exp(consumption_log_trend.data),
-        'consumption_cycle':consumption_log_cycle.data,
-        'investment':investment.data,
-        'investment_trend':np.exp(investment_log_trend.data),
-        'investment_cycle':investment_log_cycle.data,
-        'government':government.data,
-        'government_trend':np.exp(government_log_trend.data),
-        'government_cycle':government_log_cycle.data,
-        'exports':exports.data,
-        'exports_trend':np.exp(exports_log_trend.data),
-        'exports_cycle':exports_log_cycle.data,
-        'imports':imports.data,
-        'imports_trend':np.exp(imports_log_trend.data),
-        'imports_cycle':imports_log_cycle.data,
-        'hours':hours.data,
-        'hours_trend':np.exp(hours_log_trend.data),
-        'hours_cycle':hours_log_cycle.data,
-        'capital':capital.data,
-        'capital_trend':np.exp(capital_log_trend.data),
-        'capital_cycle':capital_log_cycle.data,
-        'tfp':tfp.data,
-        'tfp_trend':np.exp(tfp_log_trend.data),
-        'tfp_cycle':tfp_log_cycle.data,
-        'real_m2':m2.data,
-        'real_m2_trend':np.exp(m2_log_trend.data),
-        'real_m2_cycle':m2_log_cycle.data,
-        't_bill_3mo':tbill_3mo.data,
-        't_bill_3mo_trend':tbill_3mo_trend.data,
-        't_bill_3mo_cycle':tbill_3mo_cycle.data,
-        'cpi_inflation':cpi.data,
-        'cpi_inflation_trend':cpi_trend.data,
-        'cpi_inflation_cycle':cpi_cycle.data,
-        'pce_inflation':pce_deflator.data,
-        'pce_inflation_trend':pce_deflator_trend.data,
-        'pce_inflation_cycle':pce_deflator_cycle.data,
-        'unemployment':unemployment.data,
-        'unemployment_trend':unemployment_trend.data,
-        'unemployment_cycle':unemployment_cycle.data,
-    })
+if make_plots:
 
+    fig, axes = plt.subplots(3,4,figsize=(6*4,4*3))
 
-# In[13]:
+    axes[0][0].plot(gdp.data)
+    axes[0][0].plot(np.exp(hp['gdp_trend']),c='r')
+    axes[0][0].set_title('GDP')
+    axes[0][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
+    axes[0][1].plot(consumption.data)
+    axes[0][1].plot(np.exp(hp['consumption_trend']),c='r')
+    axes[0][1].set_title('Consumption')
+    axes[0][1].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-# First 5 rows of data
-data.head()
+    axes[0][2].plot(investment.data)
+    axes[0][2].plot(np.exp(hp['investment_trend']),c='r')
+    axes[0][2].set_title('Investment')
+    axes[0][2].set_ylabel('Thousands of '+deflator_base_year+' $')
 
+    axes[0][3].plot(government.data)
+    axes[0][3].plot(np.exp(hp['government_trend']),c='r')
+    axes[0][3].set_title('Gov expenditure')
+    axes[0][3].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-# In[14]:
+    axes[1][0].plot(capital.data)
+    axes[1][0].plot(np.exp(hp['capital_trend']),c='r')
+    axes[1][0].set_title('Capital')
+    axes[1][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
+    axes[1][1].plot(hours.data)
+    axes[1][1].plot(np.exp(hp['hours_trend']),c='r')
+    axes[1][1].set_title('Hours')
+    axes[1][1].set_ylabel('Index ()'+hours_base_year+'=100)')
+
+    axes[1][2].plot(tfp.data)
+    axes[1][2].plot(np.exp(hp['tfp_trend']),c='r')
+    axes[1][2].set_title('TFP')
+
+    axes[1][3].plot(m2.data)
+    axes[1][3].plot(np.exp(hp['m2_trend']),c='r')
+    axes[1][3].set_title('M2')
+    axes[1][3].set_ylabel('Thousands of '+deflator_base_year+' $')
+
+    axes[2][0].plot(tbill_3mo.data*100)
+    axes[2][0].plot(hp['tbill_3mo_trend']*100,c='r')
+    axes[2][0].set_title('3mo T-Bill')
+    axes[2][0].set_ylabel('Percent')
+
+    axes[2][1].plot(pce_deflator.data*100)
+    axes[2][1].plot(hp['pce_deflator_trend']*100,c='r')
+    axes[2][1].set_title('PCE Inflation')
+    axes[2][1].set_ylabel('Percent')
+
+    axes[2][2].plot(cpi.data*100)
+    axes[2][2].plot(hp['cpi_trend']*100,c='r')
+    axes[2][2].set_title('CPI Inflation')
+    axes[2][2].set_ylabel('Percent')
+
+    axes[2][3].plot(unemployment.data*100)
+    axes[2][3].plot(hp['unemployment_trend']*100,c='r')
+    axes[2][3].set_title('Unemployment rate')
+    axes[2][3].set_ylabel('Percent')
 
-# Last 5 rows of data
-data.tail()
 
+    ax = fig.add_subplot(1,1,1)
+    ax.axis('off')
+    ax.plot(0,0,label='Actual')
+    ax.plot(0,0,c='r',label='Trend')
+
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.05),ncol=2)
+
+
+# ## Plot cyclical components of the data
 
 # In[15]:
 
 
-# RBC data
-columns_ordered =[]
-names = ['gdp','consumption','investment','hours','capital','tfp']
-for name in names:
-    columns_ordered.append(name)
-    columns_ordered.append(name+'_trend')
-    
-data[columns_ordered].dropna().to_csv(export_path+'rbc_data_actual_trend.csv',index=True)
+if make_plots:
 
-# Create a DataFrame with actual, trend, and cycle data
-columns_ordered =[]
-names = ['gdp','consumption','investment','hours','capital','tfp']
-for name in names:
-    columns_ordered.append(name)
-    columns_ordered.append(name+'_trend')
-    columns_ordered.append(name+'_cycle')
-    
-data[columns_ordered].dropna().to_csv(export_path+'rbc_data_actual_trend_cycle.csv',index=True)
+    fig, axes = plt.subplots(3,4,figsize=(6*4,4*3))
 
+    axes[0][0].plot(hp['gdp_cycle'])
+    axes[0][0].set_title('GDP')
+    axes[0][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-# In[16]:
+    axes[0][1].plot(hp['consumption_cycle'])
+    axes[0][1].set_title('Consumption')
+    axes[0][1].set_ylabel('Thousands of '+deflator_base_year+' $')
 
+    axes[0][2].plot(hp['investment_cycle'])
+    axes[0][2].set_title('Investment')
+    axes[0][2].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-# More comprehensive Business Cycle Data
-columns_ordered =[]
-names = ['gdp','consumption','investment','hours','capital','tfp','real_m2','t_bill_3mo','pce_inflation','unemployment']
-for name in names:
-    columns_ordered.append(name)
-    columns_ordered.append(name+'_trend')
+    axes[0][3].plot(hp['government_cycle'])
+    axes[0][3].set_title('Gov expenditure')
+    axes[0][3].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-data[columns_ordered].dropna().to_csv(export_path+'business_cycle_data_actual_trend.csv',index=True)
+    axes[1][0].plot(hp['capital_cycle'])
+    axes[1][0].set_title('Capital')
+    axes[1][0].set_ylabel('Thousands of '+deflator_base_year+' $')
 
-# Create a DataFrame with actual, trend, and cycle data
-columns_ordered =[]
-names = ['gdp','consumption','investment','hours','capital','tfp','real_m2','t_bill_3mo','pce_inflation','unemployment']
-for name in names:
-    columns_ordered.append(name)
-    columns_ordered.append(name+'_trend')
-    columns_ordered.append(name+'_cycle')
-    
-data[columns_ordered].dropna().to_csv(export_path+'business_cycle_data_actual_trend_cycle.csv')
+    axes[1][1].plot(hp['hours_cycle'])
+    axes[1][1].set_title('Hours')
+    axes[1][1].set_ylabel('Index ()'+hours_base_year+'=100)')
 
+    axes[1][2].plot(hp['tfp_cycle'])
+    axes[1][2].set_title('TFP')
 
-# In[17]:
+    axes[1][3].plot(hp['m2_cycle'])
+    axes[1][3].set_title('M2')
+    axes[1][3].set_ylabel('Thousands of '+deflator_base_year+' $')
 
+    axes[2][0].plot(hp['tbill_3mo_cycle'])
+    axes[2][0].set_title('3mo T-Bill')
+    axes[2][0].set_ylabel('Percent')
 
-# Export metadata to csv
-metadata = pd.Series({
-    'deflator_base_year':deflator_base_year,
-    'hours_base_year':hours_base_year
-})
+    axes[2][1].plot(hp['pce_deflator_cycle'])
+    axes[2][1].set_title('PCE Inflation')
+    axes[2][1].set_ylabel('Percent')
+
+    axes[2][2].plot(hp['cpi_cycle'])
+    axes[2][2].set_title('CPI Inflation')
+    axes[2][2].set_ylabel('Percent')
+
+    axes[2][3].plot(hp['unemployment_cycle'])
+    axes[2][3].set_title('Unemployment rate')
+    axes[2][3].set_ylabel('Percent');
 
-metadata.to_csv(export_path+'business_cycle_metadata.csv')
+
+# In[16]:
+
+
+# First 5 rows of data
+data.head()
+
+
+# In[17]:
+
+
+# Last 5 rows of data
+data.tail()
 
@@ -4,8 +4,9 @@
 # In[1]:
 
 
-import numpy as np
 import pandas as pd
+import pwt_loader
+import pwt_upgrade
 
 
 # 0. Preliminaries
@@ -13,12 +14,18 @@ import pandas as pd
 # Set the current value of the PWT data file
 current_pwt_file = 'pwt100.xlsx'
 
+# Upgrade mode: Set to the PWT file that the existing csv files were built from (e.g., 'pwt91.xlsx') to
+# recompute only the countries whose data changed and write a change report. Set to None for a full rebuild.
+previous_pwt_file = None
+
 # Export path: Set to empty string '' if you want to export data to current directory
 export_path = '../Csv/'
 
 
 # 1. Import data
-pwt = pd.read_excel('https://www.rug.nl/ggdc/docs/'+current_pwt_file,sheet_name='Data')
+
+# Load only the required columns. The workbook is downloaded and converted to columnar form on first use
+pwt = pwt_loader.load(current_pwt_file,columns=['countrycode','country','year','rgdpo','emp','pop'])
 
 
 # 2. Manage data
@@ -32,36 +39,66 @@ pwt['rgdp_pw'] = pwt['rgdpo']/pwt['emp']
 # Construct GDP per worker column
 pwt['rgdp_pc'] = pwt['rgdpo']/pwt['pop']
 
-# Create array of years in data
-years = pwt['year'].unique()
-
-# Create array of countries in data
+# Create array of countries in data, in order of appearance
 countries = pwt['country'].unique()
 
+# In upgrade mode, keep only countries with data that changed since the previous release
+if previous_pwt_file is not None:
+
+    changes = pwt_upgrade.diff(previous_pwt_file,current_pwt_file,columns=['country','rgdpo','emp','pop'])
+    changed_codes = changes['countrycode'].unique()
+
+    pwt = pwt[pwt['countrycode'].isin(changed_codes)]
+
 
 # 3. Construct new DataFrames and export to csv
 
-# Iterate over two measures of GDP per person: GDP per worker and GDP per capita
-for gdp_scaling in ['rgdp_pw','rgdp_pc']:
-    
-    # Construct empty dictionary that will be used to construct a DataFrame
-    new_data = {}
-    
-    # Iterate over all countries
-    for c in countries:
-        
-        # Append GDP values to dictionary
-        new_data[c] = np.round(pwt[pwt['country']==c][gdp_scaling].values,2)
-    
-    # Construct DataFrame
-    data = pd.DataFrame(new_data,index = years)
-    
-    # Remove observations prior to 1960 and drop missing values
-    data = data.loc[1960:].dropna(axis=1)
-    
+# Two measures of GDP per person: GDP per worker and GDP per capita
+gdp_scalings = ['rgdp_pw','rgdp_pc']
+
+# Reshape both measures at once into a wide table with years as rows and (measure, country) as columns
+data = pwt.pivot(index='year',columns='country',values=gdp_scalings)
+
+# Restore the original order of countries. pivot() sorts columns alphabetically
+data = data.reindex(columns=pd.MultiIndex.from_product([gdp_scalings,pwt['country'].unique()]))
+
+# Round, remove observations prior to 1960, and drop countries with missing values
+data = data.round(2).loc[1960:].dropna(axis=1)
+
+# Differences between the previous and new csv files by file name
+output_changes = {}
+
+for gdp_scaling in gdp_scalings:
+
     # Path of new file ()
-    filepath = export_path+'cross_country_gdp_'+gdp_scaling[-2:]+'.csv'
-    
-    # Export data
-    data.to_csv(filepath,index_label='Year')
+    filename = 'cross_country_gdp_'+gdp_scaling[-2:]+'.csv'
+    filepath = export_path+filename
+
+    # Columns for the current measure. Boolean selection also works when no country is left
+    table = data.loc[:,data.columns.get_level_values(0)==gdp_scaling].droplevel(0,axis=1)
+
+    if previous_pwt_file is None:
+
+        # Export data
+        table.to_csv(filepath,index_label='Year')
+
+    else:
+
+        # Merge recomputed countries into the existing file and rewrite it only if something changed
+        previous_data = pd.read_csv(filepath,index_col='Year')
+        new_data = pwt_upgrade.update_table(previous_data,table,changed_codes,order=countries,axis=1)
+
+        output_changes[filename] = pwt_upgrade.compare_tables(previous_data,new_data)
+
+        if not pwt_upgrade.is_unchanged(output_changes[filename]):
+            new_data.to_csv(filepath,index_label='Year')
+
+# Write change report
+if previous_pwt_file is not None:
+
+    pwt_upgrade.update_report(
+        export_path+'pwt_changes.json',previous_pwt_file,current_pwt_file,
+        inputs={'cross_country_gdp.py':pwt_upgrade.summarize_changes(changes)},
+        outputs=output_changes
+    )
 
@@ -5,6 +5,8 @@
 
 
 import pandas as pd
+import pwt_loader
+import pwt_upgrade
 
 
 # 0. Preliminaries
@@ -12,23 +14,29 @@ import pandas as pd
 # Set the current value of the PWT data file
 current_pwt_file = 'pwt100.xlsx'
 
+# Upgrade mode: Set to the PWT file that the existing csv files were built from (e.g., 'pwt91.xlsx') to
+# recompute only the countries whose data changed and write a change report. Set to None for a full rebuild.
+previous_pwt_file = None
+
 # Export path: Set to empty string '' if you want to export data to current directory
 export_path = '../Csv/'
 
 
 # 1. Import data
-data = pd.read_excel('https://www.rug.nl/ggdc/docs/'+current_pwt_file,sheet_name='Data')
 
+# Load only the required columns. The workbook is downloaded and converted to columnar form on first use
+data = pwt_loader.load(current_pwt_file,columns=['countrycode','country','year','cgdpo','emp','hc','ck'])
 
-# 2. Metadata
+# Differences between the previous and new csv files by file name
+output_changes = {}
 
-# Find PWT version
-info = pd.read_excel('https://www.rug.nl/ggdc/docs/'+current_pwt_file,sheet_name='Info',header=None)
-legend = pd.read_excel('https://www.rug.nl/ggdc/docs/'+current_pwt_file,sheet_name='Legend',index_col=0)
-version = info.iloc[0][0].split(' ')[-1]
 
-# Find base year for real variables
-base_year = legend.loc['rgdpe']['Variable definition'].split(' ')[-1].split('US')[0]
+# 2. Metadata
+
+# PWT version and base year for real variables are stored with the converted data
+pwt_metadata = pwt_loader.metadata(current_pwt_file)
+version = pwt_metadata['version']
+base_year = pwt_metadata['base_year']
 
 # Most recent year
 final_year = data[data['countrycode']=='USA'].sort_values('year')['year'].iloc[0]
@@ -40,8 +48,16 @@ metadata['base_year'] = base_year
 metadata['final_year'] = final_year
 metadata['gdp_per_capita_units'] = base_year+' dollars per person'
 
-# Export metadata
-metadata.to_csv(export_path+'pwt_metadata.csv')
+# Export metadata. In upgrade mode, rewrite the file only if a value changed
+if previous_pwt_file is None:
+    metadata.to_csv(export_path+'pwt_metadata.csv')
+
+else:
+    previous_metadata = pd.read_csv(export_path+'pwt_metadata.csv',index_col=0,dtype=str)
+    output_changes['pwt_metadata.csv'] = pwt_upgrade.compare_tables(previous_metadata,metadata.astype(str).to_frame())
+
+    if not pwt_upgrade.is_unchanged(output_changes['pwt_metadata.csv']):
+        metadata.to_csv(export_path+'pwt_metadata.csv')
 
 
 # 3. Create dataset
@@ -49,6 +65,24 @@ metadata.to_csv(export_path+'pwt_metadata.csv')
 # Variable equals last year in data
 year = data.year.iloc[-1]
 
+# ISO codes of all countries in order of appearance
+countries = data['countrycode'].unique()
+
+# In upgrade mode, keep only countries with final-year data that changed since the previous release. If the
+# final year itself changed, every country is recomputed.
+if previous_pwt_file is not None:
+
+    changes = pwt_upgrade.diff(previous_pwt_file,current_pwt_file,columns=['country','cgdpo','emp','hc','ck'])
+
+    previous_year = pwt_loader.load(previous_pwt_file,columns=['year'])['year'].iloc[-1]
+
+    if previous_year==year:
+        changed_codes = changes.loc[changes['year']==year,'countrycode'].unique()
+    else:
+        changed_codes = countries
+
+    data = data[data['countrycode'].isin(changed_codes)]
+
 # Restrict data to final year
 data = data[data['year']==year].reset_index()
 
@@ -63,5 +97,24 @@ data = data.dropna()
 
 
 # 4. Export data
-data[['country_code','country','gdp','labor','human_capital','physical_capital']].to_csv(export_path+'cross_country_production.csv',index=False)
+if previous_pwt_file is None:
+    data[['country_code','country','gdp','labor','human_capital','physical_capital']].to_csv(export_path+'cross_country_production.csv',index=False)
+
+else:
+
+    # Merge recomputed countries into the existing file and rewrite it only if something changed
+    previous_data = pd.read_csv(export_path+'cross_country_production.csv',index_col='country_code')
+    new_data = pwt_upgrade.update_table(previous_data,data.set_index('country_code'),changed_codes,order=countries,axis=0)
+
+    output_changes['cross_country_production.csv'] = pwt_upgrade.compare_tables(previous_data,new_data)
+
+    if not pwt_upgrade.is_unchanged(output_changes['cross_country_production.csv']):
+        new_data.reset_index()[['country_code','country','gdp','labor','human_capital','physical_capital']].to_csv(export_path+'cross_country_production.csv',index=False)
+
+    # Write change report
+    pwt_upgrade.update_report(
+        export_path+'pwt_changes.json',previous_pwt_file,current_pwt_file,
+        inputs={'cross_country_production.py':pwt_upgrade.summarize_changes(changes)},
+        outputs=output_changes
+    )
 
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Local, content-addressed cache for files downloaded over HTTP.
+
+Each downloaded file is stored once in the cache directory under the SHA-256 hash of its contents. An index
+file maps every URL to the hash of its most recent download, so two URLs that serve identical bytes share one
+copy on disk. When the total size of the cache exceeds a limit, the least recently used files are deleted.
+
+In offline mode nothing is downloaded and only files already in the cache are returned. Offline mode can be
+switched on for a whole run by setting the environment variable DOWNLOAD_CACHE_OFFLINE=1.
+
+get_json() queries a JSON web API and retries failed requests with exponential backoff. It is shared by the
+FRED and World Bank downloads in fred_download.py and wb_fetch.py.
+
+Example:
+
+    from download_cache import fetch
+
+    path = fetch('https://www.rug.nl/ggdc/docs/pwt100.xlsx')
+    data = pd.read_excel(path,sheet_name='Data')
+'''
+
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import urllib.request
+
+import requests
+
+
+# Default location of the cache: a hidden directory next to this file
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),'.cache')
+
+# Default upper bound on the total size of cached files: 2 GB
+default_max_size = 2*1024**3
+
+# Size of the blocks read from the network and hashed
+chunk_size = 1024**2
+
+# HTTP status codes for which an API request is retried: rate limit exceeded and transient server errors
+retry_status_codes = [429,500,502,503,504]
+
+
+def is_offline():
+
+    '''Return True if offline mode is switched on by the DOWNLOAD_CACHE_OFFLINE environment variable'''
+
+    return os.environ.get('DOWNLOAD_CACHE_OFFLINE','').lower() in ['1','true','yes']
+
+
+def load_index(cache_dir=default_cache_dir):
+
+    '''Load the URL index of the cache.
+
+    Args:
+        cache_dir (str):    Cache directory
+
+    Returns:
+        dict mapping URLs to dicts with keys 'sha256', 'filename', 'size', 'downloaded', and 'accessed'
+    '''
+
+    try:
+        with open(os.path.join(cache_dir,'index.json')) as file:
+            return json.load(file)
+    except (FileNotFoundError,json.JSONDecodeError):
+        return {}
+
+
+def save_index(index,cache_dir=default_cache_dir):
+
+    '''Write the URL index of the cache. The file is replaced atomically so that an interrupted run cannot
+    leave a half-written index behind.
+
+    Args:
+        index (dict):       URL index as returned by load_index()
+        cache_dir (str):    Cache directory
+
+    Returns:
+        None
+    '''
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir,suffix='.json')
+    with os.fdopen(fd,'w') as file:
+        json.dump(index,file,indent=4)
+    os.replace(tmp_path,os.path.join(cache_dir,'index.json'))
+
+
+def cached_path(url,cache_dir=default_cache_dir):
+
+    '''Return the local path of the cached copy of url, or None if url is not in the cache'''
+
+    entry = load_index(cache_dir).get(url)
+
+    if entry is not None:
+        path = os.path.join(cache_dir,entry['filename'])
+        if os.path.exists(path):
+            return path
+
+    return None
+
+
+def download(url,cache_dir=default_cache_dir):
+
+    '''Download url into the cache directory, hashing the contents while they are written.
+
+    Args:
+        url (str):          Address of the file
+        cache_dir (str):    Cache directory
+
+    Returns:
+        tuple: SHA-256 hex digest, file name inside the cache directory, and size in bytes
+    '''
+
+    # Keep the file extension so that readers like pd.read_excel() can infer the file type
+    extension = os.path.splitext(url.split('?')[0])[1]
+
+    sha256 = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir,suffix='.part')
+
+    try:
+        with urllib.request.urlopen(url) as response, os.fdopen(fd,'wb') as file:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                file.write(chunk)
+                size+=len(chunk)
+
+        filename = sha256.hexdigest()+extension
+
+        # Identical content already stored under another URL is kept only once
+        if os.path.exists(os.path.join(cache_dir,filename)):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path,os.path.join(cache_dir,filename))
+
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return sha256.hexdigest(), filename, size
+
+
+def evict(index,max_size,keep=None,cache_dir=default_cache_dir):
+
+    '''Delete least recently used files until the total size of the cache is at most max_size.
+
+    Args:
+        index (dict):       URL index as returned by load_index(). Modified in place.
+        max_size (int):     Upper bound on the total size of cached files in bytes
+        keep (str):         File name that must not be deleted, e.g., the file that was just downloaded
+        cache_dir (str):    Cache directory
+
+    Returns:
+        list of deleted file names
+    '''
+
+    # Collect size and most recent access time of each stored file. Several URLs may point to one file.
+    files = {}
+    for entry in index.values():
+        filename = entry['filename']
+        accessed = max(entry['accessed'],files.get(filename,{}).get('accessed',0))
+        files[filename] = {'size':entry['size'],'accessed':accessed}
+
+    total_size = sum(f['size'] for f in files.values())
+
+    deleted = []
+
+    for filename in sorted(files,key=lambda f: files[f]['accessed']):
+
+        if total_size<=max_size:
+            break
+
+        if filename==keep:
+            continue
+
+        path = os.path.join(cache_dir,filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+        total_size-=files[filename]['size']
+        deleted.append(filename)
+
+    # Drop URLs whose file has been deleted
+    for url in [u for u,entry in index.items() if entry['filename'] in deleted]:
+        del index[url]
+
+    return deleted
+
+
+def fetch(url,cache_dir=default_cache_dir,offline=None,refresh=False,max_size=default_max_size):
+
+    '''Return the path of a local copy of url, downloading the file only if it is not already cached.
+
+    Args:
+        url (str):          Address of the file
+        cache_dir (str):    Cache directory. Created if it does not exist.
+        offline (bool):     If True, never download and raise FileNotFoundError for files not in the cache.
+                                Defaults to the value of the DOWNLOAD_CACHE_OFFLINE environment variable.
+        refresh (bool):     If True, download the file again even if it is cached. Ignored in offline mode.
+        max_size (int):     Upper bound on the total size of cached files in bytes
+
+    Returns:
+        str
+    '''
+
+    if offline is None:
+        offline = is_offline()
+
+    os.makedirs(cache_dir,exist_ok=True)
+
+    index = load_index(cache_dir)
+    entry = index.get(url)
+
+    path = None
+    if entry is not None and os.path.exists(os.path.join(cache_dir,entry['filename'])):
+        path = os.path.join(cache_dir,entry['filename'])
+
+    if path is not None and (offline or not refresh):
+        entry['accessed'] = time.time()
+        save_index(index,cache_dir)
+        return path
+
+    if offline:
+        raise FileNotFoundError('Offline mode: '+url+' is not in the cache at '+cache_dir)
+
+    sha256, filename, size = download(url,cache_dir)
+
+    now = time.time()
+    index[url] = {'sha256':sha256,'filename':filename,'size':size,'downloaded':now,'accessed':now}
+
+    # Remove the previous version of this URL if no other URL still points to it
+    if entry is not None and entry['filename']!=filename:
+        if not any(e['filename']==entry['filename'] for e in index.values()):
+            old_path = os.path.join(cache_dir,entry['filename'])
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+    evict(index,max_size,keep=filename,cache_dir=cache_dir)
+    save_index(index,cache_dir)
+
+    return os.path.join(cache_dir,filename)
+
+
+def clear(cache_dir=default_cache_dir):
+
+    '''Delete the cache directory and everything in it'''
+
+    shutil.rmtree(cache_dir,ignore_errors=True)
+
+
+def get_json(url,parameters,max_retries=5,backoff=1.0,rate_limiter=None,timeout=30):
+
+    '''Query a web API and return the decoded JSON response, retrying failed requests with exponential backoff.
+
+    Args:
+        url (str):              Address of the endpoint
+        parameters (dict):      Query parameters
+        max_retries (int):      Number of times a failed request is retried
+        backoff (float):        Delay before the first retry in seconds. Doubles on every retry.
+        rate_limiter (object):  Shared limiter whose wait() method blocks until the next request may start,
+                                    e.g., fred_download.RateLimiter. No limit if None.
+        timeout (float):        Timeout of a single request in seconds
+
+    Returns:
+        decoded JSON response
+    '''
+
+    for attempt in range(max_retries+1):
+
+        if rate_limiter is not None:
+            rate_limiter.wait()
+
+        retry_after = None
+
+        try:
+            r = requests.get(url,params=parameters,timeout=timeout)
+
+        except (requests.ConnectionError,requests.Timeout):
+            if attempt==max_retries:
+                raise
+
+        else:
+            if r.status_code==200:
+                return r.json()
+
+            if r.status_code not in retry_status_codes or attempt==max_retries:
+                r.raise_for_status()
+
+            # Respect the server's Retry-After header when the rate limit is exceeded
+            try:
+                retry_after = float(r.headers.get('Retry-After'))
+            except (TypeError,ValueError):
+                pass
+
+        # Exponential backoff with jitter so that parallel workers do not retry in lockstep
+        delay = backoff*2**attempt*(1+random.random())/2
+        if retry_after is not None:
+            delay = max(delay,retry_after)
+
+        time.sleep(delay)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Persistent on-disk cache of FRED series with incremental updates.
+
+Each series is stored in two files in the cache directory: <SERIES_ID>.csv with one row per observation and
+<SERIES_ID>.json with the series metadata returned by the 'fred/series' endpoint. Every observation carries a
+realtime_start stamp, the date on which the cached value was first retrieved, so a cached file records which
+vintage each value comes from.
+
+A refresh proceeds in steps and stops as soon as it has an answer:
+
+1. Request the series metadata (one small request). If 'last_updated' and the units are unchanged, the
+   cached observations are current and no observations are downloaded.
+2. If the series was updated, request only the observations from revision_periods before the end of the
+   cached data onwards. Values inside this window replace the cached ones and new observations are appended.
+3. If the oldest observation of the window was revised too, or the units or frequency changed (as happens
+   with a comprehensive revision or a change of base year), revisions may reach further back and the whole
+   history is downloaded again.
+
+In offline mode no requests are made and only cached series are returned.
+
+Example:
+
+    import fredpy as fp
+    import fred_cache
+
+    fp.api_key = fp.load_api_key('fred_api_key.txt')
+    series = fred_cache.load_all(['GDP','PCEC','GPDI'])
+'''
+
+import datetime
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+import fred_download
+from download_cache import default_cache_dir, is_offline
+
+
+# Directory holding the cached series
+default_fred_cache_dir = os.path.join(default_cache_dir,'fred')
+
+# Metadata fields that, when changed, indicate that the entire history may have been revised
+history_fields = ['units','frequency_short','seasonal_adjustment_short','observation_start']
+
+
+def cache_paths(series_id,cache_dir=default_fred_cache_dir):
+
+    '''Return the paths of the observation and metadata files of a series'''
+
+    name = series_id.upper()
+
+    return os.path.join(cache_dir,name+'.csv'), os.path.join(cache_dir,name+'.json')
+
+
+def read_cache(series_id,cache_dir=default_fred_cache_dir):
+
+    '''Read a cached series.
+
+    Args:
+        series_id (str):    FRED series ID
+        cache_dir (str):    Cache directory
+
+    Returns:
+        tuple: metadata dict and Pandas DataFrame with columns 'date', 'value', and 'realtime_start', or
+            (None, None) if the series is not cached
+    '''
+
+    csv_path, json_path = cache_paths(series_id,cache_dir)
+
+    if not (os.path.exists(csv_path) and os.path.exists(json_path)):
+        return None, None
+
+    with open(json_path) as file:
+        meta = json.load(file)
+
+    # Keep values as strings exactly as FRED returns them, including '.' for missing values
+    observations = pd.read_csv(csv_path,dtype=str,keep_default_na=False)
+
+    return meta, observations
+
+
+def write_cache(series_id,meta,observations,cache_dir=default_fred_cache_dir):
+
+    '''Write a series to the cache. Both files are replaced atomically.
+
+    Args:
+        series_id (str):                    FRED series ID
+        meta (dict):                        Metadata with keys 'info', 'refreshed', and 'mode'
+        observations (Pandas DataFrame):    Columns 'date', 'value', and 'realtime_start'
+        cache_dir (str):                    Cache directory
+
+    Returns:
+        None
+    '''
+
+    os.makedirs(cache_dir,exist_ok=True)
+
+    csv_path, json_path = cache_paths(series_id,cache_dir)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir,suffix='.csv')
+    with os.fdopen(fd,'w',newline='') as file:
+        observations[['date','value','realtime_start']].to_csv(file,index=False)
+    os.replace(tmp_path,csv_path)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir,suffix='.json')
+    with os.fdopen(fd,'w') as file:
+        json.dump(meta,file,indent=4)
+    os.replace(tmp_path,json_path)
+
+
+def request_observations(series_id,today,observation_start=None,**kwargs):
+
+    '''Request current observations of a series, optionally only from observation_start onwards.
+
+    Returns:
+        Pandas DataFrame with columns 'date', 'value', and 'realtime_start' (set to today)
+    '''
+
+    parameters = {'series_id':series_id,'realtime_start':today,'realtime_end':today}
+
+    if observation_start is not None:
+        parameters['observation_start'] = observation_start
+
+    observations = fred_download.api_request('fred/series/observations',parameters,**kwargs)['observations']
+
+    observations = pd.DataFrame(observations,columns=['date','value'])
+    observations['realtime_start'] = today
+
+    return observations
+
+
+def merge_tail(cached,tail,keep_history=True):
+
+    '''Merge newly downloaded observations into cached ones.
+
+    Values that did not change keep the realtime_start stamp of their original retrieval.
+
+    Args:
+        cached (Pandas DataFrame):  Cached observations
+        tail (Pandas DataFrame):    Observations from some date onwards
+        keep_history (bool):        Whether to keep the cached observations before the first date of tail. False
+                                        for a full download, which replaces the cached history.
+
+    Returns:
+        tuple: merged Pandas DataFrame and True if the oldest observation of tail revised a cached value
+    '''
+
+    if len(tail)==0:
+        return (cached if keep_history else tail), False
+
+    start = tail['date'].iloc[0]
+
+    old = cached[cached['date']>=start].set_index('date')
+    new = tail.set_index('date')
+
+    # Keep the original stamp of unchanged values
+    unchanged = new.index.intersection(old.index)
+    unchanged = unchanged[old.loc[unchanged,'value'].values==new.loc[unchanged,'value'].values]
+    new.loc[unchanged,'realtime_start'] = old.loc[unchanged,'realtime_start']
+
+    # If the first value of the window was revised, revisions may reach further back than the window
+    revised_at_start = start in old.index and old.loc[start,'value']!=new.loc[start,'value']
+
+    if keep_history:
+        merged = pd.concat([cached[cached['date']<start],new.reset_index()],ignore_index=True)
+    else:
+        merged = new.reset_index()
+
+    return merged, revised_at_start
+
+
+def load_series(series_id,cache_dir=default_fred_cache_dir,offline=None,revision_periods=12,**kwargs):
+
+    '''Return a series from the cache, refreshing it from FRED with as few observations as possible.
+
+    Args:
+        series_id (str):        FRED series ID
+        cache_dir (str):        Cache directory
+        offline (bool):         If True, make no requests and raise FileNotFoundError for series not in the
+                                    cache. Defaults to the DOWNLOAD_CACHE_OFFLINE environment variable.
+        revision_periods (int): Number of most recent cached observations that are requested again on an
+                                    incremental update to pick up revisions
+        **kwargs:               Passed to fred_download.api_request()
+
+    Returns:
+        fredpy series
+    '''
+
+    if offline is None:
+        offline = is_offline()
+
+    today = datetime.datetime.today().strftime('%Y-%m-%d')
+
+    meta, cached = read_cache(series_id,cache_dir)
+
+    if offline:
+        if meta is None:
+            raise FileNotFoundError('Offline mode: FRED series '+series_id+' is not in the cache at '+cache_dir)
+
+        return fred_download.to_series(series_id,meta['info'],cached.to_dict('records'),meta['refreshed'])
+
+    parameters = {'series_id':series_id,'realtime_start':today,'realtime_end':today}
+    info = fred_download.api_request('fred/series',parameters,**kwargs)['seriess'][0]
+
+    if meta is None:
+        mode = 'full'
+        observations = request_observations(series_id,today,**kwargs)
+
+    elif any(info.get(f)!=meta['info'].get(f) for f in history_fields):
+        mode = 'full'
+        observations = merge_tail(cached,request_observations(series_id,today,**kwargs),keep_history=False)[0]
+
+    elif info['last_updated']==meta['info']['last_updated']:
+        mode = 'unchanged'
+        observations = cached
+
+    else:
+        mode = 'incremental'
+        start = cached['date'].iloc[max(len(cached)-revision_periods,0)]
+        tail = request_observations(series_id,today,observation_start=start,**kwargs)
+        observations, revised_at_start = merge_tail(cached,tail)
+
+        if revised_at_start:
+            mode = 'full'
+            observations = merge_tail(cached,request_observations(series_id,today,**kwargs),keep_history=False)[0]
+
+    write_cache(series_id,{'info':info,'refreshed':today,'mode':mode},observations,cache_dir)
+
+    return fred_download.to_series(series_id,info,observations.to_dict('records'),today)
+
+
+def series_content(series):
+
+    '''Return the observations and metadata of a fredpy series without the date on which it was retrieved, so that
+    the content hash of a series only changes when the data or its description change'''
+
+    content = {name:value for name,value in vars(series).items() if name not in ['data','observation_date']}
+    content['data'] = (series.data.index.to_numpy(),series.data.to_numpy())
+
+    return content
+
+
+def load_all(series_ids,cache_dir=default_fred_cache_dir,offline=None,max_workers=8,requests_per_minute=120,register_series=True,**kwargs):
+
+    '''Load several series through the cache concurrently and print how each one was refreshed.
+
+    Args:
+        series_ids (list):          FRED series IDs
+        cache_dir (str):            Cache directory
+        offline (bool):             If True, make no requests. Defaults to the DOWNLOAD_CACHE_OFFLINE
+                                        environment variable.
+        max_workers (int):          Maximum number of simultaneous refreshes
+        requests_per_minute (int):  Upper bound on the request rate shared by all workers
+        register_series (bool):     Whether to add the series to fredpy's session cache
+        **kwargs:                   Passed to load_series() and fred_download.api_request()
+
+    Returns:
+        dict of fredpy series with series IDs as keys, in the order of series_ids
+    '''
+
+    if offline is None:
+        offline = is_offline()
+
+    kwargs.setdefault('rate_limiter',fred_download.RateLimiter(requests_per_minute))
+
+    loaded = fred_download.map_concurrently(load_series,series_ids,max_workers,cache_dir=cache_dir,offline=offline,**kwargs)
+
+    # Summarize refresh modes recorded in the cache
+    modes = {}
+    for series_id in series_ids:
+        mode = 'offline' if offline else read_cache(series_id,cache_dir)[0]['mode']
+        modes[mode] = modes.get(mode,0)+1
+
+    print('FRED cache: '+', '.join(str(n)+' '+mode for mode,n in modes.items()))
+
+    if register_series:
+        fred_download.register(loaded,datetime.datetime.today().strftime('%Y-%m-%d'))
+
+    return loaded
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Concurrent requests to the FRED API.
+
+fredpy downloads one series at a time, so fetching the dozen or so series used by business_cycle_data.py takes
+the sum of all of the round trips. The functions here are the request layer of fred_cache.py: api_request()
+queries the API and retries failed requests with exponential backoff, RateLimiter spaces requests to stay under
+the FRED API rate limit (120 requests per minute), map_concurrently() runs the requests for several series from
+a bounded thread pool, and to_series() turns the responses into ordinary fredpy series objects. register() adds
+series to fredpy's session cache so that later calls like fp.series('CNP16OV') do not hit the network again.
+
+The API address is a parameter so that the functions can be run against a local server that mimics the
+FRED API (the 'fred/series' and 'fred/series/observations' endpoints with file_type=json).
+
+Example:
+
+    import fredpy as fp
+    import fred_download
+
+    fp.api_key = fp.load_api_key('fred_api_key.txt')
+    info = fred_download.api_request('fred/series',{'series_id':'GDP'})['seriess'][0]
+'''
+
+import concurrent.futures
+import datetime
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import fredpy as fp
+
+from download_cache import get_json
+
+
+# Address of the FRED API
+default_base_url = 'https://api.stlouisfed.org/'
+
+
+class RateLimiter:
+
+    '''Thread-safe limiter that spaces requests so that at most requests_per_minute are started per minute'''
+
+    def __init__(self,requests_per_minute=120):
+
+        self.interval = 60/requests_per_minute
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+
+        '''Block until the calling thread may start its next request'''
+
+        with self.lock:
+            now = time.monotonic()
+            start = max(now,self.next_time)
+            self.next_time = start+self.interval
+
+        if start>now:
+            time.sleep(start-now)
+
+
+def api_request(path,parameters,api_key=None,base_url=default_base_url,max_retries=5,backoff=1.0,rate_limiter=None,timeout=30):
+
+    '''Query the FRED API and return the decoded JSON response.
+
+    Args:
+        path (str):                 API path, e.g., 'fred/series/observations'
+        parameters (dict):          Query parameters other than api_key and file_type
+        api_key (str):              FRED API key. Defaults to fp.api_key.
+        base_url (str):             Address of the API
+        max_retries (int):          Number of times a failed request is retried
+        backoff (float):            Delay before the first retry in seconds. Doubles on every retry.
+        rate_limiter (RateLimiter): Shared limiter for the request rate. No limit if None.
+        timeout (float):            Timeout of a single request in seconds
+
+    Returns:
+        dict
+    '''
+
+    if api_key is None:
+        api_key = fp.api_key
+
+    if api_key is None:
+        raise ValueError('fredpy.api_key value not assigned. You need to provide your key for the FRED API.')
+
+    parameters = dict(parameters,api_key=api_key,file_type='json')
+
+    return get_json(base_url+path,parameters,max_retries,backoff,rate_limiter,timeout)
+
+
+def to_series(series_id,info,observations,observation_date):
+
+    '''Construct a fredpy series from the responses of the 'fred/series' and 'fred/series/observations' endpoints.
+
+    Args:
+        series_id (str):            FRED series ID
+        info (dict):                Element of the 'seriess' list of the 'fred/series' response
+        observations (list):        'observations' list of the 'fred/series/observations' response
+        observation_date (str):     Vintage date in YYYY-MM-DD format
+
+    Returns:
+        fredpy series
+    '''
+
+    data = pd.DataFrame(observations,columns=['date','value'])
+    data = data.replace('.',np.nan)
+    data['date'] = pd.to_datetime(data['date'])
+    data = data.set_index('date')['value'].astype(float)
+
+    # Try to infer frequency, as fredpy does
+    try:
+        data = data.asfreq(pd.infer_freq(data.index))
+    except (TypeError,ValueError):
+        pass
+
+    new_series = fp.to_fred_series(
+        data=data.values,
+        dates=data.index,
+        frequency=info['frequency'],
+        frequency_short=info['frequency_short'],
+        last_updated=info['last_updated'],
+        notes=info.get('notes',''),
+        seasonal_adjustment=info['seasonal_adjustment'],
+        seasonal_adjustment_short=info['seasonal_adjustment_short'],
+        series_id=series_id,
+        title=info['title'],
+        units=info['units'],
+        units_short=info['units_short'],
+    )
+
+    # to_fred_series() drops the inferred frequency of the index
+    new_series.data = data
+    new_series.observation_date = datetime.datetime.strptime(observation_date,'%Y-%m-%d').strftime('%B %d, %Y')
+
+    return new_series
+
+
+def map_concurrently(function,series_ids,max_workers=8,**kwargs):
+
+    '''Call function(series_id,**kwargs) for every series ID from a bounded thread pool.
+
+    Args:
+        function (callable):        Function of a series ID that returns a fredpy series
+        series_ids (list):          FRED series IDs
+        max_workers (int):          Maximum number of simultaneous calls
+        **kwargs:                   Passed to function
+
+    Returns:
+        dict with series IDs as keys, in the order of series_ids
+    '''
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        futures = {s:executor.submit(function,s,**kwargs) for s in series_ids}
+
+        # result() re-raises the first error of a failed call
+        return {s:futures[s].result() for s in series_ids}
+
+
+def register(series_dict,observation_date):
+
+    '''Add series to fredpy's session cache so that fp.series(series_id) returns them without a download'''
+
+    for series_id, new_series in series_dict.items():
+        fp.series_cache[series_id+'_'+observation_date] = new_series.copy()
+
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Hodrick-Prescott filter for many series at once.
+
+The HP trend tau of a series y of length T solves the linear system
+
+        (I + lamb*D'D) tau = y
+
+where D is the (T-2) x T second-difference matrix. The matrix I + lamb*D'D is symmetric, positive definite, and
+pentadiagonal, so it has a banded Cholesky factorization that costs O(T) to compute and to solve with. The
+factorization depends only on T and lamb, so it is computed once per (T, lamb) pair, cached, and reused for
+every series of that length. All series with the same dates are stacked into a T x k matrix and filtered in a
+single solve.
+
+Example:
+
+    import hp_filter
+
+    hp = hp_filter.filter_frame(pd.DataFrame({'gdp':np.log(gdp),'hours':np.log(hours)}),lamb=1600)
+    hp[['gdp_trend','gdp_cycle']]
+'''
+
+import functools
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from scipy.linalg import cholesky_banded, cho_solve_banded
+
+
+@functools.lru_cache(maxsize=64)
+def factorize(T,lamb):
+
+    '''Return the banded Cholesky factor of I + lamb*D'D for series of length T.
+
+    Args:
+        T (int):        Number of observations. Must be at least 3.
+        lamb (float):   HP smoothing parameter
+
+    Returns:
+        NumPy ndarray of shape (3, T): upper banded Cholesky factor as used by scipy.linalg.cho_solve_banded
+    '''
+
+    if T<3:
+        raise ValueError('The HP filter requires at least 3 observations. Got '+str(T)+'.')
+
+    D = sparse.diags([1.,-2.,1.],[0,1,2],shape=(T-2,T))
+    M = (sparse.identity(T)+lamb*(D.T@D)).todia()
+
+    # Upper banded storage: row 2 holds the diagonal, rows 1 and 0 the first and second superdiagonals
+    bands = np.zeros((3,T))
+    bands[2] = M.diagonal(0)
+    bands[1,1:] = M.diagonal(1)
+    bands[0,2:] = M.diagonal(2)
+
+    factor = cholesky_banded(bands,lower=False)
+    factor.setflags(write=False)
+
+    return factor
+
+
+def filter_matrix(Y,lamb=1600):
+
+    '''HP filter each column of a T x k array.
+
+    Args:
+        Y (NumPy ndarray):  Array of shape (T,) or (T, k) without missing values
+        lamb (float):       HP smoothing parameter
+
+    Returns:
+        tuple: trend and cycle arrays with the same shape as Y
+    '''
+
+    Y = np.asarray(Y,dtype=float)
+
+    trend = cho_solve_banded((factorize(len(Y),float(lamb)),False),Y)
+
+    return trend, Y-trend
+
+
+def filter_frame(frame,lamb=1600):
+
+    '''HP filter every column of a DataFrame.
+
+    Columns may cover different date ranges (with NaN outside of their range, as when series of different lengths
+    are combined into one DataFrame). Columns with the same range are filtered together in one solve, so the cost
+    is roughly one factorization per distinct length.
+
+    Args:
+        frame (Pandas DataFrame):   Series to filter, one per column
+        lamb (float or dict):       HP smoothing parameter, or a dict of parameters by column name
+
+    Returns:
+        Pandas DataFrame with columns <name>_trend and <name>_cycle for each column of frame
+    '''
+
+    if not isinstance(lamb,dict):
+        lamb = {name:lamb for name in frame.columns}
+
+    # Group columns by the range of dates they cover and by smoothing parameter
+    groups = {}
+    for name in frame.columns:
+
+        column = frame[name]
+        start, stop = column.first_valid_index(), column.last_valid_index()
+
+        if column.loc[start:stop].isna().any():
+            raise ValueError('Column '+str(name)+' has missing values inside its date range.')
+
+        groups.setdefault((start,stop,lamb[name]),[]).append(name)
+
+    results = {}
+    for (start,stop,group_lamb), names in groups.items():
+
+        block = frame.loc[start:stop,names]
+        trend, cycle = filter_matrix(block.values,group_lamb)
+
+        for i, name in enumerate(names):
+            results[name+'_trend'] = pd.Series(trend[:,i],index=block.index)
+            results[name+'_cycle'] = pd.Series(cycle[:,i],index=block.index)
+
+    # Order columns as trend, cycle for each input column
+    columns = [name+suffix for name in frame.columns for suffix in ['_trend','_cycle']]
+
+    return pd.DataFrame(results,index=frame.index)[columns]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Capital stock and TFP by the perpetual inventory method for whole grids of calibrations.
+
+The capital stock follows the law of motion
+
+        K[t+1] = I[t] + (1-delta)*K[t]
+
+and TFP is the Solow residual of a Cobb-Douglas production function
+
+        A[t] = Y[t]/(K[t]^alpha*L[t]^(1-alpha)).
+
+The law of motion is linear, so the capital path for a given (delta, K0) pair splits into the response to
+investment starting from K[0] = 0 plus K0*(1-delta)^t. The first part is computed once for each distinct value
+of delta with a linear filter (scipy.signal.lfilter) and the second is a broadcast product, so a grid with
+thousands of (alpha, delta, K0) combinations costs one filter pass per distinct delta. Large grids are
+evaluated in chunks to bound the size of intermediate arrays.
+
+Example:
+
+    import perpetual_inventory
+
+    params = perpetual_inventory.grid(alpha=[0.3,0.35,0.4],delta=[0.01,0.015,0.02],K0=[20000,25000])
+    capital, tfp = perpetual_inventory.compute(investment/4,gdp,hours,**params)
+'''
+
+import numpy as np
+from scipy.signal import lfilter
+
+
+def grid(**params):
+
+    '''Return all combinations of the given parameter values as flat arrays of equal length.
+
+    Args:
+        **params:   Parameter names and lists of values, e.g., alpha=[0.3,0.35], delta=[0.01,0.02]
+
+    Returns:
+        dict of NumPy ndarrays
+    '''
+
+    names = list(params.keys())
+    mesh = np.meshgrid(*[np.atleast_1d(np.asarray(params[name],dtype=float)) for name in names],indexing='ij')
+
+    return {name:values.ravel() for name,values in zip(names,mesh)}
+
+
+def steady_state_K0(y0,s,n,g,delta):
+
+    '''Initial capital equal to its steady state value given initial output: K0 = s/(delta+n+g)*Y0'''
+
+    return y0*s/(n+g+np.asarray(delta,dtype=float))
+
+
+def capital_paths(investment,delta,K0):
+
+    '''Compute capital paths for arrays of depreciation rates and initial capital stocks.
+
+    Args:
+        investment (NumPy ndarray):     Investment per period I[0], I[1], ..., I[T-1]
+        delta (float or ndarray):       Depreciation rates per period, length N
+        K0 (float or ndarray):          Initial capital stocks, length N or scalar
+
+    Returns:
+        NumPy ndarray of shape (N, T)
+    '''
+
+    investment = np.asarray(investment,dtype=float)
+    delta = np.atleast_1d(np.asarray(delta,dtype=float))
+    K0 = np.broadcast_to(np.asarray(K0,dtype=float),delta.shape)
+
+    T = len(investment)
+
+    # Filter investment once per distinct depreciation rate: y[t] = I[t-1] + (1-delta)*y[t-1] with y[0] = 0
+    unique, inverse = np.unique(delta,return_inverse=True)
+
+    forced = np.empty((len(unique),T))
+    for i, d in enumerate(unique):
+        forced[i] = lfilter([0,1],[1,-(1-d)],investment)
+
+    # Undepreciated part of the initial capital stock
+    decay = (1-unique)[:,None]**np.arange(T)
+
+    return K0[:,None]*decay[inverse] + forced[inverse]
+
+
+def tfp_paths(gdp,capital,hours,alpha):
+
+    '''Compute TFP as the Solow residual for each capital path and capital share.
+
+    Args:
+        gdp (NumPy ndarray):        Output, length T
+        capital (NumPy ndarray):    Capital paths of shape (N, T)
+        hours (NumPy ndarray):      Labor hours, length T
+        alpha (float or ndarray):   Capital shares, length N or scalar
+
+    Returns:
+        NumPy ndarray of shape (N, T)
+    '''
+
+    alpha = np.broadcast_to(np.asarray(alpha,dtype=float),capital.shape[:1])[:,None]
+
+    gdp = np.asarray(gdp,dtype=float)
+    hours = np.asarray(hours,dtype=float)
+
+    return gdp/capital**alpha/hours**(1-alpha)
+
+
+def iter_chunks(investment,gdp,hours,alpha,delta,K0,chunk_size=10000):
+
+    '''Compute capital and TFP paths chunk by chunk.
+
+    Args:
+        investment (NumPy ndarray):     Investment per period, length T
+        gdp (NumPy ndarray):            Output per period, length T
+        hours (NumPy ndarray):          Labor hours, length T
+        alpha (float or ndarray):       Capital shares, length N or scalar
+        delta (float or ndarray):       Depreciation rates, length N or scalar
+        K0 (float or ndarray):          Initial capital stocks, length N or scalar
+        chunk_size (int):               Number of parameter combinations per chunk
+
+    Yields:
+        tuple: slice of grid points in the chunk, capital paths, and TFP paths
+    '''
+
+    alpha, delta, K0 = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x,dtype=float)) for x in [alpha,delta,K0]])
+
+    for start in range(0,len(delta),chunk_size):
+
+        chunk = slice(start,min(start+chunk_size,len(delta)))
+
+        capital = capital_paths(investment,delta[chunk],K0[chunk])
+        tfp = tfp_paths(gdp,capital,hours,alpha[chunk])
+
+        yield chunk, capital, tfp
+
+
+def compute(investment,gdp,hours,alpha,delta,K0,chunk_size=10000):
+
+    '''Compute capital and TFP paths for every parameter combination.
+
+    Args:
+        investment (NumPy ndarray):     Investment per period, length T
+        gdp (NumPy ndarray):            Output per period, length T
+        hours (NumPy ndarray):          Labor hours, length T
+        alpha (float or ndarray):       Capital shares, length N or scalar
+        delta (float or ndarray):       Depreciation rates, length N or scalar
+        K0 (float or ndarray):          Initial capital stocks, length N or scalar
+        chunk_size (int):               Number of parameter combinations per chunk
+
+    Returns:
+        tuple: capital and TFP paths, NumPy ndarrays of shape (N, T)
+    '''
+
+    N = np.broadcast(np.atleast_1d(alpha),np.atleast_1d(delta),np.atleast_1d(K0)).size
+    T = len(investment)
+
+    capital = np.empty((N,T))
+    tfp = np.empty((N,T))
+
+    for chunk, capital_chunk, tfp_chunk in iter_chunks(investment,gdp,hours,alpha,delta,K0,chunk_size):
+        capital[chunk] = capital_chunk
+        tfp[chunk] = tfp_chunk
+
+    return capital, tfp
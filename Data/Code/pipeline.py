@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''A small pipeline of named stages with content-hashed inputs and on-disk memoization.
+
+Each stage is a function registered with Pipeline.stage(). A stage receives the results of the stages listed in
+its inputs as keyword arguments along with any fixed params. Before a stage runs, a key is computed from
+
+    * the stage name and the source code of its function,
+    * its params, and
+    * the content hashes of the results of its input stages.
+
+If a result for that key is stored on disk, the stage is skipped and the stored result is used, loaded only if a
+downstream stage actually has to run. Otherwise the stage runs and its result is pickled to disk together with
+a hash of its contents. A rerun therefore executes only the stages whose inputs, params, or code changed.
+
+Stages whose inputs are complete are run concurrently in a thread pool, so independent stages (such as several
+CSV exports of the same data) run in parallel.
+
+Stages that read from outside of the pipeline, such as downloads, are registered with always=True: they run on
+every call, but their dependents rerun only if the content of their result changed. A stage can give a
+fingerprint function that returns the part of its result that counts as its content, e.g., to leave out the
+retrieval date of downloaded data. Stages that write files list them in files so that they also rerun when one
+of the files is missing.
+
+Example:
+
+    build = pipeline.Pipeline()
+
+    @build.stage(always=True)
+    def download():
+        return fred_cache.load_all(['GDP'])
+
+    @build.stage(inputs=['download'],params={'lamb':1600})
+    def trend(download,lamb):
+        return hp_filter.filter_frame(pd.DataFrame({'gdp':download['GDP'].log().data}),lamb)
+
+    results = build.run()
+'''
+
+import concurrent.futures
+import hashlib
+import inspect
+import os
+import pickle
+import time
+
+from download_cache import default_cache_dir
+
+
+# Directory holding stored stage results
+default_pipeline_dir = os.path.join(default_cache_dir,'pipeline')
+
+
+def content_hash(value):
+
+    '''Return the SHA-256 hex digest of the pickled value'''
+
+    return hashlib.sha256(pickle.dumps(value,protocol=4)).hexdigest()
+
+
+def source_hash(function):
+
+    '''Return a hash of the source code of a function, or of its byte code if the source is not available'''
+
+    try:
+        source = inspect.getsource(function)
+    except (OSError,TypeError):
+        source = repr((function.__code__.co_code,function.__code__.co_consts))
+
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+class Pipeline:
+
+    '''Collection of named stages that are run in dependency order with memoization.
+
+    Attributes:
+        stages (dict):      Registered stages by name
+        timings (dict):     For each stage of the last run, a tuple with 'ran' or 'cached' and the run time in seconds
+    '''
+
+    def __init__(self,cache_dir=default_pipeline_dir,max_workers=4):
+
+        '''Initializes an instance of the Pipeline class.
+
+        Args:
+            cache_dir (str):    Directory where stage results are stored
+            max_workers (int):  Maximum number of stages run at the same time
+
+        Returns:
+            None
+        '''
+
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.stages = {}
+        self.timings = {}
+
+    def stage(self,name=None,inputs=(),params=None,always=False,files=(),fingerprint=None):
+
+        '''Decorator that registers a function as a stage.
+
+        Args:
+            name (str):                 Name of the stage. Defaults to the name of the function.
+            inputs (list):              Names of the stages whose results are passed to the function as keyword
+                                            arguments
+            params (dict):              Fixed keyword arguments. Part of the memoization key.
+            always (bool):              Whether to run the stage on every call, e.g., for downloads
+            files (list):               Files written by the stage. The stage reruns if one of them is missing.
+            fingerprint (callable):     Function of the result that returns the value whose content hash
+                                            identifies the result for the stages that depend on it. Defaults to
+                                            the result itself.
+
+        Returns:
+            decorator
+        '''
+
+        def decorator(function):
+
+            for i in inputs:
+                if i not in self.stages:
+                    raise ValueError('Stage '+(name or function.__name__)+' depends on unknown stage '+i+'.')
+
+            self.stages[name or function.__name__] = {
+                'function':function,
+                'inputs':list(inputs),
+                'params':dict(params or {}),
+                'always':always,
+                'files':list(files),
+                'fingerprint':fingerprint,
+            }
+
+            return function
+
+        return decorator
+
+    def dependencies(self,targets):
+
+        '''Return the names of targets and all stages they depend on, in the order the stages were registered'''
+
+        needed = set()
+        stack = list(targets)
+
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name]['inputs'])
+
+        return [name for name in self.stages if name in needed]
+
+    def paths(self,name,key):
+
+        '''Return the paths of the stored result and of its content hash for a stage and key'''
+
+        directory = os.path.join(self.cache_dir,name)
+
+        return os.path.join(directory,key+'.pkl'), os.path.join(directory,key+'.hash')
+
+    def key(self,name,input_hashes):
+
+        '''Return the memoization key of a stage given the content hashes of its inputs'''
+
+        stage = self.stages[name]
+
+        parts = [name,source_hash(stage['function']),content_hash(sorted(stage['params'].items()))]
+        parts+= [i+':'+input_hashes[i] for i in stage['inputs']]
+
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def store(self,name,key,value):
+
+        '''Pickle the result of a stage, remove results of older keys, and return the content hash of the result or
+        of its fingerprint'''
+
+        pkl_path, hash_path = self.paths(name,key)
+        directory = os.path.dirname(pkl_path)
+        os.makedirs(directory,exist_ok=True)
+
+        data = pickle.dumps(value,protocol=4)
+
+        fingerprint = self.stages[name]['fingerprint']
+        if fingerprint is None:
+            digest = hashlib.sha256(data).hexdigest()
+        else:
+            digest = content_hash(fingerprint(value))
+
+        # Only the latest result of each stage is kept
+        for filename in os.listdir(directory):
+            if not filename.startswith(key):
+                os.remove(os.path.join(directory,filename))
+
+        with open(pkl_path+'.part','wb') as file:
+            file.write(data)
+        os.replace(pkl_path+'.part',pkl_path)
+
+        with open(hash_path,'w') as file:
+            file.write(digest)
+
+        return digest
+
+    def run(self,targets=None):
+
+        '''Run the given stages and the stages they depend on, skipping stages whose stored result is current.
+
+        Args:
+            targets (list):     Names of the stages to run. Defaults to all stages.
+
+        Returns:
+            dict of results of the target stages by stage name, including results of skipped stages
+        '''
+
+        if targets is None:
+            targets = list(self.stages)
+
+        names = self.dependencies(targets)
+
+        hashes = {}
+        keys = {}
+        values = {}
+        self.timings = {}
+
+        def value(name):
+
+            # Load stored results only when a stage that has to run needs them
+            if name not in values:
+                with open(self.paths(name,keys[name])[0],'rb') as file:
+                    values[name] = pickle.load(file)
+
+            return values[name]
+
+        def execute(name):
+
+            stage = self.stages[name]
+            start = time.perf_counter()
+
+            kwargs = {i:value(i) for i in stage['inputs']}
+            kwargs.update(stage['params'])
+            result = stage['function'](**kwargs)
+
+            return result, time.perf_counter()-start
+
+        remaining = list(names)
+        running = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            while remaining or running:
+
+                # Start or skip every stage whose inputs are complete
+                for name in list(remaining):
+
+                    stage = self.stages[name]
+
+                    if not all(i in hashes for i in stage['inputs']):
+                        continue
+
+                    remaining.remove(name)
+                    keys[name] = self.key(name,hashes)
+                    pkl_path, hash_path = self.paths(name,keys[name])
+
+                    current = (not stage['always'] and os.path.exists(pkl_path) and os.path.exists(hash_path)
+                               and all(os.path.exists(f) for f in stage['files']))
+
+                    if current:
+                        with open(hash_path) as file:
+                            hashes[name] = file.read()
+                        self.timings[name] = ('cached',0.0)
+                    else:
+                        running[executor.submit(execute,name)] = name
+
+                if not running:
+                    continue
+
+                done, _ = concurrent.futures.wait(running,return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    name = running.pop(future)
+                    result, seconds = future.result()
+                    values[name] = result
+                    hashes[name] = self.store(name,keys[name],result)
+                    self.timings[name] = ('ran',seconds)
+
+        return {name:value(name) for name in targets}
+
+    def summary(self):
+
+        '''Return a one-line summary of the last run, e.g., 'Pipeline: 3 ran, 9 cached' '''
+
+        ran = sum(1 for status,_ in self.timings.values() if status=='ran')
+
+        return 'Pipeline: '+str(ran)+' ran, '+str(len(self.timings)-ran)+' cached'
+
+    def report(self):
+
+        '''Return a table of the status and run time of each stage of the last run, in registration order'''
+
+        width = max([len(name) for name in self.timings]+[5])
+
+        lines = [self.summary()]
+        for name in self.stages:
+            if name in self.timings:
+                status, seconds = self.timings[name]
+                lines.append('    '+name.ljust(width)+'  '+status.ljust(6)+'  '+'{:8.3f} s'.format(seconds))
+
+        return '\n'.join(lines)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Shared loader for the Penn World Table (PWT).
+
+The first time a PWT release is requested, the Excel workbook is fetched through the download cache and
+converted once into an uncompressed Arrow (Feather v2) file. Later reads skip Excel parsing entirely, load
+only the requested columns, and memory-map the file instead of copying it. The 'Info' and 'Legend' sheets
+are stored next to the data in a small JSON file so that the version and base year can be looked up without
+opening the workbook.
+
+Example:
+
+    import pwt_loader
+
+    pwt = pwt_loader.load('pwt100.xlsx',columns=['countrycode','country','year','rgdpo','emp','pop'])
+    meta = pwt_loader.metadata('pwt100.xlsx')
+    print(meta['version'],meta['base_year'])
+'''
+
+import json
+import os
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from download_cache import default_cache_dir, fetch
+
+
+# Address of the directory on the Groningen Growth and Development Centre site with PWT releases
+pwt_url = 'https://www.rug.nl/ggdc/docs/'
+
+# Directory holding one subdirectory of converted files per PWT release
+default_store_dir = os.path.join(default_cache_dir,'pwt')
+
+
+def release_dir(pwt_file,store_dir=default_store_dir):
+
+    '''Return the directory of the converted files for a PWT release, e.g., .cache/pwt/pwt100'''
+
+    return os.path.join(store_dir,os.path.splitext(os.path.basename(pwt_file))[0])
+
+
+def is_converted(pwt_file,store_dir=default_store_dir):
+
+    '''Return True if the PWT release has already been converted'''
+
+    directory = release_dir(pwt_file,store_dir)
+
+    return os.path.exists(os.path.join(directory,'data.feather')) and os.path.exists(os.path.join(directory,'metadata.json'))
+
+
+def parse_metadata(info,legend):
+
+    '''Extract release metadata from the 'Info' and 'Legend' sheets of the PWT workbook.
+
+    Args:
+        info (Pandas DataFrame):    'Info' sheet read with header=None
+        legend (Pandas DataFrame):  'Legend' sheet read with index_col=0
+
+    Returns:
+        dict
+    '''
+
+    # PWT version is the last word of the first line of the Info sheet
+    version = str(info.iloc[0,0]).split(' ')[-1]
+
+    # Base year for real variables is in the definition of rgdpe, e.g., '... (in mil. 2017US$)'
+    base_year = legend.loc['rgdpe','Variable definition'].split(' ')[-1].split('US')[0]
+
+    return {
+        'version':version,
+        'base_year':base_year,
+        'info':[str(line) for line in info.iloc[:,0].dropna()],
+        'legend':legend['Variable definition'].dropna().astype(str).to_dict(),
+    }
+
+
+def convert(pwt_file,store_dir=default_store_dir,source=None):
+
+    '''Convert a PWT workbook into the columnar store. Runs once per release; later calls are no-ops.
+
+    Args:
+        pwt_file (str):     Name of the PWT workbook, e.g., 'pwt100.xlsx'
+        store_dir (str):    Directory of the columnar store
+        source (str):       Path of a local copy of the workbook. If None, the workbook is obtained through
+                                the download cache.
+
+    Returns:
+        str: directory with the converted files
+    '''
+
+    directory = release_dir(pwt_file,store_dir)
+
+    if is_converted(pwt_file,store_dir):
+        return directory
+
+    if source is None:
+        source = fetch(pwt_url+pwt_file)
+
+    # Parse the workbook once and read all three sheets from it
+    with pd.ExcelFile(source) as excel:
+        data = excel.parse('Data')
+        info = excel.parse('Info',header=None)
+        legend = excel.parse('Legend',index_col=0)
+
+    meta = parse_metadata(info,legend)
+    meta['pwt_file'] = os.path.basename(pwt_file)
+    meta['columns'] = list(data.columns)
+    meta['rows'] = len(data)
+
+    os.makedirs(directory,exist_ok=True)
+
+    # Uncompressed Arrow files can be memory-mapped, so reading a column does not copy the whole file
+    tmp_path = os.path.join(directory,'data.feather.part')
+    feather.write_feather(data,tmp_path,compression='uncompressed')
+    os.replace(tmp_path,os.path.join(directory,'data.feather'))
+
+    # Metadata is written last so that its presence marks a completed conversion
+    with open(os.path.join(directory,'metadata.json'),'w') as file:
+        json.dump(meta,file,indent=4)
+
+    return directory
+
+
+def load(pwt_file,columns=None,store_dir=default_store_dir):
+
+    '''Load columns of the 'Data' sheet of a PWT release, converting the workbook first if necessary.
+
+    Args:
+        pwt_file (str):     Name of the PWT workbook, e.g., 'pwt100.xlsx'
+        columns (list):     Columns to load. Loads all columns if None.
+        store_dir (str):    Directory of the columnar store
+
+    Returns:
+        Pandas DataFrame
+    '''
+
+    directory = convert(pwt_file,store_dir)
+
+    table = feather.read_table(os.path.join(directory,'data.feather'),columns=columns,memory_map=True)
+
+    return table.to_pandas()
+
+
+def metadata(pwt_file,store_dir=default_store_dir):
+
+    '''Return the metadata of a PWT release: 'version', 'base_year', 'info', 'legend', 'columns', and 'rows'.
+
+    Args:
+        pwt_file (str):     Name of the PWT workbook, e.g., 'pwt100.xlsx'
+        store_dir (str):    Directory of the columnar store
+
+    Returns:
+        dict
+    '''
+
+    directory = convert(pwt_file,store_dir)
+
+    with open(os.path.join(directory,'metadata.json')) as file:
+        return json.load(file)
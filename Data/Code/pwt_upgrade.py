@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Tools for upgrading the PWT-based data files to a new PWT release without rebuilding them from scratch.
+
+The previous and the new release are compared cell by cell by country, year, and variable using the
+columnar store of pwt_loader. The PWT scripts then recompute only the countries with changed inputs, merge
+them into the existing CSV files, and record what changed in a JSON change report:
+
+    {
+        "previous_release": "pwt91.xlsx",
+        "current_release": "pwt100.xlsx",
+        "inputs": {
+            "cross_country_gdp.py": {"changed_cells": 1234, "changed_countries": ["AGO", ...], ...},
+            ...
+        },
+        "outputs": {
+            "cross_country_gdp_pc.csv": {"added_columns": [...], "removed_columns": [...],
+                                         "added_rows": [...], "removed_rows": [...],
+                                         "changed_cells": [{"row": ..., "column": ..., "previous": ..., "current": ...}]},
+            ...
+        }
+    }
+'''
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import pwt_loader
+
+
+def diff(previous_pwt_file,current_pwt_file,columns,store_dir=pwt_loader.default_store_dir):
+
+    '''Find the cells that differ between two PWT releases.
+
+    Args:
+        previous_pwt_file (str):    Name of the previous PWT workbook, e.g., 'pwt91.xlsx'
+        current_pwt_file (str):     Name of the new PWT workbook, e.g., 'pwt100.xlsx'
+        columns (list):             Variables to compare
+        store_dir (str):            Directory of the columnar store
+
+    Returns:
+        Pandas DataFrame with columns 'countrycode', 'year', 'variable', 'previous', and 'current'. Country-years
+            present in only one release appear with NaN on the other side.
+    '''
+
+    keys = ['countrycode','year']
+
+    previous = pwt_loader.load(previous_pwt_file,columns=keys+columns,store_dir=store_dir).set_index(keys)
+    current = pwt_loader.load(current_pwt_file,columns=keys+columns,store_dir=store_dir).set_index(keys)
+
+    # Align both releases on the union of country-years
+    previous, current = previous.align(current,join='outer')
+
+    # A cell is unchanged if the values are equal or both missing
+    changed = ~(previous.eq(current) | (previous.isna() & current.isna()))
+
+    rows, cols = np.nonzero(changed.values)
+
+    return pd.DataFrame({
+        'countrycode':previous.index.get_level_values('countrycode')[rows],
+        'year':previous.index.get_level_values('year')[rows],
+        'variable':changed.columns[cols],
+        'previous':previous.values[rows,cols],
+        'current':current.values[rows,cols],
+    })
+
+
+def country_code(label):
+
+    '''Return the ISO code in a label like 'France - FRA' or 'FRA' '''
+
+    return str(label).split(' - ')[-1]
+
+
+def update_table(previous,recomputed,changed_codes,order,axis=1):
+
+    '''Replace the countries in changed_codes in a previously exported table with recomputed values.
+
+    Args:
+        previous (Pandas DataFrame):    Previously exported table
+        recomputed (Pandas DataFrame):  Recomputed rows or columns for the changed countries
+        changed_codes (list):           ISO codes of countries with changed input data
+        order (list):                   Country labels or ISO codes in the order of the new release
+        axis (int):                     1 if countries are columns, 0 if countries are rows
+
+    Returns:
+        Pandas DataFrame
+    '''
+
+    changed_codes = set(changed_codes)
+
+    # Rows or columns of countries whose input data changed
+    labels = previous.columns if axis==1 else previous.index
+    stale = [label for label in labels if country_code(label) in changed_codes]
+
+    updated = pd.concat([previous.drop(stale,axis=axis),recomputed],axis=axis)
+
+    # Put countries in the same order as a full rebuild would
+    position = {country_code(label):i for i,label in enumerate(order)}
+    labels = sorted(updated.axes[axis],key=lambda label: position.get(country_code(label),len(position)))
+
+    return updated.reindex(labels,axis=axis)
+
+
+def to_json_value(value):
+
+    '''Convert NumPy scalars to Python types and NaN to None so that values can be written as JSON'''
+
+    if isinstance(value,np.generic):
+        value = value.item()
+
+    if isinstance(value,float) and np.isnan(value):
+        return None
+
+    return value
+
+
+def compare_tables(previous,current):
+
+    '''Describe the differences between two versions of an exported table.
+
+    Args:
+        previous (Pandas DataFrame):    Table before the upgrade
+        current (Pandas DataFrame):     Table after the upgrade
+
+    Returns:
+        dict with keys 'added_columns', 'removed_columns', 'added_rows', 'removed_rows', and 'changed_cells'
+    '''
+
+    rows = previous.index.intersection(current.index,sort=False)
+    columns = previous.columns.intersection(current.columns,sort=False)
+
+    old = previous.loc[rows,columns]
+    new = current.loc[rows,columns]
+
+    changed = ~(old.eq(new) | (old.isna() & new.isna()))
+    i, j = np.nonzero(changed.values)
+
+    return {
+        'added_columns':[to_json_value(c) for c in current.columns.difference(previous.columns,sort=False)],
+        'removed_columns':[to_json_value(c) for c in previous.columns.difference(current.columns,sort=False)],
+        'added_rows':[to_json_value(r) for r in current.index.difference(previous.index,sort=False)],
+        'removed_rows':[to_json_value(r) for r in previous.index.difference(current.index,sort=False)],
+        'changed_cells':[
+            {'row':to_json_value(rows[a]),'column':to_json_value(columns[b]),
+             'previous':to_json_value(old.iat[a,b]),'current':to_json_value(new.iat[a,b])}
+            for a,b in zip(i,j)
+        ],
+    }
+
+
+def is_unchanged(comparison):
+
+    '''Return True if a result of compare_tables() records no differences'''
+
+    return not any(len(value)>0 for value in comparison.values())
+
+
+def update_report(filepath,previous_pwt_file,current_pwt_file,inputs=None,outputs=None):
+
+    '''Add entries to the JSON change report for an upgrade from previous_pwt_file to current_pwt_file.
+
+    Entries written by other scripts for the same upgrade are kept. A report for a different pair of
+    releases is replaced.
+
+    Args:
+        filepath (str):             Path of the report
+        previous_pwt_file (str):    Name of the previous PWT workbook
+        current_pwt_file (str):     Name of the new PWT workbook
+        inputs (dict):              Results of summarize_changes() by script name
+        outputs (dict):             Results of compare_tables() by output file name
+
+    Returns:
+        dict
+    '''
+
+    report = {}
+
+    if os.path.exists(filepath):
+        with open(filepath) as file:
+            report = json.load(file)
+
+    if report.get('previous_release')!=previous_pwt_file or report.get('current_release')!=current_pwt_file:
+        report = {'previous_release':previous_pwt_file,'current_release':current_pwt_file,'inputs':{},'outputs':{}}
+
+    report['inputs'].update(inputs or {})
+    report['outputs'].update(outputs or {})
+
+    with open(filepath,'w') as file:
+        json.dump(report,file,indent=4)
+
+    return report
+
+
+def summarize_changes(changes):
+
+    '''Summarize the result of diff() for the 'inputs' section of the change report'''
+
+    return {
+        'changed_cells':int(len(changes)),
+        'changed_countries':sorted(changes['countrycode'].unique().tolist()),
+        'changed_cells_by_variable':{k:int(v) for k,v in changes['variable'].value_counts().items()},
+    }
@@ -97,12 +97,23 @@ import pandas as pd
 import numpy as np
 import wbdata
 import os
-import requests
-import zipfile
-import matplotlib.pyplot as plt
-plt.style.use('classic')
+import wb_fetch
+import wdi_bulk
+from download_cache import fetch
 
-get_ipython().run_line_magic('matplotlib', 'inline')
+# Figures are drawn unless the environment variable MAKE_PLOTS=0 is set. batch.py sets it for scheduled runs
+# so that matplotlib is not even imported.
+make_plots = os.environ.get('MAKE_PLOTS','1')!='0'
+
+if make_plots:
+    import matplotlib.pyplot as plt
+    plt.style.use('classic')
+
+    # Inline figures when run in IPython or Jupyter
+    try:
+        get_ipython().run_line_magic('matplotlib', 'inline')
+    except NameError:
+        pass
 
 # OECD countries
 oecd_list = ['AUS','AUT','BEL','CAN','CHL','CZE','DNK','EST','FIN','FRA','DEU','GRC','HUN','ISL','IRL','ISR',
@@ -117,6 +128,10 @@ drop_list = ['AFE','AFR','AFW','ARB','BEA','BEC','BHI','BLA','BMN','BSS','CAA','
              'MNA','NAC','NAF','NRS','NXS','OED','OSS','PRE','PSS','PST','RRS','SAS','SSA','SSF',
              'SST','SXZ','TEA','TEC','TLA','TMN','TSA','TSS','UMC','WLD','XZN']
 
+# Source of the WDI data: 'api' to query the World Bank API through wbdata or 'bulk' to read the WDI bulk
+# download (see below)
+data_source = 'api'
+
 # Dictionary of required indicators
 indicators = {
     'FM.LBL.BMNY.CN':'broad money',
@@ -127,26 +142,41 @@ indicators = {
 }
 
 
-# ## Import data using `wbpy`
+# ## Import data
+# 
+# The data are obtained in one of two ways depending on the value of `data_source`:
+# 
+# * `'api'`: Country information is requested from the World Bank API with `wbdata` and indicators with `wb_fetch.py`, which keeps a local cache.
+# * `'bulk'`: The WDI bulk download `WDI_CSV.zip` is downloaded once into the local download cache and the country and indicator data are read directly out of the zip file without extracting it. The indicator file is read in chunks and only the rows for the required indicators and countries are kept, so this works even though the file contains every WDI indicator. Use this if `wbdata` becomes unusable.
 
 # In[2]:
 
 
-# Get all countries and regions available through WB API
-all_wb_countries = wbdata.get_country()
+if data_source == 'api':
+
+    # Get all countries and regions available through WB API
+    all_wb_countries = wbdata.get_country()
+
+    # Convert to a DataFrame with selected columns
+    countries_and_regions = pd.DataFrame()
+
+    for c in all_wb_countries:
+        countries_and_regions.loc[c['id'],'country name'] = c['name']
+        countries_and_regions.loc[c['id'],'income group'] = c['incomeLevel']['id']
 
-# Convert to a DataFrame with selected columns
-countries_and_regions = pd.DataFrame()
+    # Change income abbreviations to words
+    countries_and_regions = countries_and_regions.replace('HIC','high').replace('UMC','middle').replace('LMC','middle').replace('LIC','low')
 
-for c in all_wb_countries:
-    countries_and_regions.loc[c['id'],'country name'] = c['name']
-    countries_and_regions.loc[c['id'],'income group'] = c['incomeLevel']['id']
+    # Name the index
+    countries_and_regions.index.name = 'iso code'
 
-# Change income abbreviations to words
-countries_and_regions = countries_and_regions.replace('HIC','high').replace('UMC','middle').replace('LMC','middle').replace('LIC','low')
+else:
 
-# Name the index
-countries_and_regions.index.name = 'iso code'
+    # Download the WDI bulk file, or use the copy in the download cache
+    wdi_file = fetch(wdi_bulk.wdi_url)
+
+    # Country names and income groups from the bulk file
+    countries_and_regions = wdi_bulk.read_countries(wdi_file)
 
 # # Print all countries and regions
 # with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
@@ -156,6 +186,16 @@ countries_and_regions.index.name = 'iso code'
 # In[3]:
 
 
+def get_country_index(countries):
+    
+    '''Return a DataFrame of ISO codes, income groups, and OECD membership indexed by country name'''
+    
+    country_index = countries.reset_index().set_index('country name')[['iso code','income group','oecd']]
+    
+    # Keep the first entry if a name appears more than once
+    return country_index[~country_index.index.duplicated()]
+
+
 # Series of only countries
 countries = countries_and_regions[~countries_and_regions.index.isin(drop_list)].copy()
 
@@ -166,6 +206,10 @@ countries.loc[oecd_list,'oecd'] = 'yes'
 # Series of only regions
 regions = countries_and_regions[countries_and_regions.index.isin(drop_list)].copy()
 
+# Index of country metadata by country name, used to add ISO codes, income groups, and OECD membership to the
+# data sets
+country_index = get_country_index(countries)
+
 # Print all countries
 # with pd.option_context('display.max_rows', None, 'display.max_columns', None):  # more options can be specified also
 #     print(countries)
@@ -180,8 +224,13 @@ len(countries)
 # In[4]:
 
 
-# Import data into a DataFrame
-df=wbdata.get_dataframe(indicators,country=list(countries.index),keep_levels=False)
+# Import data into a DataFrame. Indicators are requested from the API in chunks of countries in parallel and kept
+# in a local cache. Only chunks for which the World Bank reports an update are downloaded again.
+if data_source == 'api':
+    df = wb_fetch.get_dataframe(indicators,country=list(countries.index))
+
+else:
+    df = wdi_bulk.read_indicators(wdi_file,indicators,countries=list(countries.index))
 
 # Sort the index
 df = df.sort_index()
@@ -201,143 +250,46 @@ for col in df.columns:
         print()
 
 
-# ## Import data by downloading all WDI indicators
-# 
-# This section is only here in case wbpy becomes unusable. Downloads `WDI_csv.zip` and extracts in the current directory. The following files are extracted:
-# 
-# * `WDISeries.csv`
-# * `WDISeries-Time.csv`
-# * `WDIFootNote.csv`
-# * `WDIData.csv`
-# * `WDICountry.csv`
-# * `WDICountry-Series.csv`
-# 
+# ## Construct data sets
 
 # In[5]:
 
 
-# # Download World Bank WDI data
-# url = "http://databank.worldbank.org/data/download/WDI_csv.zip"
-
-# file_name = "WDI_csv.zip"
-# u = requests.get(url)
-
-# with open(file_name, 'wb') as f:
-#     for chunk in u.iter_content(chunk_size=1024): 
-#         if chunk: # filter out keep-alive new chunks
-#             f.write(chunk)
-#             f.flush()
-# f.close()
-
-# fh = open('WDI_csv.zip', 'rb')
-# z = zipfile.ZipFile(fh)
-# z.extractall()
-
-# # Delete zip file from WDI after extracting
-# os.remove('WDI_csv.zip')
-
-
-# In[6]:
-
-
-# # Load country data
-# countries = pd.read_csv('WDICountry.csv')
-
-# # Series of only countries
-# countries = countries[~countries['Country Code'].isin(drop_list)]
-
-# # Set ISO codes as index
-# countries.index = countries['Country Code']
-# countries.index.name = 'iso code'
-
-# # Select only name and income group columns and rename
-# countries = countries[['Table Name','Income Group']]
-# countries.columns = ['country name','income group']
+def get_panel(df,indicators):
 
-# # Change income abbreviations to words
-# countries.loc[:,'income group'] = countries['income group'].str.replace('High income','high').copy()
-# countries.loc[:,'income group'] = countries['income group'].str.replace('Upper middle income','middle').copy()
-# countries.loc[:,'income group'] = countries['income group'].str.replace('Lower middle income','middle').copy()
-# countries.loc[:,'income group'] = countries['income group'].str.replace('Low income','low').copy()
+    '''Reshape the data into an array with dimensions countries x years x indicators'''
 
-# # Identify which countries are in OECD
-# countries['oecd'] = 'no'
-# countries.loc[oecd_list,'oecd'] = 'yes'
+    # Countries as rows and (indicator, year) pairs as columns. Missing years become NaN.
+    years = df.index.get_level_values(1).unique().sort_values()
+    wide = df[indicators].unstack(level=1).reindex(columns=pd.MultiIndex.from_product([indicators,years]))
 
-# # Load indicator data
-# df_raw = pd.read_csv('WDIData.csv')
+    panel = wide.values.reshape(len(wide.index),len(indicators),len(years)).transpose(0,2,1)
 
-# # Drop regions
-# df_raw = df_raw[df_raw['Country Code'].isin(countries.index)]
+    return wide.index, panel
 
-# # Drop country code and indicator name
-# df_raw= df_raw.drop(['Country Code','Indicator Name'],axis=1)
 
-# # Drop unnecessary indicators
-# df_raw = df_raw[df_raw['Indicator Code'].isin(indicators.keys())]
-
-# # Drop superfluous unnamed columns
-# columns_to_drop = []
-
-# for c in df_raw.columns:
-#     if 'unnamed' in c.lower():
-#         columns_to_drop.append(c)
-# df_raw = df_raw.drop(columns_to_drop,axis=1)
-
-# # Replace indicator codes with names
-# for key,value in indicators.items():
-    
-#     df_raw.loc[:,'Indicator Code'] = df_raw['Indicator Code'].str.replace(key,value,regex=False)
-
-# # Empty DataFrame with county, year multiindex
-# df = pd.DataFrame(index=pd.MultiIndex.from_product([df_raw['Country Name'].unique(),df_raw.columns[2:]],names=['country','date']))
-# df = df.sort_index()
-
-# # Iterate over rows of df_raw and fill values in df
-# for i in df_raw.index:
-#     for c in df_raw.columns[2:]:
-        
-#         df.loc[(df_raw.loc[i,'Country Name'],c),df_raw.loc[i,'Indicator Code']] = df_raw.loc[i,c]
-
-# # Reorder columns
-# df = df[['broad money','gdp deflator','real gdp','exchange rate','lending rate']]
-
-# # Remove WDI csv files
-# for file in os.listdir():
-#     if file.endswith('csv') or file.endswith('zip'):
-#         os.remove(file)
-
-
-# ## Construct data sets
-
-# In[7]:
-
-
-def get_limits(series):
+def get_limits(valid):
     
-    '''Function to extract longest run of non NaN values. Code adapted from: https://stackoverflow.com/a/41494706'''
+    '''Function to find the longest run of True values in each row of a 2-dimensional boolean array. Returns arrays
+    of start and stop indices. The first run is chosen if there are several of equal length.'''
     
-    # Extract out relevant column from dataframe as array
-    values = series.values
+    steps = np.arange(valid.shape[1])
     
-    # Mask
-    mask = np.concatenate(( [True], np.isnan(values), [True] ))
+    # Length of the run of True values that ends at each element: distance to the last False value before it
+    last_false = np.maximum.accumulate(np.where(valid,-1,steps),axis=1)
+    run_length = steps - last_false
     
-    # Start-stop limits
-    limits = np.flatnonzero(mask[1:] != mask[:-1]).reshape(-1,2)
-    
-    # Get max interval, interval limits
-    start,stop = limits[(limits[:,1] - limits[:,0]).argmax()]
+    # The first maximum is the end of the earliest of the longest runs
+    stop = run_length.argmax(axis=1) + 1
+    start = stop - run_length.max(axis=1)
     
     return start,stop
 
 
-def get_data_frame(df,indicators,show_not_available=False):
-    
-    '''Produce a DataFrame with the desired indicators'''
+def get_data_frame(df,indicators,country_index,show_not_available=False):
     
-    # Initialize DataFrame
-    data = pd.DataFrame()
+    '''Produce a DataFrame with the desired indicators. country_index is the country metadata returned by
+    get_country_index().'''
     
     # Columns
     new_columns = pd.Series(
@@ -345,50 +297,62 @@ def get_data_frame(df,indicators,show_not_available=False):
         index=['broad money','gdp deflator','real gdp','exchange rate','lending rate']
     )
     
+    names, panel = get_panel(df,indicators)
+    
+    # Longest run of years with all indicators available for every country
+    start,stop = get_limits(~np.isnan(panel).any(axis=2))
+    
+    if show_not_available==True and (start==stop).any():
+        print('Data not available for: '+', '.join(names[start==stop]))
+    
+    # Keep countries with at least 10 years of data
+    keep = stop-start>=10
+    rows = np.flatnonzero(keep)
+    start, stop = start[keep], stop[keep]
+    n_years = stop - start
+    
+    # Values at the start and the end of each country's range
+    first = panel[rows,start,:]
+    last = panel[rows,stop-1,:]
+    
+    # Mean over each country's range
+    in_range = (np.arange(panel.shape[1]) >= start[:,None]) & (np.arange(panel.shape[1]) < stop[:,None])
+    mean = np.where(in_range[:,:,None],panel[rows],0).sum(axis=1)/n_years[:,None]
+    
+    # Country metadata for all countries at once. Names without metadata are reported together.
+    metadata = country_index.reindex(names[rows])
     
-    for n, value in enumerate(df.groupby(level=0)):
-        country, country_df = value
+    missing = list(metadata.index[metadata['iso code'].isna()])
+    if len(missing)>0:
+        print('Cannot find iso code for '+str(len(missing))+' countries: '+', '.join(missing))
+    
+    # Columns of the DataFrame
+    columns = {'country':names[rows],'iso code':metadata['iso code'].values,'observations':n_years.astype(float)}
+    
+    for k, ind in enumerate(indicators):
         
-        try:
-            
-            column_sum = country_df[indicators].sum(axis=1,skipna=False)
-            start,stop = get_limits(column_sum)
-            
-            if stop-start>=10:
-                data.loc[n,'country'] = country
-                try:
-                    data.loc[n,'iso code'] = countries[countries['country name']==country].index[0]
-                except:
-                    print('Cannot find iso code for '+country)
-                data.loc[n,'observations'] = stop - start
-                
-                
-                for ind in indicators:
-                    
-                    if ind == 'lending rate':
-                        
-                        data.loc[n,new_columns[ind]] = np.mean(country_df[ind].iloc[start:stop])/100
-
-                    else:    
-                        data.loc[n,new_columns[ind]] = (country_df[ind].iloc[stop-1]/country_df[ind].iloc[start])**(1/(stop-start-1))-1
-            
-                data.loc[n,'income group'] = countries[countries['country name']==country]['income group'][0]
-                data.loc[n,'oecd'] = countries[countries['country name']==country]['oecd'][0]
-        except:
-            if show_not_available==True:
-                print('Data not available for: ',country)
-            
-
+        if ind == 'lending rate':
+            columns[new_columns[ind]] = mean[:,k]/100
+        
+        else:
+            columns[new_columns[ind]] = (last[:,k]/first[:,k])**(1/(n_years-1))-1
+    
+    columns['income group'] = metadata['income group'].values
+    columns['oecd'] = metadata['oecd'].values
+    
+    # Create the DataFrame at once
+    data = pd.DataFrame(columns,index=rows)
+    
     return data
 
 # Closed economy data
-quantity_theory_data = get_data_frame(df,indicators = ['broad money','gdp deflator','real gdp'],show_not_available=False)
+quantity_theory_data = get_data_frame(df,indicators = ['broad money','gdp deflator','real gdp'],country_index=country_index,show_not_available=False)
 
 # Export closed economy data
 quantity_theory_data.to_csv('../csv/quantity_theory_data.csv',index=False)
 
 # Open economy data
-quantity_theory_data_open = get_data_frame(df,indicators = ['broad money','gdp deflator','real gdp','lending rate','exchange rate'],show_not_available=False)
+quantity_theory_data_open = get_data_frame(df,indicators = ['broad money','gdp deflator','real gdp','lending rate','exchange rate'],country_index=country_index,show_not_available=False)
 
 # Export open economy data
 quantity_theory_data_open.to_csv('../csv/quantity_theory_data_open.csv',index=False)
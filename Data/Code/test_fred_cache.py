@@ -0,0 +1,175 @@
+'''Tests of fred_cache.py against a local server that mimics the FRED API.
+
+Run from this directory with:
+
+    python -m pytest -q test_fred_cache.py
+'''
+
+import json
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pandas as pd
+import pytest
+import fredpy as fp
+
+import fred_cache
+
+
+class FredHandler(BaseHTTPRequestHandler):
+
+    '''Serves 'fred/series' and 'fred/series/observations' for the monthly series in server.state['series']'''
+
+    def log_message(self,*args):
+
+        pass
+
+    def do_GET(self):
+
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        state = self.server.state
+        state['log'].append((url.path,query))
+
+        if state['fail']>0:
+            state['fail']-=1
+            self.send_response(429)
+            self.send_header('Retry-After','0.01')
+            self.end_headers()
+            return
+
+        series = state['series'][query['series_id']]
+
+        if url.path=='/fred/series':
+            body = {'seriess':[{'id':query['series_id'],'title':query['series_id']+' title','frequency':'Monthly',
+                                'frequency_short':'M','units':series['units'],'units_short':series['units'],
+                                'seasonal_adjustment':'Seasonally Adjusted','seasonal_adjustment_short':'SA',
+                                'observation_start':series['observations'][0][0],'last_updated':series['last_updated'],'notes':''}]}
+
+        else:
+            start = query.get('observation_start','')
+            body = {'observations':[{'date':date,'value':value} for date,value in series['observations'] if date>=start]}
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type','application/json')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def monthly(values,start='2020-01-01'):
+
+    '''Return a list of (date, value) observations of a monthly series'''
+
+    dates = pd.date_range(start,periods=len(values),freq='MS').strftime('%Y-%m-%d')
+
+    return [(date,str(value)) for date,value in zip(dates,values)]
+
+
+@pytest.fixture
+def server(monkeypatch):
+
+    monkeypatch.setattr(fp,'api_key','x'*32)
+
+    httpd = ThreadingHTTPServer(('localhost',0),FredHandler)
+    httpd.state = {'log':[],'fail':0,'series':{
+        'AAA':{'units':'Percent','last_updated':'2024-01-01','observations':monthly(range(1,25))},
+        'BBB':{'units':'Index','last_updated':'2024-01-01','observations':monthly(range(101,125))},
+    }}
+    threading.Thread(target=httpd.serve_forever,daemon=True).start()
+
+    yield httpd
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def load_all(server,cache_dir,**kwargs):
+
+    '''Call fred_cache.load_all() against the local server and return the series and the requests made'''
+
+    server.state['log'] = []
+    base_url = 'http://localhost:'+str(server.server_address[1])+'/'
+
+    series = fred_cache.load_all(['AAA','BBB'],cache_dir=str(cache_dir),requests_per_minute=60000,register_series=False,base_url=base_url,backoff=0.01,**kwargs)
+
+    return series, server.state['log']
+
+
+def observation_requests(log):
+
+    '''Return the observation_start of each request for observations, '' for the whole history'''
+
+    return sorted((query['series_id'],query.get('observation_start','')) for path,query in log if path.endswith('observations'))
+
+
+def test_full_unchanged_and_offline(server,tmp_path,capsys):
+
+    series, log = load_all(server,tmp_path)
+    assert 'FRED cache: 2 full' in capsys.readouterr().out
+    assert observation_requests(log)==[('AAA',''),('BBB','')]
+    assert list(series['AAA'].data)==list(range(1,25))
+    assert series['BBB'].data.index[-1]==pd.Timestamp('2021-12-01')
+
+    # Same 'last_updated': only the metadata are requested
+    unchanged, log = load_all(server,tmp_path)
+    assert 'FRED cache: 2 unchanged' in capsys.readouterr().out
+    assert observation_requests(log)==[]
+    assert unchanged['AAA'].data.equals(series['AAA'].data)
+
+    offline, log = load_all(server,tmp_path,offline=True)
+    assert 'FRED cache: 2 offline' in capsys.readouterr().out
+    assert log==[]
+    assert offline['BBB'].data.equals(series['BBB'].data)
+    assert offline['BBB'].units==series['BBB'].units
+
+    with pytest.raises(FileNotFoundError):
+        fred_cache.load_series('CCC',cache_dir=str(tmp_path),offline=True)
+
+
+def test_incremental_update(server,tmp_path,capsys):
+
+    load_all(server,tmp_path)
+
+    # A new observation and a revision of the last one
+    aaa = server.state['series']['AAA']
+    aaa['observations'] = aaa['observations'][:-1]+monthly([240,25],start='2021-12-01')
+    aaa['last_updated'] = '2024-02-01'
+
+    series, log = load_all(server,tmp_path,revision_periods=12)
+    assert 'FRED cache: 1 incremental, 1 unchanged' in capsys.readouterr().out
+    assert observation_requests(log)==[('AAA','2021-01-01')]
+    assert list(series['AAA'].data)==list(range(1,24))+[240,25]
+
+
+def test_revision_before_window_and_new_units_download_everything(server,tmp_path,capsys):
+
+    load_all(server,tmp_path)
+
+    # A revision of the oldest value of the window may reach further back
+    aaa = server.state['series']['AAA']
+    aaa['observations'] = monthly([0]+list(range(2,13))+[-13]+list(range(14,25)))
+    aaa['last_updated'] = '2024-02-01'
+
+    # A new base year changes the units and shortens the history
+    bbb = server.state['series']['BBB']
+    bbb['observations'] = monthly(range(1,13),start='2021-01-01')
+    bbb['units'] = 'Index 2021=100'
+
+    series, log = load_all(server,tmp_path,revision_periods=12)
+    assert 'FRED cache: 2 full' in capsys.readouterr().out
+    assert observation_requests(log)==[('AAA',''),('AAA','2021-01-01'),('BBB','')]
+    assert series['AAA'].data.iloc[0]==0
+    assert list(series['BBB'].data)==list(range(1,13))
+    assert len(fred_cache.read_cache('BBB',str(tmp_path))[1])==12
+
+
+def test_retry_after_rate_limit(server,tmp_path,capsys):
+
+    server.state['fail'] = 2
+    series, log = load_all(server,tmp_path,max_workers=1)
+
+    assert len(log)==6
+    assert list(series['AAA'].data)==list(range(1,25))
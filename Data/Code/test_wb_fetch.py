@@ -0,0 +1,151 @@
+'''Tests of wb_fetch.py against a local server that mimics the World Bank API.
+
+Run from this directory with:
+
+    python -m pytest -q test_wb_fetch.py
+'''
+
+import json
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import wb_fetch
+
+
+# Names of the countries served by the local API
+names = {'CAN':'Canada','MEX':'Mexico','USA':'United States','ZAF':'South Africa'}
+
+
+class WorldBankHandler(BaseHTTPRequestHandler):
+
+    '''Serves 'country/{codes}/indicator/{indicator}' with two years of data per country'''
+
+    def log_message(self,*args):
+
+        pass
+
+    def do_GET(self):
+
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        _, codes, _, indicator = url.path.strip('/').split('/')
+
+        state = self.server.state
+        state['log'].append((indicator,codes.split(';'),int(query['per_page'])))
+
+        if state['fail']>0:
+            state['fail']-=1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        if indicator not in ['NY.GDP.MKTP.KD','SP.POP.TOTL']:
+            body = [{'message':[{'id':'120','value':'Invalid value'}]}]
+
+        else:
+            observations = [{'indicator':{'id':indicator,'value':indicator},'country':{'id':code[:2],'value':names[code]},
+                             'countryiso3code':code,'date':str(year),'value':float(len(code)*year)}
+                            for code in codes.split(';') for year in [2019,2020]]
+            observations = observations[:int(query['per_page'])]
+            body = [{'page':1,'pages':1,'per_page':query['per_page'],'total':len(observations),'lastupdated':state['lastupdated']},observations]
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type','application/json')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+
+    httpd = ThreadingHTTPServer(('localhost',0),WorldBankHandler)
+    httpd.state = {'log':[],'lastupdated':'2024-01-01','fail':0}
+    threading.Thread(target=httpd.serve_forever,daemon=True).start()
+
+    yield httpd
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get_dataframe(server,cache_dir,country,**kwargs):
+
+    '''Call wb_fetch.get_dataframe() against the local server'''
+
+    server.state['log'] = []
+    base_url = 'http://localhost:'+str(server.server_address[1])+'/'
+
+    return wb_fetch.get_dataframe({'NY.GDP.MKTP.KD':'gdp','SP.POP.TOTL':'population'},country=country,cache_dir=str(cache_dir),
+                                  chunk_size=2,base_url=base_url,backoff=0.01,**kwargs)
+
+
+def test_full_cached_unchanged_and_offline(server,tmp_path,capsys):
+
+    countries = ['USA','CAN','MEX']
+
+    df = get_dataframe(server,tmp_path,countries)
+    assert 'World Bank cache: 4 full' in capsys.readouterr().out
+    assert len(server.state['log'])==4
+    assert list(df.columns)==['gdp','population']
+    assert df.loc[('Canada','2020'),'gdp']==3*2020
+
+    # Refreshed less than max_age hours ago: no requests
+    cached = get_dataframe(server,tmp_path,countries)
+    assert 'World Bank cache: 4 cached' in capsys.readouterr().out
+    assert server.state['log']==[]
+    assert cached.equals(df)
+
+    # Stale but the 'lastupdated' stamp is the same: one single-observation request per chunk
+    unchanged = get_dataframe(server,tmp_path,countries,max_age=0)
+    assert 'World Bank cache: 4 unchanged' in capsys.readouterr().out
+    assert [per_page for _,_,per_page in server.state['log']]==[1,1,1,1]
+    assert unchanged.equals(df)
+
+    offline = get_dataframe(server,tmp_path,countries,offline=True)
+    assert 'World Bank cache: 4 offline' in capsys.readouterr().out
+    assert server.state['log']==[]
+    assert offline.equals(df)
+
+    with pytest.raises(FileNotFoundError):
+        get_dataframe(server,tmp_path,countries+['ZAF'],offline=True)
+
+
+def test_updated_stamp_downloads_again(server,tmp_path,capsys):
+
+    get_dataframe(server,tmp_path,['USA','CAN'])
+
+    server.state['lastupdated'] = '2024-02-01'
+    get_dataframe(server,tmp_path,['USA','CAN'],max_age=0)
+
+    assert 'World Bank cache: 2 full' in capsys.readouterr().out.splitlines()[-1]
+    assert [per_page for _,_,per_page in server.state['log']]==[1,1,20000,20000]
+
+    # The new stamp is stored
+    assert wb_fetch.read_entry('SP.POP.TOTL','USA',str(tmp_path))['lastupdated']=='2024-02-01'
+
+
+def test_new_country_does_not_invalidate_others(server,tmp_path,capsys):
+
+    get_dataframe(server,tmp_path,['MEX','USA','ZAF'])
+
+    # CAN shifts the chunk boundaries from [MEX,USA],[ZAF] to [CAN,MEX],[USA,ZAF]
+    df = get_dataframe(server,tmp_path,['CAN','MEX','USA','ZAF'])
+
+    assert sorted(set(tuple(countries) for _,countries,_ in server.state['log']))==[('CAN',)]
+    assert df.loc[('South Africa','2019'),'population']==3*2019
+    assert len(df)==8
+
+
+def test_retry_and_api_error(server,tmp_path):
+
+    server.state['fail'] = 2
+    df = get_dataframe(server,tmp_path,['USA'],max_workers=1)
+    assert df.loc[('United States','2020'),'gdp']==3*2020
+
+    base_url = 'http://localhost:'+str(server.server_address[1])+'/'
+    with pytest.raises(ValueError):
+        wb_fetch.get_dataframe({'XX.UNKNOWN':'unknown'},country=['USA'],cache_dir=str(tmp_path),base_url=base_url)
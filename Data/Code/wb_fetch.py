@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Concurrent, cached download of World Bank indicators.
+
+wbdata.get_dataframe() requests all indicators for all countries in one blocking call and keeps nothing
+between runs. get_dataframe() here splits the request into chunks of one indicator and up to chunk_size
+countries. The chunks are requested in parallel from a bounded thread pool, and failed requests are retried
+with exponential backoff. The downloaded data are stored in the cache directory with one file per indicator and
+country, together with the 'lastupdated' stamp that the API reports for the data and the date on which they were
+refreshed. Since the cache does not depend on how the countries are split into chunks, adding or removing a
+country does not invalidate the data of the others.
+
+On a later run the data of a country are used as is if they were refreshed less than max_age hours ago.
+Otherwise one small request (a single observation) per chunk retrieves the current 'lastupdated' stamp. Only the
+countries whose stamp changed or that are not in the cache yet are downloaded again.
+
+The API address is a parameter so that the functions can be run against a local server that mimics the
+World Bank API (the 'country/{codes}/indicator/{indicator}' endpoint with format=json).
+
+Example:
+
+    import wb_fetch
+
+    df = wb_fetch.get_dataframe({'NY.GDP.MKTP.KD':'real gdp'},country=['USA','CAN','MEX'])
+'''
+
+import concurrent.futures
+import datetime
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from download_cache import default_cache_dir, get_json, is_offline
+
+
+# Address of the World Bank API
+default_base_url = 'https://api.worldbank.org/v2/'
+
+# Directory holding the cached data
+default_wb_cache_dir = os.path.join(default_cache_dir,'worldbank')
+
+
+def api_request(path,parameters,base_url=default_base_url,max_retries=5,backoff=1.0,timeout=60):
+
+    '''Query the World Bank API and return the decoded JSON response.
+
+    Args:
+        path (str):             API path, e.g., 'country/USA;CAN/indicator/NY.GDP.MKTP.KD'
+        parameters (dict):      Query parameters other than format
+        base_url (str):         Address of the API
+        max_retries (int):      Number of times a failed request is retried
+        backoff (float):        Delay before the first retry in seconds. Doubles on every retry.
+        timeout (float):        Timeout of a single request in seconds
+
+    Returns:
+        list: page information and list of observations
+    '''
+
+    response = get_json(base_url+path,dict(parameters,format='json'),max_retries,backoff,timeout=timeout)
+
+    # Errors such as an unknown indicator are returned with status 200 and a message
+    if len(response)<2 or 'message' in response[0]:
+        raise ValueError('World Bank API error for '+path+': '+json.dumps(response[0].get('message')))
+
+    return response
+
+
+def request_chunk(indicator,countries,per_page=20000,**kwargs):
+
+    '''Download one indicator for a list of countries.
+
+    Args:
+        indicator (str):    World Bank indicator code
+        countries (list):   ISO codes of countries
+        per_page (int):     Number of observations requested per page
+        **kwargs:           Passed to api_request()
+
+    Returns:
+        tuple: 'lastupdated' stamp and list of [country name, iso code, date, value] records
+    '''
+
+    path = 'country/'+';'.join(countries)+'/indicator/'+indicator
+
+    records = []
+    page = 1
+
+    while True:
+        info, observations = api_request(path,{'per_page':per_page,'page':page},**kwargs)
+
+        for obs in observations or []:
+            records.append([obs['country']['value'],obs['countryiso3code'] or obs['country']['id'],obs['date'],obs['value']])
+
+        if page>=int(info['pages']):
+            return info.get('lastupdated'), records
+
+        page+=1
+
+
+def request_last_updated(indicator,countries,**kwargs):
+
+    '''Return the 'lastupdated' stamp of a chunk with a request for a single observation'''
+
+    path = 'country/'+';'.join(countries)+'/indicator/'+indicator
+
+    return api_request(path,{'per_page':1,'page':1},**kwargs)[0].get('lastupdated')
+
+
+def cache_path(indicator,country,cache_dir=default_wb_cache_dir):
+
+    '''Return the path of the cache file of one indicator for one country'''
+
+    return os.path.join(cache_dir,indicator+'_'+country+'.json')
+
+
+def read_entry(indicator,country,cache_dir=default_wb_cache_dir):
+
+    '''Return the cached data of one indicator for one country as a dict with keys 'lastupdated', 'refreshed', and
+    'records', or None'''
+
+    path = cache_path(indicator,country,cache_dir)
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_entry(indicator,country,entry,cache_dir=default_wb_cache_dir):
+
+    '''Write the data of one indicator for one country to the cache. The file is replaced atomically.'''
+
+    os.makedirs(cache_dir,exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir,suffix='.json')
+    with os.fdopen(fd,'w') as file:
+        json.dump(dict(entry,indicator=indicator,country=country),file)
+    os.replace(tmp_path,cache_path(indicator,country,cache_dir))
+
+
+def load_chunk(indicator,countries,cache_dir=default_wb_cache_dir,offline=None,max_age=24,**kwargs):
+
+    '''Return the records of one indicator for a list of countries from the cache, refreshing stale countries from
+    the API.
+
+    Args:
+        indicator (str):    World Bank indicator code
+        countries (list):   ISO codes of countries
+        cache_dir (str):    Cache directory
+        offline (bool):     If True, make no requests and raise FileNotFoundError for countries not in the cache.
+                                Defaults to the DOWNLOAD_CACHE_OFFLINE environment variable.
+        max_age (float):    Hours after a refresh during which cached data are used without checking for updates
+        **kwargs:           Passed to api_request()
+
+    Returns:
+        tuple: list of records and how the chunk was obtained: 'offline', 'cached', 'unchanged', or 'full'
+    '''
+
+    if offline is None:
+        offline = is_offline()
+
+    entries = {country:read_entry(indicator,country,cache_dir) for country in countries}
+    now = datetime.datetime.now()
+
+    if offline:
+        missing = [country for country,entry in entries.items() if entry is None]
+        if missing:
+            raise FileNotFoundError('Offline mode: World Bank indicator '+indicator+' for '+', '.join(missing)+' is not in the cache at '+cache_dir)
+
+        mode = 'offline'
+
+    else:
+        stale = [country for country,entry in entries.items() if entry is not None
+                 and now-datetime.datetime.fromisoformat(entry['refreshed'])>=datetime.timedelta(hours=max_age)]
+        download = [country for country,entry in entries.items() if entry is None]
+        mode = 'cached'
+
+        if stale:
+            lastupdated = request_last_updated(indicator,stale,**kwargs)
+
+            for country in stale:
+                if entries[country]['lastupdated']==lastupdated:
+                    entries[country] = dict(entries[country],refreshed=now.isoformat())
+                    write_entry(indicator,country,entries[country],cache_dir)
+                    mode = 'unchanged'
+                else:
+                    download.append(country)
+
+        if download:
+            lastupdated, records = request_chunk(indicator,download,**kwargs)
+
+            # Split the records by country. A country without data is stored with an empty list.
+            for country in download:
+                entries[country] = {'lastupdated':lastupdated,'refreshed':now.isoformat(),'records':[]}
+            for record in records:
+                if record[1] in entries:
+                    entries[record[1]]['records'].append(record)
+
+            for country in download:
+                write_entry(indicator,country,entries[country],cache_dir)
+
+            mode = 'full'
+
+    return [record for country in countries for record in entries[country]['records']], mode
+
+
+def get_dataframe(indicators,country,cache_dir=default_wb_cache_dir,offline=None,chunk_size=50,max_workers=4,max_age=24,**kwargs):
+
+    '''Load indicators for many countries in parallel chunks through the cache and print how chunks were obtained.
+
+    Args:
+        indicators (dict):  Indicator names by World Bank indicator code
+        country (list):     ISO codes of countries
+        cache_dir (str):    Cache directory
+        offline (bool):     If True, make no requests. Defaults to the DOWNLOAD_CACHE_OFFLINE environment
+                                variable.
+        chunk_size (int):   Maximum number of countries per request
+        max_workers (int):  Maximum number of simultaneous requests
+        max_age (float):    Hours after a refresh during which a chunk is used without checking for updates
+        **kwargs:           Passed to api_request()
+
+    Returns:
+        Pandas DataFrame with a (country, date) MultiIndex and one column per indicator, like
+            wbdata.get_dataframe()
+    '''
+
+    country = sorted(country)
+    country_chunks = [country[i:i+chunk_size] for i in range(0,len(country),chunk_size)]
+    chunks = [(indicator,countries) for indicator in indicators for countries in country_chunks]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        futures = [executor.submit(load_chunk,indicator,countries,cache_dir,offline,max_age,**kwargs) for indicator,countries in chunks]
+
+        # result() re-raises the first error of a failed chunk
+        results = [future.result() for future in futures]
+
+    # Summarize how the chunks were obtained
+    modes = {}
+    for _, mode in results:
+        modes[mode] = modes.get(mode,0)+1
+
+    print('World Bank cache: '+', '.join(str(n)+' '+mode for mode,n in modes.items()))
+
+    frames = []
+    for (indicator,_), (records,_) in zip(chunks,results):
+        frame = pd.DataFrame(records,columns=['country','iso code','date','value'])
+        frame['indicator'] = indicators[indicator]
+        frames.append(frame)
+
+    data = pd.concat(frames,ignore_index=True)
+    data['value'] = pd.to_numeric(data['value'])
+
+    df = data.pivot(index=['country','date'],columns='indicator',values='value')
+
+    # Order the columns as in indicators
+    df = df.reindex(columns=list(indicators.values()))
+    df.columns.name = None
+
+    return df.sort_index()
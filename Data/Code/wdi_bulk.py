@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Reader for the bulk download of the World Bank's World Development Indicators (WDI).
+
+The WDI bulk download is a zip archive of several CSV files. The data file alone holds every indicator for
+every country and is several gigabytes when extracted. The functions here read the CSV files directly out of
+the archive without extracting them. The data file is streamed line by line. Only lines that contain one of
+the requested indicator codes as a field are kept, and these are parsed as CSV in batches and reduced to the
+requested countries. Memory use therefore depends on the size of the selection rather than on the size of the
+file. The selected rows are reshaped into a panel with one melt and one pivot.
+
+The result has the same layout as wbdata.get_dataframe(): a (country, date) MultiIndex with years as strings
+and one column per indicator, named as in the indicators dict.
+
+Example:
+
+    import wdi_bulk
+    from download_cache import fetch
+
+    wdi_file = fetch(wdi_bulk.wdi_url)
+    countries = wdi_bulk.read_countries(wdi_file)
+    df = wdi_bulk.read_indicators(wdi_file,{'NY.GDP.MKTP.KD':'real gdp'},countries=list(countries.index))
+'''
+
+import io
+import zipfile
+
+import pandas as pd
+
+
+# Address of the WDI bulk download
+wdi_url = 'https://databank.worldbank.org/data/download/WDI_CSV.zip'
+
+# Names of the data and country files in the archive. Older releases use the first name of each list.
+data_members = ['WDIData.csv','WDICSV.csv']
+country_members = ['WDICountry.csv']
+
+# Income groups in the country file and the names used in the data sets
+income_groups = {
+    'High income':'high',
+    'Upper middle income':'middle',
+    'Lower middle income':'middle',
+    'Low income':'low',
+}
+
+
+def find_member(archive,candidates):
+
+    '''Return the name of the first member of a zip archive that matches one of the candidate file names'''
+
+    names = {name.split('/')[-1].lower():name for name in archive.namelist()}
+
+    for candidate in candidates:
+        if candidate.lower() in names:
+            return names[candidate.lower()]
+
+    raise KeyError('None of '+', '.join(candidates)+' found in the WDI archive.')
+
+
+def read_countries(wdi_file):
+
+    '''Read country names and income groups from the WDI bulk download.
+
+    Args:
+        wdi_file (str):     Path to the WDI zip archive
+
+    Returns:
+        Pandas DataFrame with columns 'country name' and 'income group', indexed by 'iso code'
+    '''
+
+    with zipfile.ZipFile(wdi_file) as archive:
+        with archive.open(find_member(archive,country_members)) as member:
+            countries = pd.read_csv(member,usecols=['Country Code','Table Name','Income Group'])
+
+    countries = countries.set_index('Country Code')
+    countries.index.name = 'iso code'
+    countries.columns = ['country name','income group']
+
+    countries['income group'] = countries['income group'].replace(income_groups)
+
+    return countries
+
+
+def read_indicators(wdi_file,indicators,countries=None,batch_size=10000):
+
+    '''Read selected indicators from the WDI bulk download without extracting the archive.
+
+    Args:
+        wdi_file (str):         Path to the WDI zip archive
+        indicators (dict):      Indicator names by WDI indicator code
+        countries (list):       ISO codes of the countries to keep. All countries and regions if None.
+        batch_size (int):       Number of matching lines parsed at a time
+
+    Returns:
+        Pandas DataFrame with a (country, date) MultiIndex and one column per indicator
+    '''
+
+    codes = list(indicators.keys())
+
+    # Indicator codes as they appear as fields of a line, quoted or not. Testing for these substrings is much
+    # cheaper than parsing every line.
+    patterns = ['"'+code+'"' for code in codes]+[','+code+',' for code in codes]
+
+    # Identifiers and years. Skips the empty column created by the trailing comma of each line.
+    def use_column(column):
+        return column in ['Country Name','Country Code','Indicator Code'] or column.strip().isdigit()
+
+    # Parse a batch of lines and keep the rows of the requested indicators and countries
+    def parse(header,lines):
+
+        batch = pd.read_csv(io.StringIO(header+''.join(lines)),usecols=use_column)
+
+        keep = batch['Indicator Code'].isin(codes)
+        if countries is not None:
+            keep&= batch['Country Code'].isin(countries)
+
+        return batch[keep].drop('Country Code',axis=1)
+
+    selected = []
+
+    with zipfile.ZipFile(wdi_file) as archive:
+        with archive.open(find_member(archive,data_members)) as member:
+
+            lines = io.TextIOWrapper(member,encoding='utf-8-sig')
+            header = next(lines)
+
+            batch = []
+            for line in lines:
+                if any(pattern in line for pattern in patterns):
+                    batch.append(line)
+
+                    if len(batch)==batch_size:
+                        selected.append(parse(header,batch))
+                        batch = []
+
+            selected.append(parse(header,batch))
+
+    selected = pd.concat(selected,ignore_index=True)
+
+    # Long format with one row per country, indicator, and year, then one column per indicator
+    long = selected.melt(id_vars=['Country Name','Indicator Code'],var_name='date',value_name='value')
+    long['date'] = long['date'].str.strip()
+
+    df = long.pivot(index=['Country Name','date'],columns='Indicator Code',values='value')
+
+    # Name and order the columns as in indicators. Indicators missing from the file are all NaN.
+    df = df.reindex(columns=codes).rename(columns=indicators)
+    df.columns.name = None
+    df.index.names = ['country','date']
+
+    return df.sort_index()
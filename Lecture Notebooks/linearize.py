@@ -0,0 +1,240 @@
+'''Fast (log-)linear approximations of linearsolve models.
+
+approximate_and_solve() of a linearsolve model differentiates the equilibrium equations one variable at a time.
+Every evaluation of equilibrium_equations(variables_forward,variables_current,parameters) gets new Pandas
+Series for the variables, and every p.alpha or cur.y in the function is a Pandas attribute lookup. For the
+larger models of Classes 17 to 19 this takes most of the time of a solve.
+
+The functions here evaluate the equations once for all perturbations together. The variables are passed as
+objects whose attributes are NumPy arrays with one element per perturbed point, so an equation like
+
+    cur.a*cur.k**p.alpha*cur.l**(1-p.alpha) - cur.y
+
+computes all perturbed points at once and np.array([...]) in the function stacks them into an array with one
+row per equation. Equations that cannot be evaluated this way, e.g., because one of them does not depend on the
+variables, are evaluated one point at a time with the same objects.
+
+The derivatives are computed with
+
+    * 'complex':    complex steps, as linearsolve does, accurate to rounding error,
+    * 'central':    central differences, for equations that do not accept complex numbers, or
+    * 'analytic':   a function that returns the derivatives of the equations.
+
+The Jacobians are cached by the equations, the parameters, and the steady state, so approximating the same model
+again, e.g., after switching between linear and log-linear approximations, does not evaluate the equations.
+
+Example:
+
+    import linearize
+
+    nk_model.compute_ss([0,0,0,0,0.01,0.01,0.01])
+
+    # Replaces nk_model.approximate_and_solve()
+    linearize.approximate_and_solve(nk_model)
+'''
+
+import collections
+
+import numpy as np
+
+
+# Machine epsilon, from which the step sizes are computed as in statsmodels' approx_fprime_cs()
+EPS = np.finfo(float).eps
+
+# Jacobians by equations, names, parameters, steady state, and method, least recently used first
+cache = collections.OrderedDict()
+
+# Number of Jacobians kept in the cache
+max_entries = 256
+
+
+class Values:
+
+    '''Named values with attribute and item access, like a Pandas Series without its overhead.
+
+    Attributes:
+        One attribute per name
+    '''
+
+    def __init__(self,names,values):
+
+        '''Initializes an instance of the Values class.
+
+        Args:
+            names (list):       Names of the values
+            values (iterable):  Values, e.g., the rows of an array with one row per name
+
+        Returns:
+            None
+        '''
+
+        self.__dict__.update(zip(names,values))
+
+    def __getitem__(self,name):
+
+        return self.__dict__[name]
+
+
+def evaluate(equations,names,forward,current,parameters):
+
+    '''Evaluate equilibrium equations at K points.
+
+    Args:
+        equations (callable):   Function of the variables forward, current variables, and parameters
+        names (list):           Names of the variables
+        forward (ndarray):      Forward variables of shape (n_vars, K)
+        current (ndarray):      Current variables of shape (n_vars, K)
+        parameters (Values):    Parameters
+
+    Returns:
+        NumPy ndarray of shape (n_equations, K)
+    '''
+
+    K = forward.shape[1]
+
+    try:
+        values = np.asarray(equations(Values(names,forward),Values(names,current),parameters))
+        if values.ndim==2 and values.shape[1]==K and values.dtype!=object:
+            return values
+
+    except (ValueError,TypeError):
+        pass
+
+    # One point at a time
+    return np.column_stack([equations(Values(names,forward[:,k]),Values(names,current[:,k]),parameters) for k in range(K)])
+
+
+def jacobians(equations,names,steady_state,parameters,method='complex',analytic=None):
+
+    '''Return the derivatives of equilibrium equations with respect to the forward and the current variables at
+    the steady state.
+
+    Args:
+        equations (callable):   Function of the variables forward, current variables, and parameters
+        names (list):           Names of the variables
+        steady_state (ndarray): Steady state
+        parameters (Values):    Parameters
+        method (str):           'complex', 'central', or 'analytic'
+        analytic (callable):    For method 'analytic', a function with the same arguments as equations that
+                                    returns the two Jacobians
+
+    Returns:
+        tuple: NumPy ndarrays with the derivatives with respect to the forward and the current variables, each of
+            shape (n_equations, n_vars), and the values of the equations at the steady state
+    '''
+
+    x = np.asarray(steady_state,dtype=float)
+    n = len(x)
+    columns = np.repeat(x[:,None],2*n,axis=1)
+
+    if method=='analytic':
+        if analytic is None:
+            raise ValueError('Method analytic needs a function that returns the Jacobians.')
+
+        point = Values(names,x)
+        jacobian_forward, jacobian_current = analytic(point,point,parameters)
+        residuals = evaluate(equations,names,x[:,None],x[:,None],parameters)[:,0]
+
+        return np.asarray(jacobian_forward,dtype=float), np.asarray(jacobian_current,dtype=float), residuals
+
+    if method=='complex':
+
+        # Columns 0, ..., n-1 perturb the forward variables and n, ..., 2n-1 the current ones
+        step = EPS*np.maximum(np.abs(x),0.1)
+        perturbation = np.zeros((n,2*n),dtype=complex)
+        perturbation[np.arange(n),np.arange(n)] = 1j*step
+
+        forward = columns + perturbation
+        current = columns + np.roll(perturbation,n,axis=1)
+
+        values = evaluate(equations,names,np.hstack([forward,x[:,None]]),np.hstack([current,x[:,None]]),parameters)
+        derivatives = values[:,:-1].imag/np.concatenate([step,step])
+        residuals = values[:,-1].real
+
+    elif method=='central':
+
+        step = EPS**(1/3)*np.maximum(np.abs(x),0.1)
+        perturbation = np.zeros((n,2*n))
+        perturbation[np.arange(n),np.arange(n)] = step
+
+        forward = np.hstack([columns+perturbation,columns-perturbation,x[:,None]])
+        current = np.hstack([columns+np.roll(perturbation,n,axis=1),columns-np.roll(perturbation,n,axis=1),x[:,None]])
+
+        values = evaluate(equations,names,forward,current,parameters)
+        derivatives = (values[:,:2*n]-values[:,2*n:4*n])/(2*np.concatenate([step,step]))
+        residuals = values[:,-1]
+
+    else:
+        raise ValueError('Unknown method '+str(method)+'. Choose complex, central, or analytic.')
+
+    return derivatives[:,:n], derivatives[:,n:], residuals
+
+
+def approximate(model,log_linear=False,method='complex',analytic=None):
+
+    '''Set the coefficient matrices a and b of the (log-)linear approximation of a model around its steady state,
+    like linear_approximation() and log_linear_approximation() of a linearsolve model.
+
+    Args:
+        model (linearsolve.model):      Model with a steady state
+        log_linear (bool):              Whether to compute a log-linear approximation
+        method (str):                   'complex', 'central', or 'analytic'
+        analytic (callable):            For method 'analytic', a function of the forward variables, current
+                                            variables, and parameters that returns the derivatives of the
+                                            equations with respect to the forward and the current variables
+
+    Returns:
+        None
+    '''
+
+    try:
+        steady_state = np.asarray(model.ss,dtype=float)
+    except AttributeError:
+        raise ValueError('You must specify a steady state for the model before attempting to linearize.')
+
+    names = list(model.names['variables'])
+    parameter_values = np.asarray(model.parameters,dtype=float)
+
+    key = (model.equations,tuple(names),tuple(model.parameters.index),parameter_values.tobytes(),steady_state.tobytes(),method,analytic)
+
+    if key in cache:
+        cache.move_to_end(key)
+        jacobian_forward, jacobian_current, residuals = cache[key]
+
+    else:
+        parameters = Values(model.parameters.index,parameter_values)
+        jacobian_forward, jacobian_current, residuals = jacobians(model.equations,names,steady_state,parameters,method,analytic)
+
+        cache[key] = jacobian_forward, jacobian_current, residuals
+        if len(cache)>max_entries:
+            cache.popitem(last=False)
+
+    if log_linear:
+
+        # Derivatives of log(1+equations) with respect to the logs of the variables
+        jacobian_forward = jacobian_forward*steady_state/(1+residuals[:,None])
+        jacobian_current = jacobian_current*steady_state/(1+residuals[:,None])
+
+    model.log_linear = log_linear
+    model.a = jacobian_forward
+    model.b = -jacobian_current
+
+
+def approximate_and_solve(model,log_linear=False,eigenvalue_warnings=True,method='complex',analytic=None):
+
+    '''Approximate a model with approximate() and solve it with the solve_klein() method of the model. Replaces the
+    approximate_and_solve() method of a linearsolve model.
+
+    Args:
+        model (linearsolve.model):      Model with a steady state
+        log_linear (bool):              Whether to compute a log-linear approximation
+        eigenvalue_warnings (bool):     Passed to solve_klein()
+        method (str):                   'complex', 'central', or 'analytic'
+        analytic (callable):            For method 'analytic', the function described in approximate()
+
+    Returns:
+        None
+    '''
+
+    approximate(model,log_linear,method,analytic)
+    model.solve_klein(model.a,model.b,eigenvalue_warnings=eigenvalue_warnings)
@@ -0,0 +1,168 @@
+'''Persistent cache of linearsolve solutions for the models of Classes 12 to 19.
+
+The notebooks build a model with ls.model() and then call compute_ss() and approximate_and_solve(). Both
+steps are repeated every time a notebook runs, even if nothing about the model changed. solve() here does the
+same two steps but first looks up the solution on disk. The key of a solution is a hash of
+
+    * the source code of the equilibrium equations function,
+    * the names of the variables and shocks and the numbers of states and exogenous states,
+    * the parameter values, and
+    * the steady state guess, the solver method, and whether the approximation is log-linear.
+
+A stored solution holds the steady state, the coefficient matrices a and b of the (log-)linear approximation,
+and the solution matrices f and p with the stability flag and the eigenvalues. Loading it sets the same
+attributes of the model as compute_ss() and approximate_and_solve() do, so impulse() and stoch_sim() work as
+usual. Every use of a solution updates the modification time of its file, and when there are more than
+max_entries solutions the least recently used ones are removed.
+
+Example:
+
+    import linearsolve as ls
+    import linearsolve_cache
+
+    rbc_model = ls.model(equations=equilibrium_equations,n_states=2,n_exo_states=1,var_names=var_names,
+                         shock_names=shock_names,parameters=parameters)
+
+    # Replaces rbc_model.compute_ss(guess) and rbc_model.approximate_and_solve()
+    linearsolve_cache.solve(rbc_model,guess=[1,4,1,1,1,0.5],log_linear=True)
+'''
+
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+# Directory holding the stored solutions
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),'.cache','linearsolve')
+
+# Attributes of a solved model that are stored
+attributes = ['a','b','f','p','stab','eig']
+
+
+def model_key(model,guess=None,method='fsolve',log_linear=False):
+
+    '''Return the cache key of a linearsolve model as a hex digest.
+
+    Args:
+        model (linearsolve.model):          Model with equations, names, and parameters
+        guess (list or Pandas Series):      Initial guess for the steady state
+        method (str):                       Solver passed to compute_ss()
+        log_linear (bool):                  Whether the approximation is log-linear
+
+    Returns:
+        str
+    '''
+
+    if isinstance(guess,pd.Series):
+        guess = guess[model.names['variables']]
+
+    # Equations defined where the source is not available, e.g., with exec(), are identified by their byte code
+    try:
+        equations = inspect.getsource(model.equations)
+    except (OSError,TypeError):
+        equations = repr((model.equations.__code__.co_code,model.equations.__code__.co_consts))
+
+    parts = [
+        equations,
+        list(model.names['variables']),
+        list(model.names['shocks']),
+        int(model.n_states),
+        int(model.n_exo_states),
+        list(model.parameters.index),
+        np.asarray(model.parameters).tolist(),
+        None if guess is None else np.asarray(guess).tolist(),
+        method,
+        bool(log_linear),
+    ]
+
+    return hashlib.sha256(pickle.dumps(parts,protocol=4)).hexdigest()
+
+
+def evict(cache_dir,max_entries):
+
+    '''Remove the least recently used solutions until at most max_entries remain'''
+
+    paths = [os.path.join(cache_dir,name) for name in os.listdir(cache_dir) if name.endswith('.pkl')]
+
+    if len(paths)<=max_entries:
+        return
+
+    paths.sort(key=os.path.getmtime)
+
+    for path in paths[:len(paths)-max_entries]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def solve(model,guess=None,log_linear=False,method='fsolve',eigenvalue_warnings=True,cache_dir=default_cache_dir,max_entries=256):
+
+    '''Compute the steady state and solve the (log-)linear approximation of a model, using a stored solution if
+    there is one for the same model, parameters, and options.
+
+    Args:
+        model (linearsolve.model):          Model created with ls.model()
+        guess (list or Pandas Series):      Initial guess for the steady state, as for compute_ss()
+        log_linear (bool):                  Whether to compute a log-linear approximation
+        method (str):                       Solver passed to compute_ss()
+        eigenvalue_warnings (bool):         Passed to approximate_and_solve()
+        cache_dir (str):                    Directory where solutions are stored
+        max_entries (int):                  Number of solutions kept in the cache
+
+    Returns:
+        bool: True if the solution was loaded from the cache
+    '''
+
+    key = model_key(model,guess,method,log_linear)
+    path = os.path.join(cache_dir,key+'.pkl')
+
+    try:
+        with open(path,'rb') as file:
+            stored = pickle.load(file)
+
+    except (FileNotFoundError,EOFError,pickle.UnpicklingError):
+        stored = None
+
+    if stored is not None:
+        model.ss = pd.Series(stored['ss'],index=model.names['variables'])
+        model.log_linear = stored['log_linear']
+        for name in attributes:
+            setattr(model,name,stored[name])
+
+        # Mark the solution as recently used
+        os.utime(path)
+
+        return True
+
+    model.compute_ss(guess,method=method)
+    model.approximate_and_solve(log_linear=log_linear,eigenvalue_warnings=eigenvalue_warnings)
+
+    stored = {'ss':model.ss.to_numpy(),'log_linear':model.log_linear}
+    for name in attributes:
+        stored[name] = getattr(model,name)
+
+    os.makedirs(cache_dir,exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir,suffix='.part')
+    with os.fdopen(fd,'wb') as file:
+        pickle.dump(stored,file,protocol=4)
+    os.replace(tmp_path,path)
+
+    evict(cache_dir,max_entries)
+
+    return False
+
+
+def clear(cache_dir=default_cache_dir):
+
+    '''Remove all stored solutions'''
+
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir,name))
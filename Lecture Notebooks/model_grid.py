@@ -0,0 +1,264 @@
+'''Solve a linearsolve model over a grid of parameter values and compare the grid points.
+
+Classes 17 to 19 solve the New-Keynesian model for one set of parameters at a time, compute impulse responses,
+and compare policies by looking at the plots. solve() here solves a model for every combination of the given
+parameter values, e.g., a grid of Taylor rule coefficients phi_pi and phi_y and of structural parameters like
+kappa. The grid is split into chunks that are solved in the main process or in a process pool. Within a chunk
+the steady state of each point is used as the initial guess for the next.
+
+The solutions are stacked into arrays with one leading dimension per swept parameter, so that impulse()
+computes the impulse responses to every shock at every grid point together with batched matrix products, and
+loss() evaluates a quadratic loss function like the one of Class 19 on all of them at once.
+
+Results are returned as parameter_grid.Cube objects. Grid points for which the model has no unique stable
+solution get NaN.
+
+Example:
+
+    import numpy as np
+    import model_grid
+
+    solution = model_grid.solve(nk_model,guess=[0,0,0,0,0.01,0.01,0.01],phi_pi=np.linspace(1.01,3,40),phi_y=np.linspace(0,1,41))
+    irs = model_grid.impulse(solution,T=21,t0=5,shocks=[0.01,0.01/4,0.01/4])
+    losses = model_grid.loss(irs,weights={'pi':1,'y':0.1})
+    model_grid.best(losses)     # {'phi_pi': ..., 'phi_y': ...}
+'''
+
+import copy
+import warnings
+
+import numpy as np
+
+import linearize
+import parameter_grid
+from parameter_grid import Cube
+
+
+def packed_size(model):
+
+    '''Return the number of values stored per grid point: steady state, f, p, and the stability flag'''
+
+    n_vars = len(model.names['variables'])
+    n_states = model.n_states
+
+    return n_vars + (n_vars-n_states)*n_states + n_states*n_states + 1
+
+
+def solve_chunk(model,grids,fixed,guess,log_linear,linearization,start,stop,warn=True):
+
+    '''Solve the model for combinations start, ..., stop-1 of the grids and return the packed solutions as an
+    array of shape (stop-start, packed_size(model)). Warns if no combination could be solved at all, unless
+    warn is False. Defined at module level so that it can run in a process pool.'''
+
+    parameters = parameter_grid.parameter_chunk(grids,fixed,start,stop)
+
+    n_vars = len(model.names['variables'])
+    n_states = model.n_states
+
+    data = np.full((stop-start,packed_size(model)),np.nan)
+
+    for row in range(stop-start):
+
+        for name, values in parameters.items():
+            model.parameters[name] = values[row]
+
+        try:
+            model.compute_ss(guess)
+            if linearization is None:
+                model.approximate_and_solve(log_linear=log_linear,eigenvalue_warnings=False)
+            else:
+                linearize.approximate_and_solve(model,log_linear,eigenvalue_warnings=False,method=linearization)
+
+        # linearsolve's klein() calls sys.exit() when a matrix of the decomposition is not invertible, which
+        # must not end the whole grid
+        except (ValueError,np.linalg.LinAlgError,SystemExit):
+            continue
+
+        ss = model.ss.to_numpy(dtype=float)
+        data[row,-1] = model.stab
+
+        # Keep the solution only if it is unique and stable
+        if model.stab==0 and np.all(np.isfinite(ss)):
+            data[row,:-1] = np.concatenate([ss,np.ravel(model.f),np.ravel(model.p)])
+
+            # Start the next steady state computation from this one
+            guess = ss
+
+    # Points without a unique stable solution have a stability flag, points that could not be solved have none
+    if warn and np.isnan(data[:,-1]).all():
+        warnings.warn('No steady state or solution was found for grid points '+str(start)+' to '+str(stop-1)
+                      +'. Check the initial guess for the steady state.',RuntimeWarning)
+
+    return data
+
+
+def solve(model,guess=None,log_linear=False,chunk_size=200,max_workers=1,linearization=None,**parameters):
+
+    '''Solve a linearsolve model for every combination of the given parameter values.
+
+    Args:
+        model (linearsolve.model):          Model created with ls.model(). Its parameters are used for the
+                                                parameters not given here.
+        guess (list or Pandas Series):      Initial guess for the steady state of the first point of each chunk.
+                                                Defaults to the steady state of the model if it has been
+                                                computed.
+        log_linear (bool):                  Whether to compute log-linear approximations
+        chunk_size (int):                   Number of grid points solved at a time
+        max_workers (int):                  Number of processes, as in parameter_grid.run_chunks()
+        linearization (str):                Method of linearize.approximate() used to approximate the model,
+                                                e.g., 'complex'. Defaults to the approximate_and_solve()
+                                                method of the model.
+        **parameters:                       Value or list of values of model parameters, e.g., phi_pi=[1.5,2]
+
+    Returns:
+        dict with keys:
+            'ss':       Cube with dimensions (parameters..., variable) of steady states
+            'f':        NumPy ndarray of shape (parameters..., n_costates, n_states)
+            'p':        NumPy ndarray of shape (parameters..., n_states, n_states)
+            'stab':     Cube with the stability flag of each grid point as set by approximate_and_solve()
+            'names':    dict of the names of the variables and shocks
+            'log_linear': bool
+    '''
+
+    unknown = [name for name in parameters if name not in model.parameters.index]
+    if unknown:
+        raise ValueError('Unknown parameters: '+', '.join(unknown)+'.')
+
+    # Without a guess, compute_ss() starts from ones, which is outside the domain of many models
+    if guess is None and getattr(model,'ss',None) is not None:
+        guess = np.asarray(model.ss[list(model.names['variables'])],dtype=float)
+
+    grids = {name:np.asarray(values) for name,values in parameters.items() if np.ndim(values)>0}
+    fixed = {name:value for name,value in parameters.items() if np.ndim(value)==0}
+
+    shape = tuple(len(values) for values in grids.values())
+    size = int(np.prod(shape))
+
+    # Work on a copy so that the parameters and solution of the model passed in are not changed
+    model = copy.deepcopy(model)
+    model.parameters = model.parameters.astype(float)
+
+    data = np.empty((size,packed_size(model)))
+    parameter_grid.run_chunks(solve_chunk,(model,grids,fixed,guess,log_linear,linearization),size,chunk_size,data,max_workers)
+
+    variables = list(model.names['variables'])
+    n_vars = len(variables)
+    n_states = model.n_states
+    n_costates = n_vars-n_states
+
+    ss, f, p, stab = np.split(data,np.cumsum([n_vars,n_costates*n_states,n_states*n_states]),axis=1)
+
+    coords = dict(grids)
+    coords['variable'] = variables
+    dims = list(grids)
+
+    return {
+        'ss':Cube(ss.reshape(shape+(n_vars,)),dims+['variable'],coords,fixed),
+        'f':f.reshape(shape+(n_costates,n_states)),
+        'p':p.reshape(shape+(n_states,n_states)),
+        'stab':Cube(stab.reshape(shape),dims,coords,fixed),
+        'names':{'variables':variables,'shocks':list(model.names['shocks'])},
+        'log_linear':log_linear,
+    }
+
+
+def impulse(solution,T=51,t0=1,shocks=None):
+
+    '''Compute impulse responses to every shock at every grid point, like the impulse() method of a linearsolve
+    model with center=True and normalize=False.
+
+    Args:
+        solution (dict):        As returned by solve()
+        T (int):                Number of periods
+        t0 (int):               Period in which the shocks are realized
+        shocks (list):          Size of each shock. Defaults to 0.01 for every shock.
+
+    Returns:
+        Cube with dimensions (parameters..., shock, period, variable)
+    '''
+
+    f = solution['f']
+    p = solution['p']
+
+    shock_names = solution['names']['shocks']
+    n_states = p.shape[-1]
+
+    if shocks is None:
+        shocks = [0.01]*len(shock_names)
+
+    # Initial state for each shock in the columns: the exogenous states are shocked, the others are zero
+    impact = np.zeros((n_states,len(shock_names)))
+    impact[np.arange(len(shock_names)),np.arange(len(shock_names))] = shocks
+
+    # States in period t0, ..., T-1 for all grid points and shocks, shape (..., n_states, n_shocks)
+    states = np.zeros(p.shape[:-2]+(T,n_states,len(shock_names)))
+    current = np.broadcast_to(impact,p.shape[:-2]+impact.shape)
+    for t in range(t0,T):
+        states[...,t,:,:] = current
+        current = p@current
+
+    costates = f[...,None,:,:]@states
+
+    # Shape (..., shock, period, variable)
+    values = np.concatenate([states,costates],axis=-2)
+    values = np.moveaxis(values,-1,-3)
+
+    ss = solution['ss']
+    coords = {dim:ss.coords[dim] for dim in ss.dims}
+    coords['shock'] = shock_names
+    coords['period'] = np.arange(T)
+
+    dims = [dim for dim in ss.dims if dim!='variable']
+
+    return Cube(values,dims+['shock','period','variable'],coords,ss.attrs)
+
+
+def loss(irs,weights,discount=1,shock_weights=None):
+
+    '''Evaluate the quadratic loss sum over shocks and periods of discount^t*sum_v weights[v]*x[v,t]^2 from the
+    impulse responses of every grid point, e.g., weights={'pi':1,'y':lam} for the loss function of Class 19.
+
+    Args:
+        irs (Cube):             Impulse responses as returned by impulse()
+        weights (dict):         Weight of each variable, or a square matrix with a weight for each pair of
+                                    variables given as a Pandas DataFrame with variable names as index and columns
+        discount (float):       Discount factor applied to the periods after the shock
+        shock_weights (dict):   Weight of each shock. Defaults to 1 for every shock.
+
+    Returns:
+        Cube with one dimension per swept parameter
+    '''
+
+    variables = list(irs.coords['variable'])
+    shock_names = list(irs.coords['shock'])
+
+    if isinstance(weights,dict):
+        matrix = np.zeros((len(variables),len(variables)))
+        for name, weight in weights.items():
+            matrix[variables.index(name),variables.index(name)] = weight
+    else:
+        matrix = weights.reindex(index=variables,columns=variables).fillna(0).to_numpy()
+
+    if shock_weights is None:
+        shock_weights = {}
+    shock_weight = np.array([shock_weights.get(name,1) for name in shock_names],dtype=float)
+
+    # Periods before the shock are zero, so discounting starts at the first period
+    discounting = discount**np.arange(len(irs.coords['period']))
+
+    x = irs.data
+    quadratic = np.einsum('...tv,vw,...tw->...t',x,matrix,x)
+    values = np.einsum('...st,s,t->...',quadratic,shock_weight,discounting)
+
+    dims = [dim for dim in irs.dims if dim not in ['shock','period','variable']]
+
+    return Cube(values,dims,{dim:irs.coords[dim] for dim in dims},irs.attrs)
+
+
+def best(losses):
+
+    '''Return the labels of the grid point with the smallest loss, ignoring grid points without a solution'''
+
+    position = np.unravel_index(np.nanargmin(losses.data),losses.data.shape)
+
+    return {dim:losses.coords[dim][i].item() for dim,i in zip(losses.dims,position)}
@@ -0,0 +1,325 @@
+'''Second moments of solved linearsolve models and their comparison with the data.
+
+The notebooks compute a stochastic simulation with stoch_sim(), take .std() and .corr() of the simulated
+DataFrame, and compare the numbers by hand with the same statistics of the cycle components in
+business_cycle_data_actual_trend_cycle.csv. The functions here work with the solution of the model instead:
+
+    s[t]   = p*s[t-1] + e[t]
+    x[t]   = [s[t]; f*s[t]]
+
+    * population_moments() computes the standard deviations, correlations, and autocorrelations implied by the
+      model exactly. The covariance matrix of the states solves the discrete Lyapunov equation
+      S = p*S*p' + Q, where Q is the covariance matrix of the shocks.
+    * simulated_moments() simulates many replications of T periods in chunks and keeps only running means and
+      variances of the statistics of each replication, so memory is that of one chunk of replications however
+      many there are. Replications start from draws of the stationary distribution
+      of the states, so no periods need to be dropped. The result shows the sampling variation of statistics
+      computed from a sample as long as the data.
+    * moment_table() puts model and data statistics side by side for pairs of model variables and data
+      columns, e.g., output y and gdp_cycle.
+
+Example:
+
+    import model_moments
+
+    population = model_moments.population_moments(rbc_model,[0.006**2])
+    simulated = model_moments.simulated_moments(rbc_model,[0.006**2],T=250,N=10000,seed=126)
+    model_moments.moment_table(population,columns={'y':'gdp_cycle','c':'consumption_cycle','i':'investment_cycle','l':'hours_cycle'},simulated=simulated)
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import linalg
+
+from stochastic_solow import Moments, chunk_generators, chunk_sizes
+
+
+# Cycle components of the business cycle data exported by Data/Code/business_cycle_data.py
+default_data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','Data','Csv','business_cycle_data_actual_trend_cycle.csv')
+
+
+def solution(model):
+
+    '''Return the names of the variables and of the shocks and the matrices f and p of a solved model'''
+
+    return list(model.names['variables']), list(model.names['shocks']), np.real(model.f), np.real(model.p)
+
+
+def shock_covariance(model,covariance_matrix):
+
+    '''Return the covariance matrix of the shocks to all states. Only the exogenous states are shocked.
+
+    Args:
+        model (linearsolve.model):      Solved model
+        covariance_matrix (list):       Covariance matrix of the shocks to the exogenous states, or a list of
+                                            variances if one-dimensional
+
+    Returns:
+        NumPy ndarray of shape (n_states, n_states)
+    '''
+
+    covariance_matrix = np.asarray(covariance_matrix,dtype=float)
+    if covariance_matrix.ndim<2:
+        covariance_matrix = np.diag(np.atleast_1d(covariance_matrix))
+
+    n_exo = model.n_exo_states
+
+    if covariance_matrix.shape!=(n_exo,n_exo):
+        raise ValueError('covariance_matrix must be '+str(n_exo)+' by '+str(n_exo)+'.')
+
+    q = np.zeros((model.n_states,model.n_states))
+    q[:n_exo,:n_exo] = covariance_matrix
+
+    return q
+
+
+def statistics_frame(variables,covariance,autocovariances):
+
+    '''Return a dict of standard deviations, correlations, and autocorrelations given a covariance matrix and
+    a list of autocovariance matrices for lags 1, 2, ...'''
+
+    variance = np.diag(covariance)
+
+    with np.errstate(invalid='ignore',divide='ignore'):
+        std = np.sqrt(variance)
+        corr = covariance/np.outer(std,std)
+        autocorr = np.column_stack([np.diag(c)/variance for c in autocovariances]) if autocovariances else np.empty((len(variables),0))
+
+    lags = ['lag '+str(k) for k in range(1,len(autocovariances)+1)]
+
+    return {
+        'std':pd.Series(std,index=variables),
+        'corr':pd.DataFrame(corr,index=variables,columns=variables),
+        'autocorr':pd.DataFrame(autocorr,index=variables,columns=lags),
+    }
+
+
+def population_moments(model,covariance_matrix,max_lag=1):
+
+    '''Return the population second moments of the variables of a solved model.
+
+    Args:
+        model (linearsolve.model):      Solved model
+        covariance_matrix (list):       Covariance matrix of the shocks, as for shock_covariance()
+        max_lag (int):                  Largest lag of the autocorrelations
+
+    Returns:
+        dict with keys 'std' (Series), 'corr' (DataFrame), and 'autocorr' (DataFrame with one column per lag)
+    '''
+
+    variables, _, f, p = solution(model)
+
+    state_covariance = linalg.solve_discrete_lyapunov(p,shock_covariance(model,covariance_matrix))
+
+    # Variables are linear in the states: x = g*s
+    g = np.vstack([np.eye(len(p)),f])
+
+    covariance = g@state_covariance@g.T
+
+    # Cov(x[t],x[t-k]) = g*p^k*S*g'
+    autocovariances = []
+    power = np.eye(len(p))
+    for _ in range(max_lag):
+        power = p@power
+        autocovariances.append(g@power@state_covariance@g.T)
+
+    return statistics_frame(variables,covariance,autocovariances)
+
+
+def sample_statistics(x,max_lag):
+
+    '''Return the standard deviations, correlations, and autocorrelations of each replication in x of shape
+    (N, T, V), computed like DataFrame.std(), DataFrame.corr(), and Series.autocorr(), as one array of shape
+    (N, V + V*V + V*max_lag)'''
+
+    N, T, V = x.shape
+
+    # Periods along the last axis keep the sums over periods contiguous in memory. The copy leaves the caller's
+    # array unchanged by the demeaning.
+    x = np.array(np.swapaxes(x,1,2),order='C',copy=True)
+    x-= x.mean(axis=2,keepdims=True)
+    cross = x@np.swapaxes(x,1,2)
+    variance = np.diagonal(cross,axis1=1,axis2=2)
+
+    with np.errstate(invalid='ignore',divide='ignore'):
+        std = np.sqrt(variance/(T-1))
+        corr = cross/np.sqrt(variance[:,:,None]*variance[:,None,:])
+
+        # Sums over the T-lag overlapping periods follow from the full sums less the periods left out
+        autocorr = []
+        for lag in range(1,max_lag+1):
+            n = T-lag
+            mean_a = -x[:,:,:lag].sum(axis=2)/n
+            mean_b = -x[:,:,-lag:].sum(axis=2)/n
+            ss_a = variance - (x[:,:,:lag]**2).sum(axis=2) - n*mean_a**2
+            ss_b = variance - (x[:,:,-lag:]**2).sum(axis=2) - n*mean_b**2
+            products = (x[:,:,None,lag:]@x[:,:,:-lag,None])[:,:,0,0] - n*mean_a*mean_b
+            autocorr.append(products/np.sqrt(ss_a*ss_b))
+
+    return np.concatenate([std,corr.reshape(N,V*V)]+autocorr,axis=1)
+
+
+def simulate_states(p,q_root,stationary_root,T,N,rng):
+
+    '''Simulate N replications of T periods of s[t] = p*s[t-1] + e[t] with the initial state drawn from the
+    stationary distribution. Returns an array of shape (N, T, n_states).'''
+
+    n_states = len(p)
+
+    states = np.empty((N,T,n_states))
+    states[:,0] = rng.standard_normal((N,n_states))@stationary_root.T
+
+    shocks = rng.standard_normal((N,T-1,n_states))@q_root.T
+
+    for t in range(1,T):
+        states[:,t] = states[:,t-1]@p.T + shocks[:,t-1]
+
+    return states
+
+
+def matrix_root(covariance):
+
+    '''Return a matrix r with r*r' equal to a positive semi-definite covariance matrix'''
+
+    values, vectors = np.linalg.eigh(covariance)
+
+    return vectors*np.sqrt(np.clip(values,0,None))
+
+
+def simulated_moments(model,covariance_matrix,T,N,seed=None,chunk_size=1000,max_lag=1):
+
+    '''Simulate N replications of T periods of a solved model and return the mean and standard deviation across
+    replications of the sample second moments of each replication.
+
+    Args:
+        model (linearsolve.model):      Solved model
+        covariance_matrix (list):       Covariance matrix of the shocks, as for shock_covariance()
+        T (int):                        Number of periods of each replication, e.g., the length of the data
+        N (int):                        Number of replications
+        seed (int):                     Seed of the random number generators, one per chunk as in
+                                            stochastic_solow
+        chunk_size (int):               Number of replications simulated at a time
+        max_lag (int):                  Largest lag of the autocorrelations
+
+    Returns:
+        dict with keys 'std', 'corr', and 'autocorr' holding the means across replications as in
+            population_moments(), the same keys with the suffix '_std' holding the standard deviations across
+            replications, and 'count'
+    '''
+
+    variables, _, f, p = solution(model)
+    V = len(variables)
+
+    q = shock_covariance(model,covariance_matrix)
+    q_root = matrix_root(q)
+    stationary_root = matrix_root(linalg.solve_discrete_lyapunov(p,q))
+
+    g = np.vstack([np.eye(len(p)),f])
+
+    count = 0
+    mean = 0
+    m2 = 0
+
+    sizes = chunk_sizes(N,chunk_size)
+    for n, rng in zip(sizes,chunk_generators(len(sizes),seed)):
+
+        x = simulate_states(p,q_root,stationary_root,T,n,rng)@g.T
+        stats = sample_statistics(x,max_lag)
+
+        mean, m2 = Moments.combine(count,mean,m2,n,stats.mean(axis=0),((stats-stats.mean(axis=0))**2).sum(axis=0))
+        count+= n
+
+    std = np.sqrt(m2/max(count-1,1))
+
+    def frames(values):
+
+        lags = ['lag '+str(k) for k in range(1,max_lag+1)]
+
+        return {
+            'std':pd.Series(values[:V],index=variables),
+            'corr':pd.DataFrame(values[V:V+V*V].reshape(V,V),index=variables,columns=variables),
+            'autocorr':pd.DataFrame(values[V+V*V:].reshape(max_lag,V).T,index=variables,columns=lags),
+        }
+
+    result = frames(mean)
+    result.update({key+'_std':value for key,value in frames(std).items()})
+    result['count'] = count
+
+    return result
+
+
+def data_moments(data,columns,max_lag=1):
+
+    '''Return the second moments of data columns as in population_moments(), indexed by the data columns'''
+
+    data = data[columns].dropna()
+
+    return {
+        'std':data.std(),
+        'corr':data.corr(),
+        'autocorr':pd.DataFrame({'lag '+str(k):[data[c].autocorr(k) for c in columns] for k in range(1,max_lag+1)},index=columns),
+    }
+
+
+def moment_table(moments,columns,data=None,reference=None,simulated=None,max_lag=1,scale=100):
+
+    '''Return a table that compares second moments of a model with those of the data.
+
+    Args:
+        moments (dict):         Model moments as returned by population_moments()
+        columns (dict):         Data column for each model variable, e.g., {'y':'gdp_cycle','c':'consumption_cycle'}
+        data (DataFrame):       Data with the columns. Defaults to the cycle components in
+                                    business_cycle_data_actual_trend_cycle.csv. May be a file name or URL.
+        reference (str):        Model variable with which all correlations are computed. Defaults to the first
+                                    variable in columns.
+        simulated (dict):       Optional moments as returned by simulated_moments()
+        max_lag (int):          Largest lag of the autocorrelations
+        scale (float):          Factor applied to standard deviations, e.g., 100 for percent
+
+    Returns:
+        Pandas DataFrame with a (statistic, variable) index and columns 'model' and 'data', and
+            'simulated' and 'simulated std' if simulated moments are given
+    '''
+
+    if data is None:
+        data = default_data_file
+    if isinstance(data,str):
+        data = pd.read_csv(data,index_col=0,parse_dates=True)
+
+    variables = list(columns)
+    if reference is None:
+        reference = variables[0]
+
+    observed = data_moments(data,[columns[v] for v in variables],max_lag)
+
+    # Express the data statistics in terms of the model variables
+    observed = {
+        'std':observed['std'].set_axis(variables),
+        'corr':pd.DataFrame(observed['corr'].to_numpy(),index=variables,columns=variables),
+        'autocorr':observed['autocorr'].set_axis(variables),
+    }
+
+    def rows(m):
+
+        values = {}
+        for v in variables:
+            values['std',v] = m['std'][v]*scale
+        for v in variables:
+            values['corr with '+reference,v] = m['corr'].loc[v,reference]
+        for k in range(1,max_lag+1):
+            for v in variables:
+                values['autocorr lag '+str(k),v] = m['autocorr'].loc[v,'lag '+str(k)]
+
+        return pd.Series(values)
+
+    table = pd.DataFrame({'model':rows(moments),'data':rows(observed)})
+
+    if simulated is not None:
+        table['simulated'] = rows(simulated)
+        table['simulated std'] = rows({key:simulated[key+'_std'] for key in ['std','corr','autocorr']})
+
+    table.index.names = ['statistic','variable']
+
+    return table
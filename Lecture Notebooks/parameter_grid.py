@@ -0,0 +1,204 @@
+'''Labeled arrays and chunked evaluation over grids of parameter values.
+
+The parameter sweeps of the Solow models in solow_sweep and solow_transition and the grids of linearsolve models
+in model_grid share the same machinery:
+
+    * parameter_chunk() numbers the combinations of the values of several parameters in C order and returns the
+      parameters of a range of combinations as arrays,
+    * run_chunks() computes a function for consecutive ranges of combinations in the main process or in a
+      process pool and stores the results in one array, and
+    * Cube holds the results with the labels of each dimension.
+
+Example:
+
+    import numpy as np
+    import parameter_grid
+
+    grids = {'s':np.linspace(0.1,0.3,3),'alpha':np.array([0.3,0.35])}
+    parameter_grid.parameter_chunk(grids,{'delta':0.1},0,6)      # dict of arrays of shape (6,)
+
+    cube = parameter_grid.Cube(np.zeros((3,2)),['s','alpha'],grids)
+    cube.sel(alpha=0.35).to_frame()
+'''
+
+import collections
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class Cube:
+
+    '''Labeled N-dimensional array of simulation results.
+
+    Attributes:
+        data (ndarray):     Values, possibly a memory-mapped array
+        dims (list):        Name of each dimension of data
+        coords (dict):      Labels along each dimension by dimension name
+        attrs (dict):       Values of the parameters that were not swept
+    '''
+
+    def __init__(self,data,dims,coords,attrs=None):
+
+        '''Initializes an instance of the Cube class.
+
+        Args:
+            data (ndarray):     Values
+            dims (list):        Name of each dimension of data
+            coords (dict):      Labels along each dimension by dimension name
+            attrs (dict):       Values of the parameters that were not swept
+
+        Returns:
+            None
+        '''
+
+        self.data = data
+        self.dims = list(dims)
+        self.coords = {dim:np.asarray(coords[dim]) for dim in self.dims}
+        self.attrs = dict(attrs or {})
+
+    def __repr__(self):
+
+        return 'Cube('+', '.join(dim+': '+str(len(self.coords[dim])) for dim in self.dims)+')'
+
+    def sel(self,**labels):
+
+        '''Select by label. A single label drops the dimension and a list of labels keeps it.
+
+        Args:
+            **labels:   Labels or lists of labels by dimension name
+
+        Returns:
+            Cube
+        '''
+
+        index = []
+        dims = []
+        coords = {}
+        attrs = dict(self.attrs)
+
+        for dim in self.dims:
+
+            if dim not in labels:
+                index.append(slice(None))
+                dims.append(dim)
+                coords[dim] = self.coords[dim]
+                continue
+
+            selection = labels[dim]
+            positions = [self.position(dim,label) for label in np.atleast_1d(selection)]
+
+            if np.ndim(selection)==0:
+                index.append(positions[0])
+                attrs[dim] = selection
+            else:
+                index.append(positions)
+                dims.append(dim)
+                coords[dim] = self.coords[dim][positions]
+
+        # Index one dimension at a time so that several lists of labels select their outer product
+        data = self.data
+        for axis, i in reversed(list(enumerate(index))):
+            data = data[(slice(None),)*axis+(i,)]
+
+        return Cube(data,dims,coords,attrs)
+
+    def position(self,dim,label):
+
+        '''Return the position of a label along a dimension. Numeric labels are matched to within rounding.'''
+
+        coords = self.coords[dim]
+
+        if coords.dtype.kind in 'fiu':
+            matches = np.flatnonzero(np.isclose(coords,label,rtol=1e-12,atol=0))
+        else:
+            matches = np.flatnonzero(coords==label)
+
+        if len(matches)==0:
+            raise KeyError(str(label)+' not found in dimension '+dim+'.')
+
+        return matches[0]
+
+    def to_frame(self):
+
+        '''Return the values as a DataFrame with one column per variable and a row for each combination of the
+        labels of the other dimensions'''
+
+        dims = [dim for dim in self.dims if dim!='variable']
+        data = np.asarray(self.data)
+
+        if 'variable' in self.dims:
+            data = np.moveaxis(data,self.dims.index('variable'),-1)
+            columns = self.coords['variable']
+        else:
+            data = data[...,None]
+            columns = [self.attrs.get('variable','value')]
+
+        if dims:
+            index = pd.MultiIndex.from_product([self.coords[dim] for dim in dims],names=dims)
+        else:
+            index = None
+
+        return pd.DataFrame(data.reshape(-1,len(columns)),index=index,columns=columns)
+
+
+def parameter_chunk(grids,fixed,start,stop):
+
+    '''Return the parameters of combinations start, ..., stop-1 of the grids as a dict of arrays of shape
+    (stop-start,). Combinations are numbered in C order, the last grid varying fastest.'''
+
+    shape = [len(values) for values in grids.values()]
+    positions = np.unravel_index(np.arange(start,stop),shape) if grids else []
+
+    parameters = {name:np.full(stop-start,value,dtype=float) for name,value in fixed.items()}
+    for (name,values), position in zip(grids.items(),positions):
+        parameters[name] = np.asarray(values,dtype=float)[position]
+
+    return parameters
+
+
+def run_chunks(function,args,size,chunk_size,data,max_workers=1):
+
+    '''Compute function(*args,start,stop) for consecutive chunks of range(size) and store each result in
+    data[start:stop].
+
+    Args:
+        function (callable):    Module-level function that returns an array for combinations start, ..., stop-1
+        args (tuple):           Leading arguments of function
+        size (int):             Number of combinations
+        chunk_size (int):       Number of combinations per chunk
+        data (ndarray):         Array with size rows that receives the results
+        max_workers (int):      Number of processes. Chunks are computed in the main process if 1 and in as many
+                                    processes as there are CPUs if None.
+
+    Returns:
+        None
+    '''
+
+    chunks = [(start,min(start+chunk_size,size)) for start in range(0,size,chunk_size)]
+
+    if max_workers==1:
+        for start, stop in chunks:
+            data[start:stop] = function(*args,start,stop)
+
+        return
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+        # Keep a bounded number of chunks pending so that results do not pile up in memory
+        pending = collections.deque()
+        for start, stop in chunks:
+            pending.append((start,stop,executor.submit(function,*args,start,stop)))
+
+            if len(pending)>=2*max_workers:
+                start, stop, future = pending.popleft()
+                data[start:stop] = future.result()
+
+        while pending:
+            start, stop, future = pending.popleft()
+            data[start:stop] = future.result()
@@ -0,0 +1,535 @@
+'''Simulated method of moments estimation of the parameters of the RBC model from Classes 14 and 15.
+
+The notebooks set alpha, beta, delta, phi, rho, and sigma by hand and compare the simulated standard deviations
+and correlations with those of the cycle components of the data. Estimation here chooses the parameters that
+minimize the weighted distance
+
+    J = (m(theta) - m_data)'*W*(m(theta) - m_data)
+
+between statistics m(theta) of simulated replications of the model and the same statistics m_data of the cycle
+components in rbc_data_actual_trend_cycle.csv. m(theta) is the mean over R replications of the statistics of a
+sample as long as the data, computed as in model_moments.
+
+    * The replications use the same standard normal draws for every parameter vector (common random numbers),
+      so J is a smooth function of the parameters and differences of J reflect the parameters only.
+    * The gradient of J is computed by finite differences. The points of a gradient are evaluated together,
+      in the main process or in a process pool.
+    * The steady state of each point is computed starting from the steady state of the closest point evaluated
+      so far.
+    * Every evaluation is appended to a checkpoint file. The optimizer is deterministic, so rerunning an
+      interrupted estimation with the same checkpoint file replays the evaluations from the file and continues
+      where it stopped.
+
+sigma is the standard deviation of the TFP shock and is not a parameter of the linearsolve model. In a model
+with more than one shock, the standard deviation of each shock is given by a parameter named after the shock.
+
+Example:
+
+    import rbc_smm
+
+    estimation = rbc_smm.SMM(rbc_model,replications=200,seed=126,guess=[1,4,1,1,1,0.5],max_workers=4,checkpoint='rbc_smm.jsonl')
+    result = estimation.estimate({'alpha':0.35,'beta':0.99,'delta':0.025,'phi':1.7317,'rho':0.75,'sigma':0.006})
+    result['parameters']
+    result['moments']
+'''
+
+import concurrent.futures
+import copy
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import linalg, optimize
+
+import model_grid
+import model_moments
+
+
+# Cycle components of the RBC data exported by Data/Code/business_cycle_data.py
+default_data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','Data','Csv','rbc_data_actual_trend_cycle.csv')
+
+# Data column for each variable of the RBC model
+default_columns = {
+    'y':'gdp_cycle',
+    'c':'consumption_cycle',
+    'i':'investment_cycle',
+    'l':'hours_cycle',
+    'a':'tfp_cycle',
+}
+
+# Statistics matched by default: ('std', v), ('corr', v, w), or ('autocorr', v, lag)
+default_moments = [('std',v) for v in default_columns] + [('corr',v,'y') for v in ['c','i','l','a']] + [('autocorr',v,1) for v in default_columns]
+
+# Lower and upper bounds of the parameters of the RBC model
+default_bounds = {
+    'alpha':(0.05,0.95),
+    'beta':(0.9,0.9999),
+    'delta':(0.001,0.2),
+    'phi':(0.1,10),
+    'rho':(0,0.999),
+    'sigma':(0.0001,0.1),
+}
+
+# Largest absolute residual of the equilibrium conditions at an accepted steady state
+steady_state_tol = 1e-8
+
+# Objective value of parameters for which the model has no unique stable solution
+failure = 1e6
+
+# Model, draws, and options of a worker process, set by initialize()
+worker = {}
+
+
+def initialize(model,draws,moments,shock_parameters,log_linear,linearization):
+
+    '''Store the model and the common random numbers in the process that evaluates points'''
+
+    worker.update(model=copy.deepcopy(model),draws=draws,moments=moments,shock_parameters=shock_parameters,
+                  log_linear=log_linear,linearization=linearization)
+    worker['model'].parameters = worker['model'].parameters.astype(float)
+
+
+def statistic_indices(variables,moments,max_lag):
+
+    '''Return the position of each statistic in the rows returned by model_moments.sample_statistics()'''
+
+    V = len(variables)
+    indices = []
+
+    for moment in moments:
+        kind, v = moment[0], variables.index(moment[1])
+
+        if kind=='std':
+            indices.append(v)
+        elif kind=='corr':
+            indices.append(V + v*V + variables.index(moment[2]))
+        elif kind=='autocorr':
+            indices.append(V + V*V + (moment[2]-1)*V + v)
+        else:
+            raise ValueError('Unknown statistic '+str(kind)+'. Choose std, corr, or autocorr.')
+
+    return indices
+
+
+def label(moment):
+
+    '''Return the (statistic, variable) label of a statistic as in model_moments.moment_table()'''
+
+    if moment[0]=='corr':
+        return 'corr with '+moment[2], moment[1]
+    if moment[0]=='autocorr':
+        return 'autocorr lag '+str(moment[2]), moment[1]
+
+    return moment[0], moment[1]
+
+
+def max_lag(moments):
+
+    '''Return the largest lag of the autocorrelations among the statistics'''
+
+    return max([moment[2] for moment in moments if moment[0]=='autocorr'],default=0)
+
+
+def simulate_statistics(f,p,shock_std,draws,moments,variables):
+
+    '''Return the mean over replications of the statistics of a solution, simulated from given standard normal
+    draws.
+
+    Args:
+        f (ndarray):            Matrix f of the solution
+        p (ndarray):            Matrix p of the solution
+        shock_std (ndarray):    Standard deviation of the shock to each exogenous state
+        draws (dict):           Standard normal draws 'initial' of shape (R, n_states) and 'shocks' of shape
+                                    (R, T-1, n_exo_states)
+        moments (list):         Statistics as in default_moments
+        variables (list):       Names of the variables of the model
+
+    Returns:
+        NumPy ndarray with one value per statistic
+    '''
+
+    n_states = len(p)
+    n_exo = len(shock_std)
+    R, T = draws['shocks'].shape[0], draws['shocks'].shape[1]+1
+
+    q = np.zeros((n_states,n_states))
+    q[:n_exo,:n_exo] = np.diag(np.asarray(shock_std)**2)
+
+    # A Cholesky factor changes smoothly with the parameters, unlike the factor from an eigendecomposition
+    stationary_covariance = linalg.solve_discrete_lyapunov(p,q)
+    try:
+        stationary_root = np.linalg.cholesky(stationary_covariance)
+    except np.linalg.LinAlgError:
+        stationary_root = model_moments.matrix_root(stationary_covariance)
+
+    shocks = np.zeros((R,T-1,n_states))
+    shocks[:,:,:n_exo] = draws['shocks']*shock_std
+
+    states = np.empty((R,T,n_states))
+    states[:,0] = draws['initial']@stationary_root.T
+    for t in range(1,T):
+        states[:,t] = states[:,t-1]@p.T + shocks[:,t-1]
+
+    x = states@np.vstack([np.eye(n_states),f]).T
+    statistics = model_moments.sample_statistics(x,max_lag(moments))
+
+    return statistics[:,statistic_indices(variables,moments,max_lag(moments))].mean(axis=0)
+
+
+def evaluate_point(parameters,guess):
+
+    '''Solve the model of the worker for a dict of parameter values and return the simulated statistics, or
+    None if there is no unique stable solution, and the steady state. Defined at module level so that it can
+    run in a process pool.'''
+
+    model = worker['model']
+    variables = list(model.names['variables'])
+    n_vars = len(variables)
+    n_states = model.n_states
+
+    # Standard deviations that are not estimated are parameters of the model
+    shock_std = np.array([parameters[name] if name in parameters else model.parameters[name] for name in worker['shock_parameters']])
+    structural = {name:value for name,value in parameters.items() if name not in worker['shock_parameters']}
+
+    packed = model_grid.solve_chunk(model,{},structural,guess,worker['log_linear'],worker['linearization'],0,1,warn=False)[0]
+    ss, f, p, _ = np.split(packed,np.cumsum([n_vars,(n_vars-n_states)*n_states,n_states*n_states]))
+
+    if np.isnan(ss).any():
+        return None, None
+
+    # fsolve returns its last iterate when it does not converge
+    parameters = model.parameters.copy()
+    for name, value in structural.items():
+        parameters[name] = value
+    ss_series = pd.Series(ss,index=variables)
+    if np.max(np.abs(model.equations(ss_series,ss_series,parameters)))>steady_state_tol:
+        return None, None
+
+    f = f.reshape(n_vars-n_states,n_states)
+    p = p.reshape(n_states,n_states)
+
+    statistics = simulate_statistics(f,p,shock_std,worker['draws'],worker['moments'],variables)
+
+    if not np.all(np.isfinite(statistics)):
+        return None, None
+
+    return statistics.tolist(), ss.tolist()
+
+
+def evaluate_batch(points):
+
+    '''Evaluate a list of (parameters, guess) pairs with evaluate_point()'''
+
+    return [evaluate_point(parameters,guess) for parameters,guess in points]
+
+
+class SMM:
+
+    '''Simulated method of moments estimation of the parameters of a linearsolve model.
+
+    Attributes:
+        model (linearsolve.model):      Model whose parameters are estimated
+        moments (list):                 Matched statistics
+        data_moments (ndarray):         Statistics of the data
+        weights (ndarray):              Weighting matrix W
+        draws (dict):                   Common random numbers, as for simulate_statistics()
+        evaluations (list):             dict of the parameters, objective, statistics, and steady state of
+                                            every evaluated point
+    '''
+
+    def __init__(self,model,data=None,columns=None,moments=None,weights=None,replications=200,seed=None,
+                 guess=None,log_linear=True,linearization='complex',shock_parameters=None,max_workers=1,checkpoint=None):
+
+        '''Initializes an instance of the SMM class.
+
+        Args:
+            model (linearsolve.model):      Model created with ls.model() whose parameters hold the values of
+                                                the parameters that are not estimated
+            data (DataFrame):               Data with the columns. Defaults to rbc_data_actual_trend_cycle.csv.
+                                                May be a file name or URL.
+            columns (dict):                 Data column for each model variable. Defaults to default_columns.
+            moments (list):                 Statistics to match. Defaults to default_moments.
+            weights (ndarray):              Weighting matrix, or a vector of weights of the squared
+                                                differences. Defaults to 1/m_data^2 so that relative
+                                                differences are matched.
+            replications (int):             Number of simulated samples of the length of the data
+            seed (int):                     Seed of the common random numbers
+            guess (list):                   Initial guess for the steady state of the first point. Later points
+                                                start from the steady state of the closest point solved.
+            log_linear (bool):              Whether to use the log-linear approximation
+            linearization (str):            Method of linearize.approximate() used to approximate the model,
+                                                or None for the approximate_and_solve() method of the model
+            shock_parameters (list):        Name of the parameter holding the standard deviation of each
+                                                shock. Defaults to 'sigma' for models with one shock and the
+                                                names of the shocks otherwise.
+            max_workers (int):              Number of processes evaluating points. Points are evaluated in the
+                                                main process if 1 and in as many processes as there are CPUs
+                                                if None.
+            checkpoint (str):               Name of a file to which evaluations are appended and from which
+                                                they are read when an estimation is resumed
+
+        Returns:
+            None
+        '''
+
+        if data is None:
+            data = default_data_file
+        if isinstance(data,str):
+            data = pd.read_csv(data,index_col=0,parse_dates=True)
+
+        self.model = model
+        self.columns = dict(default_columns if columns is None else columns)
+        self.moments = [tuple(moment) for moment in (default_moments if moments is None else moments)]
+        self.guess = None if guess is None else np.asarray(guess,dtype=float).tolist()
+        self.log_linear = log_linear
+        self.linearization = linearization
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.checkpoint = checkpoint
+
+        shocks = list(model.names['shocks'])
+        if shock_parameters is None:
+            shock_parameters = ['sigma'] if len(shocks)==1 else shocks
+        if len(shock_parameters)!=len(shocks):
+            raise ValueError('Give one shock parameter for each of the '+str(len(shocks))+' shocks.')
+        self.shock_parameters = list(shock_parameters)
+
+        # Statistics of the data, with the data columns renamed to the model variables
+        variables = list(self.columns)
+        observed = data[[self.columns[v] for v in variables]].dropna().set_axis(variables,axis=1)
+        self.T = len(observed)
+        self.data_moments = np.array([self.data_statistic(observed,moment) for moment in self.moments])
+
+        if weights is None:
+            weights = 1/np.maximum(np.abs(self.data_moments),0.01)**2
+        weights = np.asarray(weights,dtype=float)
+        self.weights = np.diag(weights) if weights.ndim==1 else weights
+
+        rng = np.random.default_rng(seed)
+        self.draws = {
+            'initial':rng.standard_normal((replications,model.n_states)),
+            'shocks':rng.standard_normal((replications,self.T-1,model.n_exo_states)),
+        }
+        self.seed = seed
+
+        self.evaluations = []
+        self.cache = {}
+
+    @staticmethod
+    def data_statistic(data,moment):
+
+        '''Return a statistic of a DataFrame of data'''
+
+        if moment[0]=='std':
+            return data[moment[1]].std()
+        if moment[0]=='corr':
+            return data[moment[1]].corr(data[moment[2]])
+
+        return data[moment[1]].autocorr(moment[2])
+
+    def settings(self,names,start):
+
+        '''Return the settings that determine the evaluations, stored at the top of the checkpoint file'''
+
+        return {
+            'parameters':list(names),
+            'start':[float(start[name]) for name in names],
+            'fixed':{name:float(value) for name,value in self.model.parameters.items()},
+            'moments':[list(moment) for moment in self.moments],
+            'data_moments':self.data_moments.tolist(),
+            'weights':self.weights.tolist(),
+            'replications':len(self.draws['initial']),
+            'seed':self.seed,
+            'guess':self.guess,
+            'log_linear':self.log_linear,
+            'linearization':self.linearization,
+        }
+
+    def resume(self,settings):
+
+        '''Read the evaluations in the checkpoint file or start a new file with the settings'''
+
+        if self.checkpoint is None:
+            return
+
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as file:
+                lines = [json.loads(line) for line in file if line.strip()]
+
+            # Round trip the settings through JSON so that tuples and lists compare equal
+            if lines and lines[0]!=json.loads(json.dumps(settings)):
+                raise ValueError('The checkpoint file '+self.checkpoint+' belongs to an estimation with different settings.')
+
+            for evaluation in lines[1:]:
+                self.record(evaluation)
+
+            if lines:
+                return
+
+        with open(self.checkpoint,'w') as file:
+            file.write(json.dumps(settings)+'\n')
+
+    def record(self,evaluation):
+
+        '''Add an evaluation to the cache'''
+
+        self.evaluations.append(evaluation)
+        self.cache[tuple(evaluation['values'])] = evaluation
+
+    def objective(self,statistics):
+
+        '''Return J for simulated statistics, or failure if there are none'''
+
+        if statistics is None:
+            return failure
+
+        difference = np.asarray(statistics)-self.data_moments
+
+        return float(difference@self.weights@difference)
+
+    def closest_steady_state(self,values,scale):
+
+        '''Return the steady state of the evaluated point closest to values, or the initial guess if no point
+        has been solved'''
+
+        solved = [evaluation for evaluation in self.evaluations if evaluation['ss'] is not None]
+        if not solved:
+            return self.guess
+
+        distances = [np.sum(((np.asarray(evaluation['values'])-values)/scale)**2) for evaluation in solved]
+
+        return solved[int(np.argmin(distances))]['ss']
+
+    def evaluate(self,names,points,scale,executor=None):
+
+        '''Return the objective of each point, evaluating the points that are not in the cache.
+
+        Args:
+            names (list):           Names of the estimated parameters
+            points (list):          Parameter values, one list per point
+            scale (ndarray):        Scale of each parameter used to find the closest evaluated point
+            executor (Executor):    Process pool, or None to evaluate in the main process
+
+        Returns:
+            list of float
+        '''
+
+        new = []
+        for values in points:
+            key = tuple(float(value) for value in values)
+            if key not in self.cache and key not in new:
+                new.append(key)
+
+        if new:
+            batch = [(dict(zip(names,key)),self.closest_steady_state(np.array(key),scale)) for key in new]
+
+            if executor is None:
+                results = evaluate_batch(batch)
+            else:
+                # One task per worker keeps the overhead of the pool small
+                size = -(-len(batch)//self.max_workers)
+                tasks = [batch[i:i+size] for i in range(0,len(batch),size)]
+                results = [result for part in executor.map(evaluate_batch,tasks) for result in part]
+
+            lines = []
+            for key, (statistics, ss) in zip(new,results):
+                evaluation = {'values':list(key),'objective':self.objective(statistics),'statistics':statistics,'ss':ss}
+                self.record(evaluation)
+                lines.append(json.dumps(evaluation))
+
+            if self.checkpoint is not None:
+                with open(self.checkpoint,'a') as file:
+                    file.write('\n'.join(lines)+'\n')
+
+        return [self.cache[tuple(float(value) for value in values)]['objective'] for values in points]
+
+    def estimate(self,start,bounds=None,step=1e-5,maxiter=500,tol=1e-10):
+
+        '''Estimate the parameters by minimizing J with L-BFGS-B.
+
+        The parameters are mapped to [0, 1] by their bounds. The gradient is computed with forward differences of
+        size step in the mapped parameters, stepping backward at the upper bounds.
+
+        Args:
+            start (dict):           Initial value of each estimated parameter, e.g., {'rho':0.75,'sigma':0.006}
+            bounds (dict):          Lower and upper bound of each estimated parameter. Defaults to default_bounds.
+            step (float):           Step of the finite differences
+            maxiter (int):          Largest number of iterations of the optimizer
+            tol (float):            Tolerance of the optimizer for changes of J
+
+        Returns:
+            dict with keys:
+                'parameters':   Pandas Series of the estimates
+                'objective':    J at the estimates
+                'moments':      Pandas DataFrame of the simulated and data statistics at the estimates
+                'evaluations':  Number of points evaluated, including points read from the checkpoint file
+                'success':      bool
+                'message':      str
+        '''
+
+        names = list(start)
+        known = list(self.model.parameters.index)+self.shock_parameters
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            raise ValueError('Unknown parameters: '+', '.join(unknown)+'.')
+
+        bounds = dict(default_bounds,**(bounds or {}))
+        missing = [name for name in names if name not in bounds]
+        if missing:
+            raise ValueError('Give bounds for '+', '.join(missing)+'.')
+
+        lower = np.array([bounds[name][0] for name in names],dtype=float)
+        upper = np.array([bounds[name][1] for name in names],dtype=float)
+        width = upper-lower
+
+        not_set = [name for name in self.shock_parameters if name not in names and name not in self.model.parameters.index]
+        if not_set:
+            raise ValueError('Estimate '+', '.join(not_set)+' or add it to the parameters of the model.')
+
+        self.resume(self.settings(names,start))
+
+        def to_values(u):
+
+            return lower + np.clip(u,0,1)*width
+
+        def fun(u):
+
+            # The point and one step in each parameter, backward where a forward step leaves the bounds
+            steps = np.where(u+step<=1,step,-step)
+            points = [to_values(u)] + [to_values(u+steps[j]*np.eye(len(u))[j]) for j in range(len(u))]
+
+            values = self.evaluate(names,points,width,executor)
+
+            return values[0], (np.array(values[1:])-values[0])/steps
+
+        u0 = (np.array([start[name] for name in names],dtype=float)-lower)/width
+
+        model = copy.deepcopy(self.model)
+        initargs = (model,self.draws,self.moments,self.shock_parameters,self.log_linear,self.linearization)
+
+        # The main process evaluates points too if there is no pool, and the estimates if they are not cached
+        initialize(*initargs)
+
+        if self.max_workers==1:
+            executor = None
+            result = optimize.minimize(fun,u0,jac=True,method='L-BFGS-B',bounds=[(0,1)]*len(u0),options={'maxiter':maxiter,'ftol':tol})
+
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers,initializer=initialize,initargs=initargs) as executor:
+                result = optimize.minimize(fun,u0,jac=True,method='L-BFGS-B',bounds=[(0,1)]*len(u0),options={'maxiter':maxiter,'ftol':tol})
+
+        values = to_values(result.x)
+        self.evaluate(names,[values],width)
+        evaluation = self.cache[tuple(float(value) for value in values)]
+
+        index = pd.MultiIndex.from_tuples([label(moment) for moment in self.moments],names=['statistic','variable'])
+        simulated = np.nan if evaluation['statistics'] is None else evaluation['statistics']
+
+        return {
+            'parameters':pd.Series(values,index=names),
+            'objective':evaluation['objective'],
+            'moments':pd.DataFrame({'simulated':simulated,'data':self.data_moments},index=index),
+            'evaluations':len(self.evaluations),
+            'success':bool(result.success),
+            'message':str(result.message),
+        }
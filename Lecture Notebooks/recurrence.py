@@ -0,0 +1,249 @@
+'''Batched simulation of linear difference equations like those in Classes 7 and 10.
+
+diff1_example() and pth_order_diff() in Class 7 and ar1_sim() in Class 10 compute one path for one set of
+coefficients with a loop over time. simulate() here computes the p-th order difference equation
+
+    y[t] = rho[0]*y[t-1] + rho[1]*y[t-2] + ... + rho[p-1]*y[t-p] + w[t]
+
+for many sets of coefficients, initial values, and exogenous series at once. Leading dimensions of the
+arguments are broadcast against each other, so a sweep over coefficients and replications is a single call.
+
+The recurrence is evaluated as an IIR filter with scipy.signal.lfilter(), which runs the loop over time in
+compiled code for all paths that share the same coefficients. When there are more distinct coefficient sets
+than periods, the loop runs over time instead and advances all paths together as arrays. Without shocks,
+i.e., when w[t] is the same constant for t >= 1, paths are computed from the closed-form solution
+y[t] = ybar + sum_i c_i*lambda_i^t where the lambda_i are the roots of the characteristic polynomial.
+
+Dates follow pth_order_diff(): the initial values are y[-(p-1)], ..., y[0], w[0] is not used, and the
+result holds y[-(p-1)], ..., y[T-1].
+
+Example:
+
+    import numpy as np
+    import recurrence
+
+    # 1000 replications of AR(1) processes for each of 50 values of rho: shape (50, 1000, 101)
+    y = recurrence.ar1(rho=np.linspace(0,0.99,50),sigma=1,y0=0,T=101,N=1000,seed=126)
+
+    # Impulse responses of an AR(2) process for three sets of coefficients: shape (3, 22)
+    w = np.zeros(21)
+    w[1] = 1
+    y = recurrence.simulate([[0.5,0.2],[1.2,-0.4],[0.9,0]],w,[0,0])
+'''
+
+import numpy as np
+from scipy import signal
+
+
+def initial_state(rho,y0):
+
+    '''Return the initial state of scipy.signal.lfilter() with coefficients b=[1] and a=[1,-rho[0],...,-rho[p-1]]
+    that continues a path with the last p values y0 = y[-(p-1)], ..., y[0]'''
+
+    p = rho.shape[-1]
+
+    # zi[k] = rho[k]*y[0] + rho[k+1]*y[-1] + ... + rho[p-1]*y[k-(p-1)]
+    return np.stack([(rho[...,k:]*y0[...,::-1][...,:p-k]).sum(axis=-1) for k in range(p)],axis=-1)
+
+
+def deterministic(rho,y0,T,c=0):
+
+    '''Closed-form solution of y[t] = rho[0]*y[t-1] + ... + rho[p-1]*y[t-p] + c.
+
+    The deviation from the steady state ybar = c/(1-sum(rho)) is a combination of the powers of the roots of
+    the characteristic polynomial, with weights chosen to match the initial values. Paths for which this is
+    not exact, i.e., with a unit root or (nearly) repeated roots, are computed by iteration.
+
+    Args:
+        rho (NumPy ndarray):    Coefficients of shape (..., p)
+        y0 (NumPy ndarray):     Initial values y[-(p-1)], ..., y[0] of shape (..., p)
+        T (int):                Number of periods, including period 0
+        c (NumPy ndarray):      Constant of shape (...)
+
+    Returns:
+        NumPy ndarray of shape (..., p-1+T) with y[-(p-1)], ..., y[T-1]
+    '''
+
+    rho = np.asarray(rho,dtype=float)
+    y0 = np.asarray(y0,dtype=float)
+    c = np.asarray(c,dtype=float)
+
+    p = rho.shape[-1]
+    batch = np.broadcast_shapes(rho.shape[:-1],y0.shape[:-1],c.shape)
+
+    rho = np.broadcast_to(rho,batch+(p,)).reshape(-1,p)
+    y0 = np.broadcast_to(y0,batch+(p,)).reshape(-1,p)
+    c = np.broadcast_to(c,batch).reshape(-1)
+
+    # Powers are counted from the first initial value, y[-(p-1)]
+    tau = np.arange(p-1+T)
+
+    if p==1:
+        # y[t] = rho^t*y[0] + c*(1+rho+...+rho^(t-1))
+        r = rho[:,:1]
+        powers = r**tau
+        with np.errstate(invalid='ignore',divide='ignore'):
+            y = powers*y0 + c[:,None]*np.where(r==1,tau,(1-powers)/np.where(r==1,1,1-r))
+
+        return y.reshape(batch+(T,))
+
+    unit_root = np.isclose(rho.sum(axis=1),1)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        ybar = np.where(unit_root,0,c/(1-rho.sum(axis=1)))
+
+    # Roots of the characteristic polynomial are the eigenvalues of the companion matrix
+    companion = np.zeros((len(rho),p,p))
+    companion[:,0,:] = rho
+    companion[:,np.arange(1,p),np.arange(p-1)] = 1
+    roots = np.linalg.eigvals(companion)
+
+    # Weights that match the initial values: y0[s] - ybar = sum_i weights_i*roots_i^s for s = 0, ..., p-1
+    vandermonde = roots[:,None,:]**np.arange(p)[None,:,None]
+    exact = ~unit_root & (np.linalg.cond(vandermonde)<1e8)
+
+    y = np.empty((len(rho),p-1+T))
+
+    if exact.any():
+        weights = np.linalg.solve(vandermonde[exact],(y0[exact]-ybar[exact,None]).astype(complex)[...,None])[...,0]
+        y[exact] = ybar[exact,None] + np.einsum('bi,bit->bt',weights,roots[exact,:,None]**tau).real
+
+    if (~exact).any():
+        w = np.broadcast_to(c[~exact,None],((~exact).sum(),T))
+        y[~exact] = iterate(rho[~exact],w,y0[~exact])
+
+    return y.reshape(batch+(p-1+T,))
+
+
+def iterate(rho,w,y0):
+
+    '''Compute the recurrence with a loop over time for 2-dimensional rho (B, p), w (B, T), and y0 (B, p)'''
+
+    B, p = rho.shape
+    T = w.shape[1]
+
+    y = np.empty((B,p-1+T))
+    y[:,:p] = y0
+
+    # Coefficients in the order of the columns y[t-p], ..., y[t-1]
+    reversed_rho = rho[:,::-1]
+
+    for t in range(1,T):
+        y[:,p-1+t] = np.einsum('bj,bj->b',reversed_rho,y[:,t-1:t-1+p]) + w[:,t]
+
+    return y
+
+
+def simulate(rho,w,y0):
+
+    '''Compute y[t] = rho[0]*y[t-1] + ... + rho[p-1]*y[t-p] + w[t] for t = 1, ..., T-1 for many paths at once.
+
+    Args:
+        rho (NumPy ndarray or list):    Coefficients on y[t-1], ..., y[t-p] of shape (..., p)
+        w (NumPy ndarray or list):      Exogenous values w[0], ..., w[T-1] of shape (..., T). w[0] is not used.
+        y0 (NumPy ndarray or list):     Initial values y[-(p-1)], ..., y[0] of shape (..., p)
+
+    The leading dimensions of rho, w, and y0 are broadcast against each other.
+
+    Returns:
+        NumPy ndarray of shape (..., p-1+T) with y[-(p-1)], ..., y[T-1]
+    '''
+
+    rho = np.atleast_1d(np.asarray(rho,dtype=float))
+    w = np.atleast_1d(np.asarray(w,dtype=float))
+    y0 = np.atleast_1d(np.asarray(y0,dtype=float))
+
+    p = rho.shape[-1]
+    T = w.shape[-1]
+
+    if y0.shape[-1]!=p:
+        raise ValueError('y0 must have as many initial values as rho has coefficients ('+str(p)+').')
+
+    batch = np.broadcast_shapes(rho.shape[:-1],w.shape[:-1],y0.shape[:-1])
+
+    # Without shocks the closed form applies
+    if T>1 and np.all(w[...,1:]==w[...,1:2]):
+        return deterministic(rho,y0,T,np.broadcast_to(w[...,1],w.shape[:-1]))
+
+    rho = np.broadcast_to(rho,batch+(p,)).reshape(-1,p)
+    w = np.broadcast_to(w,batch+(T,)).reshape(-1,T)
+    y0 = np.broadcast_to(y0,batch+(p,)).reshape(-1,p)
+
+    unique, inverse = np.unique(rho,axis=0,return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    if len(unique)>T:
+        return iterate(rho,w,y0).reshape(batch+(p-1+T,))
+
+    # One filter call for all paths that share a set of coefficients
+    y = np.empty((len(rho),p-1+T))
+    y[:,:p] = y0
+
+    for i, coefficients in enumerate(unique):
+        rows = np.flatnonzero(inverse==i)
+        a = np.concatenate([[1],-coefficients])
+        y[rows,p:], _ = signal.lfilter([1],a,w[rows,1:],axis=-1,zi=initial_state(rho[rows],y0[rows]))
+
+    return y.reshape(batch+(p-1+T,))
+
+
+def diff1(rho,w,y0):
+
+    '''Batched diff1_example() from Class 7: y[t] = rho*y[t-1] + w[t] for t = 1, ..., T-1 with y[0] = y0.
+
+    Args:
+        rho (NumPy ndarray or float):   Autoregressive coefficients of shape (...)
+        w (NumPy ndarray or list):      Exogenous values of shape (..., T)
+        y0 (NumPy ndarray or float):    Initial values of shape (...)
+
+    Returns:
+        NumPy ndarray of shape (..., T)
+    '''
+
+    return simulate(np.asarray(rho,dtype=float)[...,None],w,np.asarray(y0,dtype=float)[...,None])
+
+
+def pth_order(rho,y0,w):
+
+    '''Batched pth_order_diff() from Class 7, returning the values of y instead of a DataFrame.
+
+    Args:
+        rho (NumPy ndarray or list):    Coefficients on y[t-1], ..., y[t-p] of shape (..., p)
+        y0 (NumPy ndarray or list):     Initial values y[-(p-1)], ..., y[0] of shape (..., p)
+        w (NumPy ndarray or list):      Exogenous values of shape (..., T)
+
+    Returns:
+        NumPy ndarray of shape (..., p-1+T) with y[-(p-1)], ..., y[T-1]
+    '''
+
+    return simulate(rho,w,y0)
+
+
+def ar1(rho=0,sigma=1,y0=0,T=25,N=1,seed=None):
+
+    '''Batched ar1_sim() from Class 10: N replications of y[t+1] = rho*y[t] + epsilon[t] for each set of
+    parameters, with epsilon[t] drawn from a normal distribution with standard deviation sigma.
+
+    Args:
+        rho (NumPy ndarray or float):   Autoregressive parameters of shape (...)
+        sigma (NumPy ndarray or float): Standard deviations of the white noise process of shape (...)
+        y0 (NumPy ndarray or float):    Initial values of shape (...)
+        T (int):                        Number of periods to simulate
+        N (int):                        Number of replications for each set of parameters
+        seed (int):                     Seed of the random number generator
+
+    Returns:
+        NumPy ndarray of shape (..., N, T)
+    '''
+
+    rho = np.asarray(rho,dtype=float)
+    sigma = np.asarray(sigma,dtype=float)
+    y0 = np.asarray(y0,dtype=float)
+
+    batch = np.broadcast_shapes(rho.shape,sigma.shape,y0.shape)
+
+    # The shock of period t+1 is w[t+1] = epsilon[t]
+    rng = np.random.default_rng(seed)
+    w = np.zeros(batch+(N,T))
+    w[...,1:] = rng.normal(size=batch+(N,T-1))*sigma[...,None,None]
+
+    return simulate(rho[...,None,None],w,y0[...,None,None])
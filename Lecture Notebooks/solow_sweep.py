@@ -0,0 +1,178 @@
+'''Parameter sweeps of the Solow models from Class 8.
+
+solow() and solow_w_L() in the Class 8 notebook simulate one combination of parameters per call and return a
+DataFrame. sweep() here takes a grid of values for each parameter and simulates every combination. The
+combinations are split into chunks. Within a chunk all combinations are simulated together as arrays, so the
+Python loop runs over the T periods only, and chunks can be spread across a process pool.
+
+The result is a Cube: a single NumPy array with one dimension per swept parameter followed by the period
+and the variable, together with the labels of each dimension. Memory is bounded by the chunk size during the
+simulation. For grids too large for the result to fit in memory, the result can be written to a .npy file
+that is memory mapped, and only selected periods and variables need to be kept.
+
+Example:
+
+    import numpy as np
+    import solow_sweep
+
+    cube = solow_sweep.sweep('solow',T=101,s=np.linspace(0.05,0.5,46),A=1,alpha=[0.3,0.35,0.4],delta=0.1,k0=1)
+    cube.data.shape                                 # (46, 3, 101, 4): s, alpha, period, variable
+    cube.sel(alpha=0.35,variable='output')          # Cube with dimensions s and period
+    cube.sel(period=100).to_frame()                 # DataFrame indexed by s and alpha
+'''
+
+import numpy as np
+
+from parameter_grid import Cube, parameter_chunk, run_chunks
+
+
+# Parameters, as arguments of the notebook functions other than T, and variables of each model
+models = {
+    'solow':{
+        'parameters':['s','A','alpha','delta','k0'],
+        'variables':['output','consumption','investment','capital'],
+    },
+    'solow_w_L':{
+        'parameters':['s','A','alpha','delta','n','K0','L0'],
+        'variables':['output','consumption','investment','capital','output_pw','consumption_pw','investment_pw','capital_pw'],
+    },
+}
+
+
+def solow(s,A,alpha,delta,T,k0):
+
+    '''Simulate the Solow model without exogenous growth for arrays of parameters of the same shape (B,).
+
+    Returns:
+        NumPy ndarray of shape (B, T, 4) with the variables in the order of models['solow']['variables']
+    '''
+
+    capital = np.empty(np.shape(k0)+(T,))
+    capital[:,0] = k0
+
+    for t in range(T-1):
+        capital[:,t+1] = s*A*capital[:,t]**alpha + (1-delta)*capital[:,t]
+
+    output = A[:,None]*capital**alpha[:,None]
+    consumption = (1-s[:,None])*output
+    investment = s[:,None]*output
+
+    return np.stack([output,consumption,investment,capital],axis=-1)
+
+
+def solow_w_L(s,A,alpha,delta,n,T,K0,L0):
+
+    '''Simulate the Solow model with exogenous labor growth for arrays of parameters of the same shape (B,).
+
+    Returns:
+        NumPy ndarray of shape (B, T, 8) with the variables in the order of models['solow_w_L']['variables']
+    '''
+
+    capital = np.empty(np.shape(K0)+(T,))
+    capital[:,0] = K0
+
+    # Labor grows at a constant rate
+    labor = L0[:,None]*(1+n[:,None])**np.arange(T)
+
+    for t in range(T-1):
+        capital[:,t+1] = s*A*capital[:,t]**alpha*labor[:,t]**(1-alpha) + (1-delta)*capital[:,t]
+
+    output = A[:,None]*capital**alpha[:,None]*labor**(1-alpha[:,None])
+    consumption = (1-s[:,None])*output
+    investment = s[:,None]*output
+
+    aggregates = [output,consumption,investment,capital]
+
+    return np.stack(aggregates+[x/labor for x in aggregates],axis=-1)
+
+
+# Simulation function of each model
+simulators = {'solow':solow,'solow_w_L':solow_w_L}
+
+
+def split_parameters(model,parameters):
+
+    '''Check the parameters of a model and split them into grids of swept values and fixed values.
+
+    Args:
+        model (str):        'solow' or 'solow_w_L'
+        parameters (dict):  Value or list of values of each parameter of the model
+
+    Returns:
+        tuple: dict of NumPy arrays of the parameters given as lists and dict of the other parameters
+    '''
+
+    if model not in models:
+        raise ValueError('Unknown model '+str(model)+'. Choose one of '+', '.join(models)+'.')
+
+    names = models[model]['parameters']
+
+    missing = [name for name in names if name not in parameters]
+    unknown = [name for name in parameters if name not in names]
+    if missing or unknown:
+        raise ValueError('Model '+model+' takes parameters '+', '.join(names)+'.')
+
+    grids = {name:np.asarray(parameters[name]) for name in names if np.ndim(parameters[name])>0}
+    fixed = {name:parameters[name] for name in names if np.ndim(parameters[name])==0}
+
+    return grids, fixed
+
+
+def evaluate_chunk(model,grids,fixed,T,periods,variables,start,stop):
+
+    '''Simulate combinations start, ..., stop-1 of the grids and return an array of shape (stop-start,
+    len(periods), len(variables)). Defined at module level so that it can run in a process pool.'''
+
+    paths = simulators[model](T=T,**parameter_chunk(grids,fixed,start,stop))
+
+    indices = [models[model]['variables'].index(v) for v in variables]
+
+    return paths[:,periods][:,:,indices]
+
+
+def sweep(model,T,periods=None,variables=None,chunk_size=None,max_workers=1,filename=None,**parameters):
+
+    '''Simulate a Solow model for every combination of the given parameter values.
+
+    Args:
+        model (str):        'solow' or 'solow_w_L'
+        T (int):            Number of periods to simulate
+        periods (list):     Periods to keep. Defaults to all periods.
+        variables (list):   Variables to keep. Defaults to all variables of the model.
+        chunk_size (int):   Number of combinations simulated at a time. Defaults to a chunk of about 64 MB.
+        max_workers (int):  Number of processes. Chunks are computed in the main process if 1 and in as many
+                                processes as there are CPUs if None.
+        filename (str):     If given, the result is written to a memory-mapped .npy file with this name
+        **parameters:       Value or list of values of each parameter of the model, e.g., s=[0.1,0.2]
+
+    Returns:
+        Cube with one dimension per parameter given as a list, then 'period' and 'variable'
+    '''
+
+    # Parameters given as lists are swept, the others are fixed
+    grids, fixed = split_parameters(model,parameters)
+
+    periods = list(range(T)) if periods is None else list(periods)
+    variables = list(models[model]['variables']) if variables is None else list(variables)
+
+    shape = tuple(len(values) for values in grids.values())
+    size = int(np.prod(shape))
+
+    if chunk_size is None:
+        chunk_size = max(1,2**23//(T*len(models[model]['variables'])))
+
+    if filename is None:
+        data = np.empty((size,len(periods),len(variables)))
+    else:
+        data = np.lib.format.open_memmap(filename,mode='w+',dtype=float,shape=(size,len(periods),len(variables)))
+
+    run_chunks(evaluate_chunk,(model,grids,fixed,T,periods,variables),size,chunk_size,data,max_workers)
+
+    if filename is not None:
+        data.flush()
+
+    coords = dict(grids)
+    coords['period'] = periods
+    coords['variable'] = variables
+
+    return Cube(data.reshape(shape+(len(periods),len(variables))),list(grids)+['period','variable'],coords,fixed)
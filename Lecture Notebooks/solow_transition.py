@@ -0,0 +1,277 @@
+'''Transition dynamics of the Solow models from Class 8 with adaptive horizons.
+
+solow() and solow_w_L() in the Class 8 notebook simulate a fixed number of periods T. How many periods are
+needed depends on the parameters: some economies are close to the steady state after a few dozen periods and
+others need thousands. The functions here advance all paths together but drop paths from the computation
+once they reach their targets, so little time is spent on the flat tails of the paths.
+
+Capital per worker follows
+
+    k[t+1] = (s*A*k[t]^alpha + (1-delta)*k[t])/(1+n)
+
+with n = 0 in the model without labor growth and k0 = K0/L0 in the model with labor growth, and converges
+monotonically to the steady state k* = (s*A/(delta+n))^(1/(1-alpha)). Output, consumption, and investment
+per worker are A*k^alpha, (1-s)*A*k^alpha, and s*A*k^alpha.
+
+    * horizons() returns for every combination of parameters the first period in which a variable has closed
+      a given fraction of the gap between its initial value and its steady state, e.g., 0.5 for half-lives.
+    * transition() returns the paths of the per worker variables until they are within a tolerance of the
+      steady state, together with the period in which each path got there.
+
+Parameter grids are given and returned as in solow_sweep.sweep().
+
+Example:
+
+    import numpy as np
+    import solow_transition
+
+    half_lives = solow_transition.horizons('solow',levels=[0.5,0.9],s=np.linspace(0.05,0.5,46),A=1,alpha=0.35,delta=[0.05,0.1],k0=1)
+    half_lives.sel(level=0.5).to_frame()
+'''
+
+import numpy as np
+
+import parameter_grid
+import solow_sweep
+from parameter_grid import Cube
+
+
+# Per worker variables of each model. Both are computed from capital per worker.
+per_worker_variables = {
+    'solow':['output','consumption','investment','capital'],
+    'solow_w_L':['output_pw','consumption_pw','investment_pw','capital_pw'],
+}
+
+
+def capital_parameters(model,parameters):
+
+    '''Return s, A, alpha, delta, n, and initial capital per worker for a dict of parameter arrays of a model'''
+
+    if model=='solow':
+        n = np.zeros_like(parameters['s'])
+        k0 = parameters['k0']
+    else:
+        n = parameters['n']
+        k0 = parameters['K0']/parameters['L0']
+
+    return parameters['s'], parameters['A'], parameters['alpha'], parameters['delta'], n, k0
+
+
+def steady_state(s,A,alpha,delta,n):
+
+    '''Return steady state capital per worker'''
+
+    return (s*A/(delta+n))**(1/(1-alpha))
+
+
+def per_worker(variable,k,s,A,alpha):
+
+    '''Return a per worker variable given capital per worker'''
+
+    if variable.startswith('capital'):
+        return k
+
+    output = A*k**alpha
+
+    if variable.startswith('consumption'):
+        return (1-s)*output
+    if variable.startswith('investment'):
+        return s*output
+
+    return output
+
+
+def first_passage(model,parameters,variable,distances,max_periods,record=False):
+
+    '''Advance paths until a variable is within given distances of its steady state.
+
+    Args:
+        model (str):            'solow' or 'solow_w_L'
+        parameters (dict):      Parameter arrays of shape (B,)
+        variable (str):         Per worker variable whose distance to the steady state is measured
+        distances (ndarray):    Distances of shape (B, L). Each path runs until it is within all of them.
+        max_periods (int):      Last period simulated
+        record (bool):          Whether to return the visited values of capital per worker
+
+    Returns:
+        tuple: NumPy ndarray of shape (B, L) with the first period in which the variable is within each
+            distance, NaN if not reached by max_periods, and, if record is True, a list with the indices of
+            the paths still running and their capital per worker in each period
+    '''
+
+    s, A, alpha, delta, n, k = capital_parameters(model,parameters)
+    target = per_worker(variable,steady_state(s,A,alpha,delta,n),s,A,alpha)
+
+    periods = np.full(distances.shape,np.nan)
+
+    # Indices, parameters, and first periods of the paths that are still running
+    active = np.arange(len(k))
+    state = [k.astype(float),s,A,alpha,delta,n,target,distances,periods.copy()]
+    history = []
+
+    for t in range(max_periods+1):
+
+        k, s, A, alpha, delta, n, target, distances, first = state
+
+        if record:
+            history.append((active,k))
+
+        reached = np.abs(per_worker(variable,k,s,A,alpha)-target)[:,None]<=distances
+        first[reached & np.isnan(first)] = t
+
+        # Drop the paths that are within all distances. Copying the arrays costs about as much as a period, so
+        # finished paths are kept running until they are a sizable share or recording needs exact stops.
+        done = ~np.isnan(first).any(axis=1)
+        finished = done.sum()
+        if finished and (record or finished==len(done) or 8*finished>len(done)):
+            periods[active[done]] = first[done]
+            active = active[~done]
+            state = [x[~done] for x in state]
+            k, s, A, alpha, delta, n, target, distances, first = state
+
+        if len(active)==0:
+            break
+
+        state[0] = (s*A*k**alpha + (1-delta)*k)/(1+n)
+
+    periods[active] = state[-1]
+
+    return periods, history
+
+
+def horizon_chunk(model,grids,fixed,levels,variable,max_periods,start,stop):
+
+    '''Return the horizons of combinations start, ..., stop-1 of the grids as an array of shape
+    (stop-start, len(levels)). Defined at module level so that it can run in a process pool.'''
+
+    parameters = parameter_grid.parameter_chunk(grids,fixed,start,stop)
+
+    s, A, alpha, delta, n, k0 = capital_parameters(model,parameters)
+    initial = per_worker(variable,k0,s,A,alpha)
+    target = per_worker(variable,steady_state(s,A,alpha,delta,n),s,A,alpha)
+
+    # Close the fraction level of the initial gap, allowing for rounding in the steady state
+    gap = np.abs(initial-target)
+    distances = (1-np.asarray(levels))*gap[:,None] + 1e-12*np.abs(target)[:,None]
+
+    return first_passage(model,parameters,variable,distances,max_periods)[0]
+
+
+def horizons(model,levels=(0.5,),variable=None,max_periods=100000,chunk_size=100000,max_workers=1,**parameters):
+
+    '''Return the number of periods until a per worker variable closes given fractions of the gap between its
+    initial value and its steady state, for every combination of the given parameter values.
+
+    Args:
+        model (str):            'solow' or 'solow_w_L'
+        levels (list):          Fractions of the initial gap, between 0 and 1, e.g., 0.5 for the half-life
+        variable (str):         Per worker variable. Defaults to capital per worker.
+        max_periods (int):      Paths that have not reached a level by this period get NaN
+        chunk_size (int):       Number of combinations computed at a time
+        max_workers (int):      Number of processes, as in parameter_grid.run_chunks()
+        **parameters:           Value or list of values of each parameter of the model, e.g., s=[0.1,0.2]
+
+    Returns:
+        Cube with one dimension per parameter given as a list, then 'level'
+    '''
+
+    grids, fixed = solow_sweep.split_parameters(model,parameters)
+
+    if variable is None:
+        variable = per_worker_variables[model][-1]
+
+    levels = list(np.atleast_1d(levels))
+    if not all(0<=level<1 for level in levels):
+        raise ValueError('levels must be at least 0 and less than 1.')
+
+    shape = tuple(len(values) for values in grids.values())
+    size = int(np.prod(shape))
+
+    data = np.empty((size,len(levels)))
+    parameter_grid.run_chunks(horizon_chunk,(model,grids,fixed,levels,variable,max_periods),size,chunk_size,data,max_workers)
+
+    coords = dict(grids)
+    coords['level'] = levels
+
+    return Cube(data.reshape(shape+(len(levels),)),list(grids)+['level'],coords,dict(fixed,variable=variable))
+
+
+def approximate_horizons(model,levels=(0.5,),**parameters):
+
+    '''Return horizons implied by the linear approximation of the law of motion around the steady state, as in
+    Class 8: the gap shrinks by the factor (alpha*s*A*k*^(alpha-1) + 1-delta)/(1+n) every period, so a fraction
+    level of it is closed after log(1-level)/log(factor) periods.
+
+    Args:
+        model (str):            'solow' or 'solow_w_L'
+        levels (list):          Fractions of the initial gap, between 0 and 1
+        **parameters:           Value or list of values of each parameter of the model
+
+    Returns:
+        Cube with one dimension per parameter given as a list, then 'level'
+    '''
+
+    grids, fixed = solow_sweep.split_parameters(model,parameters)
+
+    shape = tuple(len(values) for values in grids.values())
+    size = int(np.prod(shape))
+
+    s, A, alpha, delta, n, _ = capital_parameters(model,parameter_grid.parameter_chunk(grids,fixed,0,size))
+    factor = (alpha*s*A*steady_state(s,A,alpha,delta,n)**(alpha-1) + 1-delta)/(1+n)
+
+    levels = list(np.atleast_1d(levels))
+    data = np.log(1-np.asarray(levels))[None,:]/np.log(factor)[:,None]
+
+    coords = dict(grids)
+    coords['level'] = levels
+
+    return Cube(data.reshape(shape+(len(levels),)),list(grids)+['level'],coords,fixed)
+
+
+def transition(model,tol=1e-4,max_periods=100000,**parameters):
+
+    '''Simulate the per worker variables of every combination of parameter values until capital per worker is
+    within a relative tolerance of its steady state.
+
+    Periods after a path has converged are filled with its steady state, so that all paths have the length of
+    the slowest one.
+
+    Args:
+        model (str):            'solow' or 'solow_w_L'
+        tol (float):            Relative distance of capital per worker to its steady state at which a path stops
+        max_periods (int):      Last period simulated for paths that converge slowly
+        **parameters:           Value or list of values of each parameter of the model, e.g., s=[0.1,0.2]
+
+    Returns:
+        tuple: Cube with one dimension per parameter given as a list, then 'period' and 'variable', and Cube
+            with the period in which each path converged (NaN if not by max_periods)
+    '''
+
+    grids, fixed = solow_sweep.split_parameters(model,parameters)
+
+    shape = tuple(len(values) for values in grids.values())
+    size = int(np.prod(shape))
+
+    parameters = parameter_grid.parameter_chunk(grids,fixed,0,size)
+    s, A, alpha, delta, n, _ = capital_parameters(model,parameters)
+    capital_ss = steady_state(s,A,alpha,delta,n)
+
+    capital = per_worker_variables[model][-1]
+    periods, history = first_passage(model,parameters,capital,tol*capital_ss[:,None],max_periods,record=True)
+
+    # Start from the steady state and fill in the periods visited by each path
+    k = np.repeat(capital_ss[:,None],len(history),axis=1)
+    for t, (active, values) in enumerate(history):
+        k[active,t] = values
+
+    variables = per_worker_variables[model]
+    data = np.stack([per_worker(v,k,s[:,None],A[:,None],alpha[:,None]) for v in variables],axis=-1)
+
+    coords = dict(grids)
+    coords['period'] = np.arange(len(history))
+    coords['variable'] = variables
+
+    paths = Cube(data.reshape(shape+data.shape[1:]),list(grids)+['period','variable'],coords,dict(fixed,tol=tol))
+    converged = Cube(periods.reshape(shape),list(grids),grids,dict(fixed,tol=tol))
+
+    return paths, converged
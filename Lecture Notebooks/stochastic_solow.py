@@ -0,0 +1,382 @@
+'''Batched simulation of the stochastic Solow growth model from Class 10.
+
+solow_stochastic() in the Class 10 notebook simulates one path per call. The functions here simulate N paths
+at once: each period advances all paths together as arrays, so the Python loop runs over the T periods only.
+
+Paths are simulated in chunks. Chunk i draws its shocks from its own random number generator, created from
+the i-th child of numpy.random.SeedSequence(seed). The paths therefore depend only on the seed and the chunk
+size, not on the order in which chunks are computed, and chunks can be computed in parallel processes.
+
+For large N, moments() does not keep the paths. Each chunk is reduced to summary statistics that are merged
+into a running total, so memory depends on the chunk size and on T but not on N:
+
+    * the cross-sectional mean, standard deviation, and quantiles of each variable in every period, and
+    * the average over paths of each path's standard deviation, autocorrelations, and correlation with
+      output, i.e., of the statistics computed for a single path in the notebook.
+
+Quantiles are computed from histograms with fixed bins and are accurate to about the width of a bin.
+
+Example:
+
+    import stochastic_solow
+
+    paths = stochastic_solow.simulate(s=0.1,alpha=0.35,delta=0.025,k0=8.43,A0=1,rho=0.75,sigma=0.006,T=201,N=1000,seed=126)
+    paths['output_log_dev'].shape   # (1000, 201)
+
+    stats = stochastic_solow.moments(s=0.1,alpha=0.35,delta=0.025,k0=8.43,A0=1,rho=0.75,sigma=0.006,T=201,N=10**6,seed=126)
+    stats['path']       # Average standard deviations, autocorrelations, and correlations of single paths
+'''
+
+import collections
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Names of the simulated variables, as in the DataFrame returned by solow_stochastic()
+variables = ['output_log_dev','consumption_log_dev','investment_log_dev','capital_log_dev','tfp_log_dev']
+
+
+def simulate_chunk(s,alpha,delta,k0,A0,rho,sigma,T,N,rng):
+
+    '''Simulate N paths of the stochastic Solow model with shocks drawn from rng.
+
+    Args:
+        s (float):          Saving rate
+        alpha (float):      Capital share in Cobb-Douglas production function
+        delta (float):      Capital depreciation rate
+        k0 (float):         Initial value of capital per worker
+        A0 (float):         Initial TFP
+        rho (float):        AR coeficient for log A[t]
+        sigma (float):      Standard deviation of shock to log A[t]
+        T (int):            Number of periods to simulate
+        N (int):            Number of paths
+        rng (Generator):    NumPy random number generator
+
+    Returns:
+        dict of NumPy ndarrays of shape (N, T) with log deviations from the steady state
+    '''
+
+    # Shocks for periods 1, ..., T-1
+    epsilon = rng.normal(scale=sigma,size=(N,T-1))
+
+    capital = np.empty((N,T))
+    log_tfp = np.empty((N,T))
+
+    capital[:,0] = k0
+    log_tfp[:,0] = np.log(A0)
+
+    # Advance all paths one period at a time
+    for t in range(T-1):
+        capital[:,t+1] = s*np.exp(log_tfp[:,t])*capital[:,t]**alpha + (1-delta)*capital[:,t]
+        log_tfp[:,t+1] = rho*log_tfp[:,t] + epsilon[:,t]
+
+    # Steady state of capital. Output, consumption, and investment are proportional to A*k^alpha, so their
+    # log deviations are all equal.
+    capital_ss = (s/delta)**(1/(1-alpha))
+    log_capital_dev = np.log(capital/capital_ss)
+    log_output_dev = log_tfp + alpha*log_capital_dev
+
+    return {
+        'output_log_dev':log_output_dev,
+        'consumption_log_dev':log_output_dev.copy(),
+        'investment_log_dev':log_output_dev.copy(),
+        'capital_log_dev':log_capital_dev,
+        'tfp_log_dev':log_tfp,
+    }
+
+
+def chunk_sizes(N,chunk_size):
+
+    '''Return the number of paths in each chunk'''
+
+    return [min(chunk_size,N-start) for start in range(0,N,chunk_size)]
+
+
+def chunk_generators(n_chunks,seed=None):
+
+    '''Return one independent random number generator per chunk, derived from a single seed'''
+
+    return [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n_chunks)]
+
+
+def simulate(s,alpha,delta,k0,A0,rho,sigma,T,N,seed=None,chunk_size=10000):
+
+    '''Simulate N paths of the stochastic Solow model and keep all of them.
+
+    Args:
+        s, alpha, delta, k0, A0, rho, sigma, T: As in simulate_chunk()
+        N (int):            Number of paths
+        seed (int):         Seed of the random number generators
+        chunk_size (int):   Number of paths that share one random number generator
+
+    Returns:
+        dict of NumPy ndarrays of shape (N, T) with log deviations from the steady state
+    '''
+
+    sizes = chunk_sizes(N,chunk_size)
+    chunks = [simulate_chunk(s,alpha,delta,k0,A0,rho,sigma,T,n,rng) for n,rng in zip(sizes,chunk_generators(len(sizes),seed))]
+
+    return {name:np.concatenate([chunk[name] for chunk in chunks]) for name in variables}
+
+
+def correlation(x,y):
+
+    '''Return the correlation coefficient of each row of x with the same row of y'''
+
+    x = x - x.mean(axis=1,keepdims=True)
+    y = y - y.mean(axis=1,keepdims=True)
+
+    # Without variation, e.g., with sigma=0 and a path at the steady state, correlations are undefined
+    with np.errstate(invalid='ignore',divide='ignore'):
+        return (x*y).sum(axis=1)/np.sqrt((x**2).sum(axis=1)*(y**2).sum(axis=1))
+
+
+def path_statistics(x,output,max_lag):
+
+    '''Return the standard deviation, autocorrelations at lags 1 to max_lag, and correlation with output of each
+    row of x as an array of shape (N, max_lag+2). Computed like Series.std(), Series.autocorr(), and
+    Series.corr() for each path.'''
+
+    std = x.std(axis=1,ddof=1)
+    autocorrelations = [correlation(x[:,lag:],x[:,:-lag]) for lag in range(1,max_lag+1)]
+
+    return np.column_stack([std]+autocorrelations+[correlation(x,output)])
+
+
+class Moments:
+
+    '''Running summary statistics of simulated paths that can be updated chunk by chunk and merged.
+
+    Attributes:
+        count (int):            Number of paths included
+        mean (dict):            For each variable, cross-sectional mean in each period
+        m2 (dict):              For each variable, sum of squared deviations from the mean in each period
+        counts (dict):          For each variable, histogram counts of shape (T, len(edges)+1) in each period
+        path_mean (dict):       For each variable, mean over paths of the path statistics
+        path_m2 (dict):         For each variable, sum of squared deviations of the path statistics
+    '''
+
+    def __init__(self,T,edges,max_lag=4):
+
+        '''Initializes an instance of the Moments class.
+
+        Args:
+            T (int):                Number of periods
+            max_lag (int):          Largest lag of the autocorrelations
+            edges (ndarray):        Increasing bin edges of the histograms used for quantiles. Values outside
+                                        are counted in the first and last bins.
+
+        Returns:
+            None
+        '''
+
+        self.T = T
+        self.max_lag = max_lag
+        self.edges = np.asarray(edges,dtype=float)
+
+        n_stats = max_lag+2
+
+        self.count = 0
+        self.mean = {name:np.zeros(T) for name in variables}
+        self.m2 = {name:np.zeros(T) for name in variables}
+        self.counts = {name:np.zeros((T,len(self.edges)+1),dtype=np.int64) for name in variables}
+        self.path_mean = {name:np.zeros(n_stats) for name in variables}
+        self.path_m2 = {name:np.zeros(n_stats) for name in variables}
+
+    @staticmethod
+    def combine(count_a,mean_a,m2_a,count_b,mean_b,m2_b):
+
+        '''Combine the counts, means, and sums of squared deviations of two groups (Chan et al.)'''
+
+        count = count_a+count_b
+        delta = mean_b-mean_a
+
+        mean = mean_a + delta*count_b/count
+        m2 = m2_a + m2_b + delta**2*count_a*count_b/count
+
+        return mean, m2
+
+    def update(self,paths):
+
+        '''Add a chunk of simulated paths, a dict of arrays of shape (N, T) as returned by simulate_chunk()'''
+
+        n = len(paths[variables[0]])
+        if n==0:
+            return
+
+        for name in variables:
+
+            x = paths[name]
+
+            # Cross-sectional moments in each period
+            self.mean[name], self.m2[name] = self.combine(
+                self.count,self.mean[name],self.m2[name],n,x.mean(axis=0),((x-x.mean(axis=0))**2).sum(axis=0))
+
+            # Histogram counts in each period: one bincount over (period, bin) pairs
+            n_bins = len(self.edges)+1
+            bins = np.searchsorted(self.edges,x,side='right') + n_bins*np.arange(self.T)
+            self.counts[name]+= np.bincount(bins.ravel(),minlength=self.T*n_bins).reshape(self.T,n_bins)
+
+            # Statistics of single paths
+            stats = path_statistics(x,paths['output_log_dev'],self.max_lag)
+            self.path_mean[name], self.path_m2[name] = self.combine(
+                self.count,self.path_mean[name],self.path_m2[name],n,stats.mean(axis=0),((stats-stats.mean(axis=0))**2).sum(axis=0))
+
+        self.count+= n
+
+    def merge(self,other):
+
+        '''Add the statistics of another Moments instance with the same T, max_lag, and edges'''
+
+        if other.count==0:
+            return
+
+        for name in variables:
+            self.mean[name], self.m2[name] = self.combine(self.count,self.mean[name],self.m2[name],other.count,other.mean[name],other.m2[name])
+            self.path_mean[name], self.path_m2[name] = self.combine(self.count,self.path_mean[name],self.path_m2[name],other.count,other.path_mean[name],other.path_m2[name])
+            self.counts[name]+= other.counts[name]
+
+        self.count+= other.count
+
+    def quantiles(self,name,q):
+
+        '''Return quantiles of a variable in each period, interpolated within histogram bins.
+
+        Args:
+            name (str):     Name of the variable
+            q (list):       Probabilities between 0 and 1
+
+        Returns:
+            NumPy ndarray of shape (T, len(q))
+        '''
+
+        cumulative = np.cumsum(self.counts[name],axis=1)/self.count
+
+        # Bin i covers edges[i-1] to edges[i]. The outer bins are open and are given the width of their neighbors.
+        width = self.edges[1]-self.edges[0]
+        lower = np.concatenate([[self.edges[0]-width],self.edges])
+        upper = np.concatenate([self.edges,[self.edges[-1]+width]])
+
+        result = np.empty((self.T,len(q)))
+        for j, p in enumerate(q):
+            bins = (cumulative<p).sum(axis=1)
+            previous = np.where(bins>0,cumulative[np.arange(self.T),np.maximum(bins-1,0)],0)
+            current = cumulative[np.arange(self.T),bins]
+            fraction = np.where(current>previous,(p-previous)/np.where(current>previous,current-previous,1),0.5)
+            result[:,j] = lower[bins] + fraction*(upper[bins]-lower[bins])
+
+        return result
+
+    def result(self,q=(0.05,0.5,0.95)):
+
+        '''Return the statistics as DataFrames.
+
+        Args:
+            q (list):   Probabilities of the quantiles in each period
+
+        Returns:
+            dict with keys:
+                'period':   DataFrame with a (variable, statistic) column index and periods as rows: mean,
+                                standard deviation, and quantiles across paths
+                'path':     DataFrame with variables as rows and path statistics as columns: mean over paths of
+                                the standard deviation, autocorrelations, and correlation with output
+                'path_std': DataFrame like 'path' with the standard deviation over paths
+                'count':    Number of paths
+        '''
+
+        period = {}
+        for name in variables:
+            period[name,'mean'] = self.mean[name]
+            period[name,'std'] = np.sqrt(self.m2[name]/max(self.count-1,1))
+            for p, values in zip(q,self.quantiles(name,q).T):
+                period[name,'q'+str(p)] = values
+
+        columns = ['std']+['autocorr_'+str(lag) for lag in range(1,self.max_lag+1)]+['corr_output']
+
+        return {
+            'period':pd.DataFrame(period),
+            'path':pd.DataFrame([self.path_mean[name] for name in variables],index=variables,columns=columns),
+            'path_std':pd.DataFrame([np.sqrt(self.path_m2[name]/max(self.count-1,1)) for name in variables],index=variables,columns=columns),
+            'count':self.count,
+        }
+
+
+def default_edges(s,alpha,delta,k0,A0,rho,sigma,n_bins=800):
+
+    '''Return histogram bin edges that cover the initial log deviations and 8 times the approximate
+    stationary standard deviation of log output around them'''
+
+    capital_ss = (s/delta)**(1/(1-alpha))
+    initial = [np.log(k0/capital_ss),np.log(A0),np.log(A0)+alpha*np.log(k0/capital_ss)]
+
+    # Standard deviation of log TFP scaled up by the response of output through capital
+    sd = sigma/np.sqrt(max(1-rho**2,1e-6))/(1-alpha)
+    sd = max(sd,1e-6)
+
+    return np.linspace(min(initial+[0])-8*sd,max(initial+[0])+8*sd,n_bins+1)
+
+
+def chunk_moments(s,alpha,delta,k0,A0,rho,sigma,T,N,rng,max_lag,edges):
+
+    '''Simulate one chunk and return its Moments. Defined at module level so that it can run in a process pool.'''
+
+    moments = Moments(T,edges,max_lag)
+    moments.update(simulate_chunk(s,alpha,delta,k0,A0,rho,sigma,T,N,rng))
+
+    return moments
+
+
+def moments(s,alpha,delta,k0,A0,rho,sigma,T,N,seed=None,chunk_size=10000,max_lag=4,edges=None,q=(0.05,0.5,0.95),max_workers=1):
+
+    '''Simulate N paths of the stochastic Solow model and return summary statistics without keeping the paths.
+
+    Args:
+        s, alpha, delta, k0, A0, rho, sigma, T: As in simulate_chunk()
+        N (int):            Number of paths
+        seed (int):         Seed of the random number generators
+        chunk_size (int):   Number of paths simulated at a time
+        max_lag (int):      Largest lag of the autocorrelations
+        edges (ndarray):    Bin edges of the histograms used for quantiles. Defaults to default_edges().
+        q (list):           Probabilities of the quantiles in each period
+        max_workers (int):  Number of processes. Chunks are computed in the main process if 1 and in as many
+                                processes as there are CPUs if None.
+
+    Returns:
+        dict as returned by Moments.result()
+    '''
+
+    if edges is None:
+        edges = default_edges(s,alpha,delta,k0,A0,rho,sigma)
+
+    total = Moments(T,edges,max_lag)
+
+    sizes = chunk_sizes(N,chunk_size)
+    generators = chunk_generators(len(sizes),seed)
+    args = [(s,alpha,delta,k0,A0,rho,sigma,T,n,rng,max_lag,total.edges) for n,rng in zip(sizes,generators)]
+
+    if max_workers==1:
+        for a in args:
+            total.merge(chunk_moments(*a))
+
+    else:
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+            # Keep a bounded number of chunks pending so that results do not pile up in memory, and merge them in
+            # the order of the chunks so that the result does not depend on which process finishes first
+            pending = collections.deque()
+            for a in args:
+                pending.append(executor.submit(chunk_moments,*a))
+
+                if len(pending)>=2*max_workers:
+                    total.merge(pending.popleft().result())
+
+            while pending:
+                total.merge(pending.popleft().result())
+
+    return total.result(q)
@@ -1,9 +1,58 @@
+import concurrent.futures
+import hashlib
+import inspect
 import os
 import json
+import re
+import sys
 
 # Specifiy subdirectories to iterate over
 directories = ['Homework','Lecture Notebooks','Discussion Notebooks']
 
+# Define a function for editing one cell. i is the position of the cell in the original notebook. Returns None
+# if the cell is to be deleted.
+def blank_cell(i,cell):
+
+    # Find code cells and remove exectution count, metadata output, source
+    if cell['cell_type'] =='code':
+        cell['execution_count'] = None
+        cell['metadata'] = {}
+        cell['outputs'] = []
+
+        if any("CELL NOT PROVIDED" in s.upper() for s in cell['source']):
+            return None
+
+        if i !=0 or not any("import" in s for s in cell['source']):
+            if not any("CELL PROVIDED" in s for s in cell['source']):
+                new_line_counter = 0
+                for j, line in enumerate(cell['source']):
+
+                    if (not line.lstrip().startswith('#') and not 'PROVIDED' in cell['source'][j-1]) or 'NOT PROVIDED' in line:
+                        if new_line_counter<2:
+                            cell['source'][j] = '\n'
+                        else:
+                            cell['source'][j] = ''
+                        new_line_counter+=1
+                    else:
+                        new_line_counter=0
+
+        if len(cell['source'])>0:
+            if cell['source'][-1]=='\n':
+                del cell['source'][-1]
+
+    elif cell['cell_type'] == 'markdown':
+        for j,line in enumerate(cell['source']):
+            if '<!--answer-->' in line.replace(" ","").lower():
+                if line.split(".")[0].isdigit():
+                    newline = line.split(" ")[0]+"  "
+                else:
+                    newline = "  "
+                if line.endswith('\n'):
+                    newline+='\n\n'
+                cell['source'][j] = newline
+
+    return cell
+
 # Define a function for importing and parsing notebook, editing, and writing new file.
 def make_blank_notebook(filename):
 
@@ -14,67 +63,356 @@ def make_blank_notebook(filename):
     # Parse notebook string into JSON
     data = json.loads(lines)
 
-    # Cell indices to delete
-    cells_to_delete = []
-
-    # Iterate over cells. Find code cells and remove exectution count, metadata output, source
+    # Iterate over cells and keep the edited cells that are not deleted
+    cells = []
     for i,cell in enumerate(data['cells']):
-        if cell['cell_type'] =='code':
-            data['cells'][i]['execution_count'] = None
-            data['cells'][i]['metadata'] = {}
-            data['cells'][i]['outputs'] = []
-
-            if any("CELL NOT PROVIDED" in s.upper() for s in data['cells'][i]['source']):
-                cells_to_delete.append(i)
-            
-            if i !=0 or not any("import" in s for s in cell['source']):
-                if not any("CELL PROVIDED" in s for s in cell['source']):
-                    new_line_counter = 0
-                    for j, line in enumerate(cell['source']):
-                        
-                        if (not line.lstrip().startswith('#') and not 'PROVIDED' in cell['source'][j-1]) or 'NOT PROVIDED' in line:
-                            if new_line_counter<2:
-                                cell['source'][j] = '\n'
-                            else:
-                                cell['source'][j] = ''
-                            new_line_counter+=1
-                        else:
-                            new_line_counter=0
-                        
-            if len(data['cells'][i]['source'])>0:
-                if data['cells'][i]['source'][-1]=='\n':
-                    del data['cells'][i]['source'][-1]
-
-        elif cell['cell_type'] == 'markdown':
-            for j,line in enumerate(cell['source']):
-                if '<!--answer-->' in line.replace(" ","").lower():
-                    if line.split(".")[0].isdigit():
-                        newline = line.split(" ")[0]+"  "
-                    else:
-                        newline = "  "
-                    if line.endswith('\n'):
-                        newline+='\n\n'
-                    data['cells'][i]['source'][j] = newline
-
-    # Reverse the list of cells to delete so that the correct indices will be deleted
-    cells_to_delete.reverse()
+        cell = blank_cell(i,cell)
+        if cell is not None:
+            cells.append(cell)
 
-    # Delete desired indices
-    for i in cells_to_delete:
-        del data['cells'][i]
+    data['cells'] = cells
 
     # Write new notebook
-    with open(filename.split('.')[0]+'_blank'+'.ipynb','w') as newfile:
+    with open(blank_filename(filename),'w') as newfile:
         newfile.write(json.dumps(data,indent=4))
 
-# Iterate over all notebooks in specified subdirectories.
-pwd = os.getcwd()
+    return filename
+
+# Reader that parses a JSON document from a file piece by piece. Values are decoded one at a time and values
+# that are not needed, like cell outputs, are skipped over without being decoded, so only the part of the file
+# that holds the current value is in memory.
+class JSONStream:
+
+    # Next character that opens or closes a string, array, or object
+    structure = re.compile(r'["\[\]{}]')
+
+    def __init__(self,file,chunk_size=64*1024):
+
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    # Drop the text that was consumed and read more. A value longer than the buffer doubles the size of the
+    # next read so that decoding it again costs linear time overall. Returns False at the end of the file.
+    def fill(self):
+
+        chunk = self.file.read(max(self.chunk_size,len(self.buffer)-self.pos))
+        self.buffer = self.buffer[self.pos:]+chunk
+        self.pos = 0
+
+        return len(chunk)>0
+
+    # Return the next character that is not white space, or '' at the end of the file
+    def peek(self):
+
+        while True:
+            while self.pos<len(self.buffer) and self.buffer[self.pos] in ' \t\n\r':
+                self.pos+=1
+
+            if self.pos<len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self.fill():
+                return ''
+
+    # Consume the next character, which must be one of chars, and return it
+    def expect(self,chars):
+
+        c = self.peek()
+
+        if c=='' or c not in chars:
+            raise ValueError('Expected one of '+repr(chars)+' at this point of the notebook, found '+repr(c))
+
+        self.pos+=1
+
+        return c
+
+    # Decode and return the next value
+    def read_value(self):
+
+        self.peek()
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer,self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+
+            # A number at the end of the buffer may continue in the next chunk
+            if end==len(self.buffer) and self.fill():
+                continue
+
+            self.pos = end
+
+            return value
+
+    # Skip the next value without decoding it
+    def skip_value(self):
+
+        c = self.peek()
+
+        if c=='"':
+            return self.skip_string()
+
+        if c not in '[{':
+            self.read_value()
+            return
+
+        depth = 0
+
+        while True:
+            match = self.structure.search(self.buffer,self.pos)
+
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError('Unexpected end of notebook file')
+                continue
+
+            self.pos = match.start()
+
+            if match.group()=='"':
+                self.skip_string()
+                continue
+
+            self.pos+=1
+            depth+= 1 if match.group() in '[{' else -1
+
+            if depth==0:
+                return
+
+    # Skip a string. The current character is the opening quote. str.find() is used rather than a regular
+    # expression because it is much faster on the long base64 strings of images.
+    def skip_string(self):
+
+        self.pos+=1
+
+        while True:
+            quote = self.buffer.find('"',self.pos)
+            escape = self.buffer.find('\\',self.pos,len(self.buffer) if quote<0 else quote)
+
+            if escape>=0:
+
+                # An escape at the very end of the buffer is kept so that the escaped character is read with it
+                if escape+1==len(self.buffer):
+                    self.pos = escape
+                    if not self.fill():
+                        raise ValueError('Unexpected end of notebook file')
+                else:
+                    self.pos = escape+2
+
+            elif quote>=0:
+                self.pos = quote+1
+                return
 
-for directory in directories:
-    for filename in os.listdir(os.path.join(pwd,directory)):
-        if filename.endswith('.ipynb') and '_blank' not in filename:
-            if filename.startswith('Example'):
-                pass
             else:
-                print(os.path.join(pwd,directory,filename))
-                make_blank_notebook(os.path.join(pwd,directory,filename))
\ No newline at end of file
+                self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError('Unexpected end of notebook file')
+
+    # Iterate over the keys of an object. The caller must consume the value of each key.
+    def keys(self):
+
+        self.expect('{')
+
+        if self.peek()=='}':
+            self.pos+=1
+            return
+
+        while True:
+            key = self.read_value()
+            self.expect(':')
+
+            yield key
+
+            if self.expect(',}')=='}':
+                return
+
+    # Iterate over the elements of an array. The caller must consume each element.
+    def elements(self):
+
+        self.expect('[')
+
+        if self.peek()==']':
+            self.pos+=1
+            return
+
+        while True:
+            yield
+
+            if self.expect(',]')==']':
+                return
+
+# Define a function that reads the next cell from a JSONStream and drops its outputs without decoding them
+def read_cell(stream):
+
+    cell = {}
+
+    for key in stream.keys():
+        if key=='outputs':
+            stream.skip_value()
+            cell['outputs'] = []
+        else:
+            cell[key] = stream.read_value()
+
+    return cell
+
+# Define a function that writes the blank version of a notebook while reading it cell by cell. Memory use
+# depends on the largest cell rather than on the whole notebook. The new file is written in compact JSON
+# without indentation, which Jupyter reads like any other notebook.
+def make_blank_notebook_streaming(filename):
+
+    compact = (',',':')
+    new_filename = blank_filename(filename)
+
+    with open(filename) as file, open(new_filename+'.part','w') as newfile:
+
+        stream = JSONStream(file)
+        newfile.write('{')
+
+        for n, key in enumerate(stream.keys()):
+
+            if n>0:
+                newfile.write(',')
+            newfile.write(json.dumps(key)+':')
+
+            if key!='cells':
+                newfile.write(json.dumps(stream.read_value(),separators=compact))
+                continue
+
+            newfile.write('[')
+
+            written = 0
+            for i, _ in enumerate(stream.elements()):
+                cell = blank_cell(i,read_cell(stream))
+
+                if cell is not None:
+                    if written>0:
+                        newfile.write(',\n')
+                    newfile.write(json.dumps(cell,separators=compact))
+                    written+=1
+
+            newfile.write(']')
+
+        newfile.write('}\n')
+
+    os.replace(new_filename+'.part',new_filename)
+
+    return filename
+
+# Define a function that returns the name of the blank version of a notebook
+def blank_filename(filename):
+
+    return os.path.splitext(filename)[0]+'_blank'+'.ipynb'
+
+# Define a function that returns the SHA-256 hash of a file's contents
+def file_hash(filename):
+
+    sha256 = hashlib.sha256()
+
+    with open(filename,'rb') as file:
+        for block in iter(lambda: file.read(1024**2), b''):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+# Hash of the code that blanks notebooks in the given mode. When either changes, all notebooks are rebuilt.
+def transform_hash(streaming=False):
+
+    functions = [blank_cell,make_blank_notebook_streaming,JSONStream,read_cell] if streaming else [blank_cell,make_blank_notebook]
+    source = ''.join(inspect.getsource(function) for function in functions)
+
+    return hashlib.sha256(source.encode()).hexdigest()
+
+# Define a function that loads the manifest of source and blank notebook hashes from the last run
+def load_manifest(manifest_file):
+
+    if not os.path.exists(manifest_file):
+        return {'transform':None,'notebooks':{}}
+
+    with open(manifest_file) as file:
+        return json.load(file)
+
+# Define a function that writes the manifest. The file is replaced at once so that an interrupted run leaves
+# the previous manifest intact.
+def save_manifest(manifest,manifest_file):
+
+    os.makedirs(os.path.dirname(manifest_file),exist_ok=True)
+
+    with open(manifest_file+'.part','w') as file:
+        file.write(json.dumps(manifest,indent=4))
+
+    os.replace(manifest_file+'.part',manifest_file)
+
+# Define a function that decides whether the blank version of a notebook is current: the source notebook and
+# the blanking code are unchanged since the last run, and the blank notebook exists and was not edited by hand.
+def is_current(filename,key,source_hash,manifest,transform):
+
+    entry = manifest['notebooks'].get(key)
+
+    if entry is None or manifest['transform']!=transform or entry['source']!=source_hash:
+        return False
+
+    blank = blank_filename(filename)
+
+    return os.path.exists(blank) and file_hash(blank)==entry['blank']
+
+# Define a function that lists the solution notebooks in the specified subdirectories
+def find_notebooks(pwd):
+
+    notebooks = []
+
+    for directory in directories:
+        if not os.path.isdir(os.path.join(pwd,directory)):
+            continue
+
+        for filename in sorted(os.listdir(os.path.join(pwd,directory))):
+            if filename.endswith('.ipynb') and '_blank' not in filename:
+                if filename.startswith('Example'):
+                    pass
+                else:
+                    notebooks.append(os.path.join(pwd,directory,filename))
+
+    return notebooks
+
+# Rebuild the blank versions of notebooks that changed since the last run. Changed notebooks are transformed
+# in parallel by a pool of processes. With streaming=True, notebooks are read and written cell by cell.
+def main(pwd,max_workers=None,streaming=False):
+
+    manifest_file = os.path.join(pwd,'.cache','blank_notebooks.json')
+    manifest = load_manifest(manifest_file)
+    transform = transform_hash(streaming)
+    transform_notebook = make_blank_notebook_streaming if streaming else make_blank_notebook
+
+    notebooks = find_notebooks(pwd)
+    source_hashes = {filename:file_hash(filename) for filename in notebooks}
+
+    # Relative paths as keys so that the manifest does not depend on the location of the repository
+    keys = {filename:os.path.relpath(filename,pwd) for filename in notebooks}
+
+    changed = [filename for filename in notebooks if not is_current(filename,keys[filename],source_hashes[filename],manifest,transform)]
+
+    # Notebooks that were removed are dropped from the manifest
+    new_manifest = {'transform':transform,'notebooks':{}}
+    for filename in notebooks:
+        if filename not in changed:
+            new_manifest['notebooks'][keys[filename]] = manifest['notebooks'][keys[filename]]
+
+    if changed:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for filename in executor.map(transform_notebook,changed):
+                print(filename)
+                new_manifest['notebooks'][keys[filename]] = {'source':source_hashes[filename],'blank':file_hash(blank_filename(filename))}
+
+    save_manifest(new_manifest,manifest_file)
+
+    print('Blank notebooks: '+str(len(changed))+' rebuilt, '+str(len(notebooks)-len(changed))+' skipped')
+
+# Iterate over all notebooks in specified subdirectories. Run with --streaming to limit memory use on notebooks
+# with large outputs.
+if __name__ == '__main__':
+    main(os.getcwd(),streaming='--streaming' in sys.argv[1:])